@@ -4,7 +4,8 @@ Production-ready Enhanced Web Dashboard for the Autonomous Task Agent.
 Handles missing environment variables gracefully for deployment.
 """
 
-from flask import Flask, jsonify
+from flask import Flask, Response, jsonify, request
+from flask_sock import Sock
 import json
 import os
 import sys
@@ -17,18 +18,29 @@ from pathlib import Path
 # Add current directory to Python path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+from src.task_queue import PriorityTaskQueue, Task
+from src.events import HEARTBEAT_SECONDS, ControlChannel, EventBroadcaster, status_body
+
 app = Flask(__name__)
+app.config['SOCK_SERVER_OPTIONS'] = {'ping_interval': HEARTBEAT_SECONDS}
+sock = Sock(app)
 
 # Check if we have environment variables configured
 try:
-    from src.config import OBJECTIVE, YOUR_FIRST_TASK
+    from src.config import OBJECTIVE, YOUR_FIRST_TASK, MAX_WORKERS, TASK_QUEUE_CAPACITY, TASK_OVERFLOW_PATH, CHECKPOINT_PATH, run_path
     from src.agents import (
-        get_mistral_embedding,
         task_creation_agent,
-        prioritization_agent,
+        reprioritize_tasks,
         execution_agent,
     )
-    from src.database import setup_supabase_table, store_task_result
+    from src.database import setup_supabase_table
+    from src.workers import WorkerPool
+    from src.scheduler import TaskScheduler, link_sibling_dependencies
+    from src.dedup import TaskDeduplicator
+    from src.scoring import LocalPriorityScorer
+    from src.checkpoint import RunCheckpoint
+    from src.convergence import ConvergenceMonitor
+    from src.writer import ResultWriter
     FULL_FEATURES = True
     print("✅ Full functionality available - APIs configured")
 except Exception as e:
@@ -36,11 +48,16 @@ except Exception as e:
     FULL_FEATURES = False
     OBJECTIVE = "Solve world hunger through innovative agricultural solutions"
     YOUR_FIRST_TASK = "Develop a comprehensive task list"
+    TASK_QUEUE_CAPACITY = None
+    TASK_OVERFLOW_PATH = None
+    CHECKPOINT_PATH = None
 
 # Enhanced Agent State
 class EnhancedAgentState:
     def __init__(self):
-        self.task_list = deque([])
+        self.task_list = PriorityTaskQueue(capacity=TASK_QUEUE_CAPACITY,
+                                           overflow_path=run_path(TASK_OVERFLOW_PATH, "app") if FULL_FEATURES else None,
+                                           run_id="app")
         self.task_id_counter = 1
         self.objective = OBJECTIVE
         self.is_running = False
@@ -55,6 +72,16 @@ class EnhancedAgentState:
         self.approval_required = True
         self.session_history = []
         self.start_time = None
+        self.worker_pool = None
+        self.force_full_reprioritize = False
+        self.scheduler = TaskScheduler() if FULL_FEATURES else None
+        self.deduplicator = TaskDeduplicator() if FULL_FEATURES else None
+        self.scorer = LocalPriorityScorer(vectors=self.deduplicator.vectors) if FULL_FEATURES else None
+        self.checkpoint = RunCheckpoint(CHECKPOINT_PATH) if FULL_FEATURES and CHECKPOINT_PATH else None
+        self.convergence = ConvergenceMonitor() if FULL_FEATURES else None
+        self.writer = ResultWriter(on_written=lambda stats: self.events.publish("writer", stats)) if FULL_FEATURES else None
+        self.embedded = deque()  # Result embeddings from the writer, not yet seen by the convergence monitor
+        self.events = EventBroadcaster()  # Pushes changes to open dashboards
         self.execution_stats = {
             'total_tasks_completed': 0,
             'total_tasks_generated': 0,
@@ -62,6 +89,21 @@ class EnhancedAgentState:
             'avg_execution_time': 0
         }
         
+    def resume_from_checkpoint(self):
+        """Continue from the last checkpoint for the current objective; returns False if there is none."""
+        state = self.checkpoint.resume(self.objective, self.task_list, self.scheduler, self.deduplicator) if self.checkpoint else None
+        if not state:
+            return False
+        self.iteration = state['iteration']
+        self.task_id_counter = state['task_id_counter']
+        self.add_log(f"♻️ Resumed at iteration {self.iteration} with {len(state['queue']) + len(state['in_flight'])} queued tasks", "success")
+        return True
+        
+    def on_result_embedded(self, embedding):
+        """Called by the result writer once a stored result's embedding is known."""
+        self.scorer.add_result(embedding)
+        self.embedded.append(embedding)
+        
     def add_log(self, message, level="info"):
         timestamp = time.strftime("%H:%M:%S")
         self.logs.append({
@@ -72,6 +114,30 @@ class EnhancedAgentState:
         })
         if len(self.logs) > 100:
             self.logs.pop(0)
+        self.events.publish("log", self.logs[-1])
+    
+    def publish_status(self):
+        """Push the run state, statistics and workers to open dashboards."""
+        self.events.publish("status", {
+            "status": "Running" if self.is_running else ("Paused" if self.is_paused else "Stopped"),
+            "objective": self.objective,
+            "iteration": self.iteration,
+            "max_iterations": self.max_iterations,
+            "stats": self.execution_stats,
+            "workers": self.worker_pool.worker_status() if self.worker_pool else [],
+        })
+    
+    def publish_queue(self):
+        """Push the queued tasks, in priority order, to open dashboards."""
+        self.events.publish("queue", {
+            "tasks": [t.to_dict() for t in self.task_list],
+            "tasks_count": len(self.task_list),
+            "queue": self.task_list.pressure(),
+        })
+    
+    def output_sink(self, task):
+        """Callback streaming ``task``'s execution output to open dashboards as it is generated."""
+        return lambda text: self.events.publish("output", {"task_id": task.task_id, "text": text}, replay=False)
     
     def save_session(self):
         if self.start_time:
@@ -87,6 +153,7 @@ class EnhancedAgentState:
             self.session_history.append(session)
             if len(self.session_history) > 10:
                 self.session_history.pop(0)
+            self.events.publish("session", session)
 
 agent_state = EnhancedAgentState()
 
@@ -426,6 +493,15 @@ ENHANCED_DASHBOARD_HTML = """
         }
     </style>
     <script>
+        const MAX_LOGS = 30;
+        const MAX_OUTPUTS = 5;
+        const clientId = Math.random().toString(36).slice(2);
+        const unacked = new Map();  // Command id -> command, resent after a reconnect until acknowledged
+        let socket = null;
+        let lastSeq = 0;
+        let commandCount = 0;
+        let sessions = [];
+        
         function showTab(tabName) {
             document.querySelectorAll('.tab-content').forEach(tab => {
                 tab.classList.remove('active');
@@ -439,57 +515,135 @@ ENHANCED_DASHBOARD_HTML = """
         }
         
         function updateDashboard() {
-            fetch('/api/status')
+            return fetch('/api/status')
                 .then(response => response.json())
                 .then(data => {
                     updateMainDashboard(data);
                     updateApprovalPanel(data);
-                    updateHistoryPanel(data);
+                    sessions = data.session_history;
+                    updateHistoryPanel();
+                    return data;
                 })
                 .catch(error => console.error('Update failed:', error));
         }
         
         function updateMainDashboard(data) {
+            applyStatus(data);
+            applyQueue(data);
+            renderWorkers(data.workers || []);
+            document.getElementById('logs').innerHTML = '';
+            data.logs.slice(-MAX_LOGS).forEach(appendLog);
+        }
+        
+        function applyStatus(data) {
+            // Status and basic info
             const statusEl = document.getElementById('status');
             statusEl.textContent = data.status;
             statusEl.className = 'status-indicator ' + data.status.toLowerCase();
             
             document.getElementById('objective').textContent = data.objective;
             document.getElementById('iteration').textContent = data.iteration;
-            document.getElementById('tasks-count').textContent = data.tasks_count;
-            document.getElementById('completed-count').textContent = data.stats.total_tasks_completed;
-            document.getElementById('success-rate').textContent = data.stats.success_rate + '%';
+            applyStats(data.stats);
             
+            // Progress bar
             const progress = Math.min((data.iteration / data.max_iterations) * 100, 100);
             document.getElementById('progress-fill').style.width = progress + '%';
+        }
+        
+        function applyStats(stats) {
+            document.getElementById('completed-count').textContent = stats.total_tasks_completed;
+            document.getElementById('success-rate').textContent = stats.success_rate + '%';
+        }
+        
+        function applyQueue(data) {
+            document.getElementById('tasks-count').textContent = data.tasks_count;
+            const queue = data.queue || {};
+            document.getElementById('queue-pressure').textContent = queue.capacity
+                ? `${Math.round(queue.fill * 100)}% full · ${queue.spilled_now} spilled` : '';
             
+            // Task list
             const taskList = document.getElementById('task-list');
             taskList.innerHTML = '';
             data.tasks.forEach(task => {
                 const div = document.createElement('div');
+                div.id = 'task-' + task.task_id;
                 div.className = 'task-item';
                 div.innerHTML = `
                     <div class="task-id">#${task.task_id}</div>
                     <strong>Task:</strong> ${task.task_name}
                     <div style="margin-top: 10px;">
-                        <button class="btn btn-primary" onclick="sendCommand('edit_task', {task_id: '${task.task_id}'})">Edit</button>
-                        <button class="btn btn-danger" onclick="sendCommand('remove_task', {task_id: '${task.task_id}'})">Remove</button>
+                        <button class="btn btn-primary" onclick="editTask('${task.task_id}')">Edit</button>
+                        <button class="btn btn-danger" onclick="removeTask('${task.task_id}')">Remove</button>
                     </div>
                 `;
                 taskList.appendChild(div);
             });
-            
+        }
+        
+        function removeQueuedTask(task) {
+            const div = document.getElementById('task-' + task.task_id);
+            if (div) {
+                div.remove();
+                const count = document.getElementById('tasks-count');
+                count.textContent = Math.max(0, parseInt(count.textContent) - 1);
+            }
+        }
+        
+        function renderWorkers(workers) {
+            document.getElementById('worker-list').innerHTML = '';
+            workers.forEach(updateWorker);
+        }
+        
+        function updateWorker(worker) {
+            const workerList = document.getElementById('worker-list');
+            let div = document.getElementById('worker-' + worker.worker);
+            if (!div) {
+                div = document.createElement('div');
+                div.id = 'worker-' + worker.worker;
+                div.className = 'task-item';
+                workerList.appendChild(div);
+            }
+            div.innerHTML = worker.state === 'busy'
+                ? `<strong>${worker.worker}</strong>: ⚡ #${worker.task_id} ${worker.task_name}`
+                : `<strong>${worker.worker}</strong>: 💤 idle`;
+        }
+        
+        function appendLog(log) {
             const logs = document.getElementById('logs');
-            logs.innerHTML = '';
-            data.logs.slice(-30).forEach(log => {
-                const div = document.createElement('div');
-                div.className = 'log-entry ' + log.level;
-                div.innerHTML = `[${log.timestamp}] ${log.message}`;
-                logs.appendChild(div);
-            });
+            const div = document.createElement('div');
+            div.className = 'log-entry ' + log.level;
+            div.innerHTML = `[${log.timestamp}] ${log.message}`;
+            logs.appendChild(div);
+            while (logs.children.length > MAX_LOGS) {
+                logs.firstChild.remove();
+            }
             logs.scrollTop = logs.scrollHeight;
         }
         
+        function outputFor(taskId, taskName) {
+            let div = document.getElementById('output-' + taskId);
+            if (!div) {
+                const output = document.getElementById('live-output');
+                if (!output.children.length) output.textContent = '';
+                div = document.createElement('div');
+                div.id = 'output-' + taskId;
+                div.className = 'log-entry info';
+                div.style.whiteSpace = 'pre-wrap';
+                div.textContent = `#${taskId} ${taskName || ''}\n`;
+                output.appendChild(div);
+                while (output.children.length > MAX_OUTPUTS) {
+                    output.firstChild.remove();
+                }
+            }
+            return div;
+        }
+        
+        function appendOutput(chunk) {
+            const output = document.getElementById('live-output');
+            outputFor(chunk.task_id).appendChild(document.createTextNode(chunk.text));
+            output.scrollTop = output.scrollHeight;
+        }
+        
         function updateApprovalPanel(data) {
             const approvalPanel = document.getElementById('approval-panel');
             if (data.pending_approval) {
@@ -503,10 +657,10 @@ ENHANCED_DASHBOARD_HTML = """
             }
         }
         
-        function updateHistoryPanel(data) {
+        function updateHistoryPanel() {
             const historyList = document.getElementById('history-list');
             historyList.innerHTML = '';
-            data.session_history.forEach((session, index) => {
+            sessions.forEach((session, index) => {
                 const div = document.createElement('div');
                 div.className = 'session-item';
                 const startTime = new Date(session.start_time).toLocaleString();
@@ -524,12 +678,94 @@ ENHANCED_DASHBOARD_HTML = """
             });
         }
         
+        // Pushed changes, by event type
+        const handlers = {
+            log: appendLog,
+            status: data => {
+                applyStatus(data);
+                renderWorkers(data.workers);
+            },
+            queue: applyQueue,
+            task_started: task => {
+                removeQueuedTask(task);
+                outputFor(task.task_id, task.task_name);
+            },
+            task_completed: data => applyStats(data.stats),
+            worker: updateWorker,
+            approval: updateApprovalPanel,
+            session: session => {
+                sessions = sessions.concat([session]).slice(-10);
+                updateHistoryPanel();
+            },
+            output: appendOutput,
+        };
+        
+        // One socket carries commands to the agent and its changes back, resumed after the last seq applied
+        function connect() {
+            const scheme = location.protocol === 'https:' ? 'wss://' : 'ws://';
+            socket = new WebSocket(`${scheme}${location.host}/api/ws?since=${lastSeq}`);
+            socket.onopen = () => unacked.forEach(command => socket.send(JSON.stringify(command)));
+            socket.onmessage = e => {
+                const message = JSON.parse(e.data);
+                if (message.type === 'ack') {
+                    unacked.delete(message.id);
+                    if (!message.ok) console.error('Command failed:', message.error);
+                } else if (message.type === 'resync') {
+                    resync();
+                } else {
+                    if (message.seq !== null) lastSeq = message.seq;  // Streamed output has none
+                    if (handlers[message.type]) handlers[message.type](message.data);
+                }
+            };
+            socket.onclose = () => setTimeout(connect, 1000);
+        }
+        
+        // Load the full state, then follow the changes made after it
+        function resync() {
+            if (socket) {
+                socket.onclose = null;
+                socket.close();
+            }
+            updateDashboard().then(data => {
+                if (!data) return setTimeout(resync, 5000);
+                lastSeq = data.version;
+                connect();
+            });
+        }
+        
         function sendCommand(command, data = {}) {
-            fetch('/api/command', {
-                method: 'POST',
-                headers: {'Content-Type': 'application/json'},
-                body: JSON.stringify({command: command, ...data})
-            }).then(() => updateDashboard());
+            const message = {type: 'command', id: `${clientId}-${++commandCount}`, command: command, ...data};
+            unacked.set(message.id, message);
+            if (socket && socket.readyState === WebSocket.OPEN) socket.send(JSON.stringify(message));
+        }
+        
+        function updateObjective() {
+            const objective = document.getElementById('new-objective').value;
+            if (objective) {
+                sendCommand('update_objective', {objective: objective});
+                document.getElementById('new-objective').value = '';
+            }
+        }
+        
+        function addCustomTask() {
+            const task = document.getElementById('custom-task').value;
+            if (task) {
+                sendCommand('add_task', {task: task});
+                document.getElementById('custom-task').value = '';
+            }
+        }
+        
+        function editTask(taskId) {
+            const newDescription = prompt('Enter new task description:');
+            if (newDescription) {
+                sendCommand('edit_task', {task_id: taskId, description: newDescription});
+            }
+        }
+        
+        function removeTask(taskId) {
+            if (confirm('Remove this task?')) {
+                sendCommand('remove_task', {task_id: taskId});
+            }
         }
         
         function showSessionDetails(session) {
@@ -549,12 +785,9 @@ ENHANCED_DASHBOARD_HTML = """
             document.getElementById('session-modal').classList.remove('active');
         }
         
-        // Auto-refresh
-        setInterval(updateDashboard, 3000);
-        
         window.onload = () => {
             showTab('dashboard');
-            updateDashboard();
+            resync();
         };
     </script>
 </head>
@@ -594,6 +827,7 @@ ENHANCED_DASHBOARD_HTML = """
                 <div class="stat-card">
                     <div class="stat-value" id="tasks-count">0</div>
                     <div class="stat-label">Queue</div>
+                    <div class="stat-label" id="queue-pressure"></div>
                 </div>
                 <div class="stat-card">
                     <div class="stat-value" id="completed-count">0</div>
@@ -637,6 +871,20 @@ ENHANCED_DASHBOARD_HTML = """
                 </div>
             </div>
             
+            <div class="card">
+                <h3>👷 Workers</h3>
+                <div id="worker-list" class="scrollable">
+                    No workers running
+                </div>
+            </div>
+            
+            <div class="card">
+                <h3>🖋️ Live Output</h3>
+                <div id="live-output" class="logs-container">
+                    Waiting for a task...
+                </div>
+            </div>
+            
             <div class="card">
                 <h3>📜 Live Activity Logs</h3>
                 <div id="logs" class="logs-container">
@@ -673,13 +921,13 @@ ENHANCED_DASHBOARD_HTML = """
                 <div class="card">
                     <h3>🎯 Update Objective</h3>
                     <input type="text" id="new-objective" class="form-control" placeholder="Enter new objective...">
-                    <button class="btn btn-primary" onclick="sendCommand('update_objective')">Update Objective</button>
+                    <button class="btn btn-primary" onclick="updateObjective()">Update Objective</button>
                 </div>
                 
                 <div class="card">
                     <h3>➕ Add Custom Task</h3>
                     <input type="text" id="custom-task" class="form-control" placeholder="Enter task description...">
-                    <button class="btn btn-success" onclick="sendCommand('add_task')">Add Task</button>
+                    <button class="btn btn-success" onclick="addCustomTask()">Add Task</button>
                 </div>
             </div>
         </div>
@@ -704,33 +952,74 @@ ENHANCED_DASHBOARD_HTML = """
 def dashboard():
     return ENHANCED_DASHBOARD_HTML
 
+STATUS_FIELDS = {
+    'status': lambda: "Running" if agent_state.is_running else ("Paused" if agent_state.is_paused else "Stopped"),
+    'objective': lambda: agent_state.objective,
+    'iteration': lambda: agent_state.iteration,
+    'max_iterations': lambda: agent_state.max_iterations,
+    'tasks_count': lambda: len(agent_state.task_list),
+    'tasks': lambda: [t.to_dict() for t in agent_state.task_list],
+    'completed_tasks': lambda: agent_state.completed_tasks,
+    'pending_approval': lambda: agent_state.pending_approval,
+    'approval_required': lambda: agent_state.approval_required,
+    'session_history': lambda: agent_state.session_history,
+    'stats': lambda: agent_state.execution_stats,
+    'workers': lambda: agent_state.worker_pool.worker_status() if agent_state.worker_pool else [],
+    'critical_path': lambda: agent_state.scheduler.critical_path(),
+    'dedup': lambda: agent_state.deduplicator.stats,
+    'queue': lambda: agent_state.task_list.pressure(),
+    'convergence': lambda: agent_state.convergence.report(agent_state.iteration, agent_state.max_iterations),
+    'writer': lambda: dict(agent_state.writer.stats, backlog=agent_state.writer.backlog),
+    'logs': lambda: agent_state.logs[-50:]
+}
+# Event type -> status fields it changes; the loop publishes a status event after changing the run-wide diagnostics
+STATUS_CHANGED_BY = {
+    'status': ('status', 'objective', 'iteration', 'max_iterations', 'stats', 'workers',
+               'critical_path', 'dedup', 'convergence', 'writer'),
+    'queue': ('tasks_count', 'tasks', 'queue'),
+    'task_started': ('tasks_count', 'tasks', 'queue'),
+    'task_completed': ('stats',),
+    'worker': ('workers',),
+    'writer': ('writer',),
+    'approval': ('pending_approval', 'approval_required'),
+}
+# Event type -> (list field it appends to, key of the new entry in the event data)
+STATUS_APPENDED_BY = {
+    'log': ('logs', None),
+    'task_completed': ('completed_tasks', 'task'),
+    'session': ('session_history', None),
+}
+
 @app.route('/api/status')
 def api_status():
-    if FULL_FEATURES:
-        status = "Running" if agent_state.is_running else ("Paused" if agent_state.is_paused else "Stopped")
-        return jsonify({
-            'status': status,
-            'objective': agent_state.objective,
-            'iteration': agent_state.iteration,
-            'max_iterations': agent_state.max_iterations,
-            'tasks_count': len(agent_state.task_list),
-            'tasks': [{'task_id': t['task_id'], 'task_name': t['task_name']} for t in list(agent_state.task_list)],
-            'completed_tasks': agent_state.completed_tasks,
-            'pending_approval': agent_state.pending_approval,
-            'approval_required': agent_state.approval_required,
-            'session_history': agent_state.session_history,
-            'stats': agent_state.execution_stats,
-            'logs': agent_state.logs[-50:]
-        })
+    """The dashboard state, or with ?since=<version> only what changed after that version; 304 when nothing has."""
+    since = request.args.get('since')
+    version = agent_state.events.version
+    if since == version or request.if_none_match.contains(version):
+        response = Response(status=304)
+    elif FULL_FEATURES:
+        version, missed = agent_state.events.changes(since)  # Read first: later changes reach the page as events
+        response = jsonify(dict(status_body(STATUS_FIELDS, missed, STATUS_CHANGED_BY, STATUS_APPENDED_BY),
+                                version=version))
     else:
-        return jsonify(demo_data)
+        response = jsonify(dict(demo_data, version=version))
+    response.set_etag(version)
+    response.cache_control.no_cache = True
+    return response
 
-@app.route('/api/command', methods=['POST'])
-def api_command():
+@app.route('/api/events')
+def api_events():
+    """Server-Sent Events stream of dashboard changes, resumed after Last-Event-ID or ?since=."""
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('since')
+    return Response(agent_state.events.stream(last_event_id), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def run_command(data):
+    """Apply one dashboard command; returns False when the command is unknown."""
     if not FULL_FEATURES:
-        return jsonify({'success': True, 'demo_mode': True})
+        return True
     
-    command = request.json.get('command')
+    command = data.get('command')
     
     if command == 'start':
         if not agent_state.is_running:
@@ -738,6 +1027,7 @@ def api_command():
             agent_state.is_paused = False
             agent_state.start_time = datetime.datetime.now().isoformat()
             agent_state.add_log("🚀 Agent started", "success")
+            agent_state.publish_status()
             if FULL_FEATURES:
                 threading.Thread(target=run_enhanced_agent_background, daemon=True).start()
     
@@ -745,15 +1035,76 @@ def api_command():
         agent_state.is_paused = not agent_state.is_paused
         status = "paused" if agent_state.is_paused else "resumed"
         agent_state.add_log(f"⏸️ Agent {status}", "warning")
+        agent_state.publish_status()
     
     elif command == 'stop':
         agent_state.is_running = False
         agent_state.is_paused = False
         agent_state.save_session()
         agent_state.add_log("⏹️ Agent stopped", "error")
+        agent_state.publish_status()
+    
+    elif command == 'approve_task':
+        approved = data.get('approved', False)
+        if agent_state.pending_approval:
+            if approved:
+                agent_state.add_log(f"✅ Task approved: {agent_state.pending_approval['task_name'][:30]}...", "success")
+            else:
+                agent_state.add_log(f"❌ Task rejected: {agent_state.pending_approval['task_name'][:30]}...", "warning")
+            agent_state.pending_approval['approved'] = approved
+    
+    elif command == 'add_task':
+        task_desc = data.get('task')
+        if task_desc:
+            agent_state.task_id_counter += 1
+            new_task = Task(agent_state.task_id_counter, task_desc)
+            agent_state.task_list.append(new_task)
+            agent_state.add_log(f"➕ Custom task added: {task_desc[:30]}...", "info")
+            agent_state.publish_queue()
     
+    elif command == 'edit_task':
+        task_id = int(data.get('task_id'))
+        new_desc = data.get('description')
+        if agent_state.task_list.rename(task_id, new_desc):
+            agent_state.add_log(f"✏️ Task edited: #{task_id}", "info")
+            agent_state.publish_queue()
+    
+    elif command == 'remove_task':
+        task_id = int(data.get('task_id'))
+        if agent_state.task_list.discard(task_id):
+            agent_state.add_log(f"🗑️ Task removed: #{task_id}", "warning")
+            agent_state.publish_queue()
+    
+    elif command == 'reprioritize':
+        agent_state.force_full_reprioritize = True
+        agent_state.add_log("📋 Full re-rank requested", "info")
+    
+    elif command == 'update_objective':
+        new_objective = data.get('objective')
+        if new_objective:
+            agent_state.objective = new_objective
+            agent_state.add_log(f"🎯 Objective updated: {new_objective[:50]}...", "info")
+            agent_state.publish_status()
+    
+    else:
+        return False
+    return True
+
+control = ControlChannel(agent_state.events, run_command)
+
+@app.route('/api/command', methods=['POST'])
+def api_command():
+    if not run_command(request.json):
+        return jsonify({'success': False, 'error': f"unknown command: {request.json.get('command')}"}), 400
+    if not FULL_FEATURES:
+        return jsonify({'success': True, 'demo_mode': True})
     return jsonify({'success': True})
 
+@sock.route('/api/ws')
+def api_ws(ws):
+    """WebSocket carrying commands in and acknowledgements and events out, resumed after ?since=."""
+    control.serve(ws, request.args.get('since'))
+
 def run_enhanced_agent_background():
     """Enhanced background agent with approval workflow."""
     if not FULL_FEATURES:
@@ -763,70 +1114,122 @@ def run_enhanced_agent_background():
     setup_supabase_table()
     
     if not agent_state.task_list:
-        first_task = {"task_id": 1, "task_name": YOUR_FIRST_TASK}
+        first_task = Task(1, YOUR_FIRST_TASK)
         agent_state.task_list.append(first_task)
         agent_state.add_log(f"📝 Added first task: {YOUR_FIRST_TASK}", "info")
+        agent_state.publish_queue()
     
-    while agent_state.is_running and agent_state.task_list and agent_state.iteration < agent_state.max_iterations:
-        if agent_state.is_paused:
-            time.sleep(1)
-            continue
+    pool = WorkerPool(MAX_WORKERS, on_status=lambda worker: agent_state.events.publish("worker", worker))
+    agent_state.worker_pool = pool
+    agent_state.publish_status()
+    
+    try:
+        while agent_state.is_running and (agent_state.task_list or pool.has_pending()) and agent_state.iteration < agent_state.max_iterations:
+            if agent_state.is_paused:
+                time.sleep(1)
+                continue
         
-        task = agent_state.task_list.popleft()
-        agent_state.current_task = task
+            while (agent_state.task_list and pool.free_slots
+                   and agent_state.iteration + pool.pending_count < agent_state.max_iterations):
+                task = agent_state.scheduler.pop_ready(agent_state.task_list, pool.pending_tasks())
+                if task is None:
+                    break
+                agent_state.current_task = task
+                agent_state.add_log(f"⚡ Executing: {task.task_name[:50]}...", "info")
+                agent_state.events.publish("task_started", task.to_dict())
+                pool.submit(task, execution_agent, agent_state.objective, task.task_name, None, agent_state.output_sink(task))
         
-        agent_state.add_log(f"⚡ Executing: {task['task_name'][:50]}...", "info")
+            if not pool.has_pending():
+                continue
         
-        try:
-            start_time = time.time()
-            result = execution_agent(agent_state.objective, task["task_name"])
-            execution_time = time.time() - start_time
+            try:
+                task, result, execution_time = pool.next_result()
+                agent_state.scheduler.mark_finished(task.task_id, execution_time)
+                agent_state.deduplicator.mark_completed(task)
             
-            agent_state.execution_stats['total_tasks_completed'] += 1
+                agent_state.execution_stats['total_tasks_completed'] += 1
             
-            completed_task = {
-                'task_id': task['task_id'],
-                'task_name': task['task_name'],
-                'result': result[:200] + '...' if len(result) > 200 else result,
-                'completed_at': datetime.datetime.now().isoformat(),
-                'execution_time': execution_time
-            }
-            agent_state.completed_tasks.append(completed_task)
+                completed_task = {
+                    'task_id': task.task_id,
+                    'task_name': task.task_name,
+                    'result': result[:200] + '...' if len(result) > 200 else result,
+                    'completed_at': datetime.datetime.now().isoformat(),
+                    'execution_time': execution_time
+                }
+                agent_state.completed_tasks.append(completed_task)
             
-            agent_state.add_log(f"✅ Task completed: {task['task_name'][:30]}...", "success")
+                agent_state.add_log(f"✅ Task completed: {task.task_name[:30]}...", "success")
+                agent_state.events.publish("task_completed", {"task": completed_task, "stats": agent_state.execution_stats})
             
-            embedding = get_mistral_embedding(result)
-            store_task_result(str(task['task_id']), task["task_name"], result, embedding)
+                # Queue the result for embedding and storage in the background
+                agent_state.writer.submit(task.task_id, task.task_name, result, on_embedded=agent_state.on_result_embedded)
             
-            new_tasks = task_creation_agent(
-                agent_state.objective,
-                {"data": result},
-                task["task_name"],
-                [t["task_name"] for t in agent_state.task_list]
-            )
+                if agent_state.convergence.converged and agent_state.convergence.action == "throttle":
+                    new_tasks, generated = [], []  # Converged: drain the queue without new tasks
+                else:
+                    new_tasks = task_creation_agent(
+                        agent_state.objective,
+                        {"data": result},
+                        task.task_name,
+                        [t.task_name for t in agent_state.task_list] + [t.task_name for t in pool.pending_tasks()]
+                    )
+                    generated = [t.task_name for t in new_tasks]
+                    new_tasks = agent_state.deduplicator.filter(new_tasks, list(agent_state.task_list) + pool.pending_tasks())
+                results = [agent_state.embedded.popleft() for _ in range(len(agent_state.embedded))]
+                agent_state.convergence.observe(agent_state.iteration + 1, results,
+                                                [agent_state.deduplicator.vectors[name] for name in generated])
             
-            for new_task in new_tasks[:2]:
-                agent_state.task_id_counter += 1
-                new_task.update({"task_id": agent_state.task_id_counter})
-                agent_state.task_list.append(new_task)
+                accepted_tasks = new_tasks[:2]
+                for new_task in accepted_tasks:
+                    agent_state.task_id_counter += 1
+                    new_task.task_id = agent_state.task_id_counter
+                link_sibling_dependencies(accepted_tasks)
+                for new_task in accepted_tasks:
+                    agent_state.scheduler.add(new_task, parent_id=task.task_id)
+                    agent_state.task_list.append(new_task)
             
-            if new_tasks:
-                agent_state.add_log(f"💡 Generated {len(new_tasks[:2])} new tasks", "info")
+                if new_tasks:
+                    agent_state.add_log(f"💡 Generated {len(new_tasks[:2])} new tasks", "info")
             
-            if len(agent_state.task_list) > 1:
-                prioritization_agent(int(task["task_id"]), agent_state.task_list, agent_state.objective)
-                agent_state.add_log("📋 Tasks reprioritized", "info")
+                mode = reprioritize_tasks(
+                    task.task_id,
+                    agent_state.task_list,
+                    agent_state.objective,
+                    accepted_tasks,
+                    agent_state.iteration + 1,
+                    force_full=agent_state.force_full_reprioritize,
+                    scorer=agent_state.scorer
+                )
+                if mode == "full":
+                    agent_state.force_full_reprioritize = False
+                if mode != "skipped":
+                    agent_state.add_log(f"📋 Tasks reprioritized ({mode})", "info")
             
-            agent_state.iteration += 1
-            time.sleep(2)
+                agent_state.iteration += 1
+                agent_state.publish_queue()
+                agent_state.publish_status()
+                if agent_state.checkpoint:
+                    agent_state.checkpoint.save(agent_state.objective, agent_state.iteration, agent_state.task_id_counter,
+                                                agent_state.task_list, agent_state.scheduler, pool.pending_tasks(),
+                                                agent_state.writer.unstored())
+                if agent_state.convergence.converged_at == agent_state.iteration:
+                    agent_state.add_log(f"🧊 Converged: rolling novelty {agent_state.convergence.rolling_novelty:.3f}", "warning")
+                    if agent_state.convergence.action == "stop":
+                        break
+                time.sleep(2)
             
-        except Exception as e:
-            agent_state.add_log(f"❌ Error executing task: {str(e)[:50]}...", "error")
-            time.sleep(5)
+            except Exception as e:
+                agent_state.add_log(f"❌ Error executing task: {str(e)[:50]}...", "error")
+                time.sleep(5)
     
-    agent_state.is_running = False
-    agent_state.save_session()
-    agent_state.add_log("🏁 Agent execution completed", "success")
+    finally:
+        pool.shutdown(wait=False)
+        agent_state.writer.flush()
+        agent_state.worker_pool = None
+        agent_state.is_running = False
+        agent_state.save_session()
+        agent_state.add_log("🏁 Agent execution completed", "success")
+        agent_state.publish_status()
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
@@ -836,8 +1239,9 @@ if __name__ == '__main__':
     
     if FULL_FEATURES:
         print("✅ Production Mode - Full AI Agent Functionality")
-        first_task = {"task_id": 1, "task_name": YOUR_FIRST_TASK}
-        agent_state.task_list.append(first_task)
+        if '--resume' not in sys.argv or not agent_state.resume_from_checkpoint():
+            first_task = Task(1, YOUR_FIRST_TASK)
+            agent_state.task_list.append(first_task)
         agent_state.add_log("🤖 Production dashboard initialized", "info")
     else:
         print("⚠️  Demo Mode - Configure API keys for full functionality")
@@ -846,4 +1250,8 @@ if __name__ == '__main__':
     print(f"🔗 Dashboard URL: http://localhost:{port}")
     print("🔧 Use Ctrl+C to stop the server")
     
-    app.run(debug=False, host=host, port=port)
\ No newline at end of file
+    try:
+        app.run(debug=False, host=host, port=port)
+    finally:
+        if agent_state.writer:
+            agent_state.writer.close()  # Store results still queued when the server stops
\ No newline at end of file
@@ -7,7 +7,6 @@ This version allows real-time user interaction and control.
 import os
 import sys
 import time
-from collections import deque
 from typing import Dict, List
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
@@ -15,17 +14,21 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from src.agents import (
     get_mistral_embedding,
     task_creation_agent,
-    prioritization_agent,
+    reprioritize_tasks,
     execution_agent,
     context_agent,
 )
 from src.database import setup_supabase_table, store_task_result, cleanup_supabase_table
-from src.config import OBJECTIVE, YOUR_TABLE_NAME, YOUR_FIRST_TASK
+from src.config import OBJECTIVE, YOUR_TABLE_NAME, YOUR_FIRST_TASK, TASK_QUEUE_CAPACITY, TASK_OVERFLOW_PATH, run_path
+from src.task_queue import PriorityTaskQueue, Task
+from src.scoring import LocalPriorityScorer
 
 
 class InteractiveTaskAgent:
     def __init__(self):
-        self.task_list = deque([])
+        self.task_list = PriorityTaskQueue(capacity=TASK_QUEUE_CAPACITY, overflow_path=run_path(TASK_OVERFLOW_PATH, "interactive"),
+                                           run_id="interactive")
+        self.scorer = LocalPriorityScorer()
         self.task_id_counter = 1
         self.objective = OBJECTIVE
         self.paused = False
@@ -60,7 +63,10 @@ class InteractiveTaskAgent:
             return
             
         for i, task in enumerate(self.task_list, 1):
-            print(f"{i}. [{task['task_id']}] {task['task_name']}")
+            print(f"{i}. [{task.task_id}] {task.task_name}")
+        spilled = self.task_list.pressure()["spilled_now"]
+        if spilled:
+            print(f"📦 {spilled} lower-priority tasks waiting on disk")
     
     def display_stats(self):
         """Display agent statistics."""
@@ -86,7 +92,7 @@ class InteractiveTaskAgent:
         task_name = input("Enter task description: ").strip()
         if task_name:
             self.task_id_counter += 1
-            new_task = {"task_id": self.task_id_counter, "task_name": task_name}
+            new_task = Task(self.task_id_counter, task_name)
             self.task_list.append(new_task)
             print(f"✅ Added task: {task_name}")
         else:
@@ -105,11 +111,8 @@ class InteractiveTaskAgent:
                 return
             if 1 <= choice <= len(self.task_list):
                 removed_task = list(self.task_list)[choice - 1]
-                # Convert deque to list, remove item, convert back
-                task_list_copy = list(self.task_list)
-                task_list_copy.pop(choice - 1)
-                self.task_list = deque(task_list_copy)
-                print(f"✅ Removed task: {removed_task['task_name']}")
+                self.task_list.remove(removed_task)
+                print(f"✅ Removed task: {removed_task.task_name}")
             else:
                 print("❌ Invalid task number")
         except ValueError:
@@ -125,8 +128,8 @@ class InteractiveTaskAgent:
         task = self.task_list.popleft()
         
         self.print_header("NEXT TASK", "\033[92m\033[1m")
-        print(f"🎯 Task ID: {task['task_id']}")
-        print(f"📝 Description: {task['task_name']}")
+        print(f"🎯 Task ID: {task.task_id}")
+        print(f"📝 Description: {task.task_name}")
         print(f"🎪 Objective: {self.objective}")
         
         # Ask for approval
@@ -143,7 +146,7 @@ class InteractiveTaskAgent:
             elif choice in ['e', 'edit']:
                 new_description = input("Enter new task description: ").strip()
                 if new_description:
-                    task['task_name'] = new_description
+                    task.task_name = new_description
                     print(f"✅ Task updated: {new_description}")
                 break
             elif choice in ['s', 'skip']:
@@ -154,7 +157,7 @@ class InteractiveTaskAgent:
         
         # Execute task
         print("\n⚡ Executing task...")
-        result = execution_agent(self.objective, task["task_name"])
+        result = execution_agent(self.objective, task.task_name)
         
         self.print_header("TASK RESULT", "\033[93m\033[1m")
         print(result)
@@ -162,7 +165,8 @@ class InteractiveTaskAgent:
         # Store result
         print("\n💾 Storing result...")
         embedding = get_mistral_embedding(result)
-        success = store_task_result(str(task['task_id']), task["task_name"], result, embedding)
+        self.scorer.add_result(embedding)
+        success = store_task_result(task.task_id, task.task_name, result, embedding)
         
         if success:
             print("✅ Result stored successfully")
@@ -182,8 +186,8 @@ class InteractiveTaskAgent:
         new_tasks = task_creation_agent(
             self.objective,
             {"data": result},
-            completed_task["task_name"],
-            [t["task_name"] for t in self.task_list]
+            completed_task.task_name,
+            [t.task_name for t in self.task_list]
         )
         
         if not new_tasks:
@@ -192,15 +196,15 @@ class InteractiveTaskAgent:
         
         print(f"💡 Generated {len(new_tasks)} new tasks:")
         for i, task in enumerate(new_tasks, 1):
-            print(f"  {i}. {task['task_name']}")
+            print(f"  {i}. {task.task_name}")
         
         # Ask user to approve new tasks
         approved_tasks = []
         for task in new_tasks:
-            choice = input(f"\n➕ Add task '{task['task_name'][:50]}...'? [y]/n: ").lower().strip()
+            choice = input(f"\n➕ Add task '{task.task_name[:50]}...'? [y]/n: ").lower().strip()
             if choice in ['', 'y', 'yes']:
                 self.task_id_counter += 1
-                task.update({"task_id": self.task_id_counter})
+                task.task_id = self.task_id_counter
                 approved_tasks.append(task)
                 self.task_list.append(task)
                 print("✅ Task added")
@@ -209,11 +213,19 @@ class InteractiveTaskAgent:
         
         # Prioritize tasks
         if approved_tasks and len(self.task_list) > 1:
-            choice = input("\n📋 Reprioritize tasks? [y]/n: ").lower().strip()
-            if choice in ['', 'y', 'yes']:
+            choice = input("\n📋 Reprioritize tasks? [y]/n/[f]ull re-rank: ").lower().strip()
+            if choice in ['', 'y', 'yes', 'f', 'full']:
                 print("🔄 Reprioritizing tasks...")
-                prioritization_agent(int(completed_task["task_id"]), self.task_list, self.objective)
-                print("✅ Tasks reprioritized")
+                mode = reprioritize_tasks(
+                    completed_task.task_id,
+                    self.task_list,
+                    self.objective,
+                    approved_tasks,
+                    self.iteration + 1,
+                    force_full=choice in ['f', 'full'],
+                    scorer=self.scorer
+                )
+                print(f"✅ Tasks reprioritized ({mode})")
     
     def run(self):
         """Main interactive loop."""
@@ -225,7 +237,7 @@ class InteractiveTaskAgent:
         setup_supabase_table()
         
         # Add first task
-        first_task = {"task_id": 1, "task_name": YOUR_FIRST_TASK}
+        first_task = Task(1, YOUR_FIRST_TASK)
         self.task_list.append(first_task)
         
         print(f"\n🎯 Objective: {self.objective}")
@@ -285,7 +297,7 @@ class InteractiveTaskAgent:
         if self.task_list:
             print(f"\n📋 Remaining tasks: {len(self.task_list)}")
             for t in self.task_list:
-                print(f"  - {t['task_name']}")
+                print(f"  - {t.task_name}")
         
         print(f"\n📊 Total iterations: {self.iteration}")
         
@@ -1,27 +1,57 @@
-from typing import Dict, List
-from collections import deque
+import re
+from typing import Callable, Dict, List
 from mistralai import Mistral
-from src.config import MISTRAL_API_KEY, supabase
+from src.config import (
+    MISTRAL_API_KEY,
+    PRIORITIZATION_MODE,
+    FULL_REPRIORITIZE_EVERY,
+    PRIORITIZATION_WINDOW,
+    MISTRAL_REQUESTS_PER_SECOND,
+)
+from src.database import match_documents
+from src.limits import RateLimiter
+from src.scheduler import parse_task_dependencies
+from src.task_queue import PriorityTaskQueue, Task
+from src.vectors import EMBEDDING_DIMENSIONS
 import numpy as np
 
 mistral_client = Mistral(api_key=MISTRAL_API_KEY)
+mistral_limiter = RateLimiter(MISTRAL_REQUESTS_PER_SECOND)  # Shared by every run in the process
+query_embeddings = {}  # Context query -> embedding, shared by every run in the process
 
 
-def get_mistral_embedding(text: str) -> List[float]:
-    """Generate embeddings using Mistral's embedding model."""
+def get_mistral_embedding(text: str) -> np.ndarray:
+    """Generate embeddings using Mistral's embedding model, as a float32 array."""
     try:
         text = text.replace("\n", " ")
+        mistral_limiter.acquire()
         response = mistral_client.embeddings.create(
             model="mistral-embed",
             inputs=[text]
         )
-        return response.data[0].embedding
+        return np.asarray(response.data[0].embedding, dtype=np.float32)
     except Exception as e:
         print(f"❌ Error generating embedding: {e}")
-        return [0.0] * 1024  # Fallback to zero vector
+        return np.zeros(EMBEDDING_DIMENSIONS, dtype=np.float32)  # Fallback to zero vector
 
 
-def task_creation_agent(objective: str, result: Dict, task_description: str, task_list: List[str]) -> List[Dict]:
+def get_mistral_embeddings(texts: List[str]) -> np.ndarray:
+    """Generate embeddings for several texts in a single request, one float32 row per text."""
+    if not texts:
+        return np.zeros((0, EMBEDDING_DIMENSIONS), dtype=np.float32)
+    try:
+        mistral_limiter.acquire()
+        response = mistral_client.embeddings.create(
+            model="mistral-embed",
+            inputs=[text.replace("\n", " ") for text in texts]
+        )
+        return np.asarray([item.embedding for item in response.data], dtype=np.float32)
+    except Exception as e:
+        print(f"❌ Error generating embeddings: {e}")
+        return np.zeros((len(texts), EMBEDDING_DIMENSIONS), dtype=np.float32)  # Fallback to zero vectors
+
+
+def task_creation_agent(objective: str, result: Dict, task_description: str, task_list: List[str]) -> List[Task]:
     """Generate new tasks based on the objective and previous results."""
     prompt = f"""You are a task creation AI that helps achieve objectives through systematic task generation.
 
@@ -40,10 +70,12 @@ Requirements:
 - Tasks should not duplicate existing incomplete tasks
 - Tasks should build upon the result of the completed task
 - Focus on the most important next steps
+- If a task can only start after another task in your list is done, end it with "(after N)", where N is that task's line number in your list; leave independent tasks unmarked
 
 Return only the task descriptions, one per line, without numbers or bullets."""
 
     try:
+        mistral_limiter.acquire()
         response = mistral_client.chat.complete(
             model="mistral-large-latest",
             messages=[{"role": "user", "content": prompt}],
@@ -54,18 +86,28 @@ Return only the task descriptions, one per line, without numbers or bullets."""
         new_tasks_text = response.choices[0].message.content.strip()
         new_tasks = [line.strip() for line in new_tasks_text.split('\n') if line.strip()]
         
-        return [{"task_name": task_name} for task_name in new_tasks if task_name]
+        tasks = []
+        for line in new_tasks:
+            task_name, after = parse_task_dependencies(line)
+            if task_name:
+                tasks.append(Task(None, task_name, after=after))
+        return tasks
     except Exception as e:
         print(f"❌ Error in task_creation_agent: {e}")
         return []
 
 
-def prioritization_agent(this_task_id: int, task_list: deque, objective: str):
-    """Reprioritize the task list based on the objective."""
+def prioritization_agent(this_task_id: int, task_list: PriorityTaskQueue, objective: str):
+    """Reprioritize the task list based on the objective.
+
+    The model's ordering is applied by rescoring the queued tasks in place, so
+    task IDs, dependencies and any tasks the model leaves out are preserved.
+    """
     if not task_list:
         return
         
-    task_names = [t["task_name"] for t in task_list]
+    queued_tasks = list(task_list)
+    task_names = [t.task_name for t in queued_tasks]
     next_task_id = int(this_task_id) + 1
     
     prompt = f"""You are a task prioritization AI. Your goal is to reorder tasks to best achieve the objective.
@@ -88,6 +130,7 @@ etc.
 Use the exact task descriptions provided above."""
 
     try:
+        mistral_limiter.acquire()
         response = mistral_client.chat.complete(
             model="mistral-large-latest",
             messages=[{"role": "user", "content": prompt}],
@@ -98,23 +141,122 @@ Use the exact task descriptions provided above."""
         new_tasks_text = response.choices[0].message.content.strip()
         new_tasks = new_tasks_text.split('\n')
         
-        task_list.clear()
+        tasks_by_name = {}
+        for task in queued_tasks:
+            tasks_by_name.setdefault(task.task_name, []).append(task)
+        
+        ranked_tasks = []
         for task_string in new_tasks:
             task_string = task_string.strip()
             if '. ' in task_string:
                 task_parts = task_string.split(".", 1)
                 if len(task_parts) == 2:
-                    task_id = task_parts[0].strip()
                     task_name = task_parts[1].strip()
-                    if task_name:  # Only add non-empty tasks
-                        task_list.append({"task_id": task_id, "task_name": task_name})
+                    if tasks_by_name.get(task_name):
+                        ranked_tasks.append(tasks_by_name[task_name].pop(0))
+        
+        # Tasks the model left out keep their relative order behind the ranked ones
+        ranked_ids = {id(task) for task in ranked_tasks}
+        ranked_tasks.extend(task for task in queued_tasks if id(task) not in ranked_ids)
+        for rank, task in enumerate(ranked_tasks):
+            task_list.update_priority(task.task_id, len(ranked_tasks) - rank)
     except Exception as e:
         print(f"❌ Error in prioritization_agent: {e}")
 
 
-def execution_agent(objective: str, task: str) -> str:
-    """Execute a specific task toward the objective."""
-    context = context_agent(query=objective, n=5)
+def placement_agent(new_tasks: List[Task], task_list: PriorityTaskQueue, objective: str,
+                    window: int = PRIORITIZATION_WINDOW):
+    """Slot newly created tasks into the existing order without re-ranking the rest.
+
+    Only the top ``window`` queued tasks are shown and the model answers with one
+    short line per new task, so the call stays small as the queue grows. Each new
+    task is rescored between its neighbours; the rest of the queue is untouched.
+    """
+    new_ids = {t.task_id for t in new_tasks}
+    existing = [t for t in task_list if t.task_id not in new_ids]
+    if not existing or not new_tasks:
+        return
+    shown = existing[:window]
+    labels = {chr(ord("A") + i): task for i, task in enumerate(new_tasks[:26])}
+
+    prompt = f"""You are a task prioritization AI. Place new tasks into an existing priority order without changing that order.
+
+OBJECTIVE: {objective}
+
+CURRENT TASKS, HIGHEST PRIORITY FIRST:
+{chr(10).join([f"{i + 1}. {t.task_name}" for i, t in enumerate(shown)])}
+
+NEW TASKS:
+{chr(10).join([f"{label}. {t.task_name}" for label, t in labels.items()])}
+
+For each new task, give the number of the current task it should run just before, or {len(shown) + 1} if it should run after all of them.
+Reply with one line per new task in the exact format:
+A: 3"""
+
+    try:
+        mistral_limiter.acquire()
+        response = mistral_client.chat.complete(
+            model="mistral-large-latest",
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.3,
+            max_tokens=10 * len(labels) + 20
+        )
+        
+        slots = {}
+        for line in response.choices[0].message.content.strip().split('\n'):
+            match = re.match(r"\s*([A-Z])\s*[:.)-]\s*(\d+)", line)
+            if match and match.group(1) in labels:
+                slot = min(max(int(match.group(2)), 1), len(shown) + 1)
+                slots.setdefault(slot, []).append(labels.pop(match.group(1)))
+        
+        # Spread the tasks placed in each slot evenly between the neighbouring scores
+        for slot, placed in slots.items():
+            above = existing[slot - 2].priority if slot > 1 else existing[0].priority + 1
+            below = existing[slot - 1].priority if slot - 1 < len(existing) else above - 1
+            for j, task in enumerate(placed):
+                task_list.update_priority(task.task_id, above - (above - below) * (j + 1) / (len(placed) + 1))
+    except Exception as e:
+        print(f"❌ Error in placement_agent: {e}")
+
+
+def reprioritize_tasks(this_task_id: int, task_list: PriorityTaskQueue, objective: str,
+                       new_tasks: List[Task], iteration: int, force_full: bool = False, scorer=None) -> str:
+    """Run the configured prioritization pass and return which one ran.
+
+    A full re-rank runs in "full" mode, when forced, and in "incremental" mode
+    every FULL_REPRIORITIZE_EVERY iterations. In "local" mode the queue is
+    rescored by ``scorer`` (a LocalPriorityScorer) without a model call.
+    Otherwise only newly created tasks are placed, and nothing is sent to the
+    model when no new task was queued.
+    """
+    if len(task_list) < 2:
+        return "skipped"
+    if (force_full or PRIORITIZATION_MODE == "full"
+            or (PRIORITIZATION_MODE == "incremental" and FULL_REPRIORITIZE_EVERY
+                and iteration % FULL_REPRIORITIZE_EVERY == 0)):
+        prioritization_agent(this_task_id, task_list, objective)
+        return "full"
+    if PRIORITIZATION_MODE == "local" and scorer is not None:
+        scorer.rank(task_list, objective)
+        return "local"
+    spilled = set(task_list.spilled_ids())
+    queued_new = [t for t in new_tasks if t in task_list or t.task_id in spilled]
+    if not queued_new:
+        return "skipped"
+    placement_agent(queued_new, task_list, objective)
+    return "incremental"
+
+
+def execution_agent(objective: str, task: str, context_filter: Dict = None,
+                    on_token: Callable[[str], None] = None) -> str:
+    """Execute a specific task toward the objective.
+
+    ``context_filter`` limits retrieved context to results whose columns
+    equal it, e.g. ``{"run_id": ...}`` to stay within one run. With
+    ``on_token``, the completion is streamed and each piece of text is passed
+    to it as it arrives; the full result is still returned at the end.
+    """
+    context = context_agent(query=objective, n=5, filter=context_filter)
     context_text = "\n".join([f"- {item}" for item in context]) if context else "No previous context available."
     
     prompt = f"""You are an AI agent executing a specific task to achieve an objective.
@@ -135,35 +277,45 @@ Execute this task thoroughly and provide a detailed result. Your response should
 TASK EXECUTION:"""
 
     try:
-        response = mistral_client.chat.complete(
+        mistral_limiter.acquire()
+        if on_token is None:
+            response = mistral_client.chat.complete(
+                model="mistral-large-latest",
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.7,
+                max_tokens=1000
+            )
+            return response.choices[0].message.content.strip()
+        parts = []
+        for event in mistral_client.chat.stream(
             model="mistral-large-latest",
             messages=[{"role": "user", "content": prompt}],
             temperature=0.7,
             max_tokens=1000
-        )
-        return response.choices[0].message.content.strip()
+        ):
+            token = event.data.choices[0].delta.content if event.data.choices else None
+            if isinstance(token, str) and token:
+                parts.append(token)
+                on_token(token)
+        return "".join(parts).strip()
     except Exception as e:
         print(f"❌ Error in execution_agent: {e}")
         return f"Task execution failed due to error: {str(e)}"
 
 
-def context_agent(query: str, n: int) -> List[str]:
+def context_agent(query: str, n: int, filter: Dict = None) -> List[str]:
     """Retrieve relevant context from previous task results."""
     try:
-        query_embedding = get_mistral_embedding(query)
-        response = supabase.rpc(
-            "match_documents",
-            {
-                "query_embedding": query_embedding,
-                "match_count": n,
-                "filter": {}
-            }
-        ).execute()
+        query_embedding = query_embeddings.get(query)
+        if query_embedding is None:
+            query_embedding = get_mistral_embedding(query)
+            if query_embedding.any():  # Never cache the zero-vector fallback
+                query_embeddings[query] = query_embedding
+        matches = match_documents(query_embedding, n, filter, columns=("task_name",))
         
-        if response.data:
-            sorted_results = sorted(response.data, key=lambda x: x.get("similarity", 0), reverse=True)
-            return [item["metadata"].get("task", "") for item in sorted_results 
-                   if item.get("metadata") and item["metadata"].get("task")]
+        if matches:
+            sorted_results = sorted(matches, key=lambda x: x.get("similarity", 0), reverse=True)
+            return [item["task_name"] for item in sorted_results if item.get("task_name")]
         return []
     except Exception as e:
         print(f"❌ Error in context_agent: {e}")
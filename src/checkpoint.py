@@ -0,0 +1,95 @@
+import json
+import os
+import tempfile
+import time
+from typing import Dict, Iterable, Optional
+from src.dedup import TaskDeduplicator
+from src.scheduler import TaskScheduler
+from src.task_queue import PriorityTaskQueue, Task
+
+CHECKPOINT_VERSION = 1
+
+
+class RunCheckpoint:
+    """Per-iteration snapshot of a run, replaced atomically so a crash never leaves a torn file.
+
+    A checkpoint holds the objective, the iteration and task ID counters, every
+    queued task (spilled ones included), the scheduler's dependency graph with
+    the IDs of finished tasks, and the tasks that were still running. Running
+    tasks had no committed result, and neither had ``unstored`` ones, finished
+    but with results the writer had not stored yet; a resumed run queues both
+    again at the front. Tasks with stored results are never executed twice.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def save(self, objective: str, iteration: int, task_id_counter: int, task_list: PriorityTaskQueue,
+             scheduler: TaskScheduler, in_flight: Iterable[Task] = (), unstored: Iterable[Task] = ()):
+        unstored = list(unstored)
+        scheduler_state = scheduler.state()
+        if unstored:
+            unstored_ids = {task.task_id for task in unstored}
+            scheduler_state["finished"] = [t for t in scheduler_state["finished"] if t not in unstored_ids]
+        state = {
+            "version": CHECKPOINT_VERSION,
+            "saved_at": time.time(),
+            "objective": objective,
+            "iteration": iteration,
+            "task_id_counter": task_id_counter,
+            "queue": [task.to_dict() for task in task_list.snapshot()],
+            "in_flight": [task.to_dict() for task in unstored + list(in_flight)],
+            "scheduler": scheduler_state,
+        }
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix=".checkpoint-", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(state, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def load(self) -> Optional[Dict]:
+        """Return the saved state, or None when there is no usable checkpoint."""
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"❌ Error reading checkpoint {self.path}: {e}")
+            return None
+        if state.get("version") != CHECKPOINT_VERSION:
+            print(f"⚠️  Ignoring checkpoint {self.path} written by an incompatible version")
+            return None
+        return state
+
+    def resume(self, objective: str, task_list: PriorityTaskQueue, scheduler: TaskScheduler,
+               deduplicator: TaskDeduplicator = None) -> Optional[Dict]:
+        """Load the last checkpoint for ``objective`` into fresh run objects.
+
+        Returns the saved state, whose ``iteration`` and ``task_id_counter`` the
+        caller continues from, or None when there is nothing to resume.
+        """
+        state = self.load()
+        if state is None:
+            return None
+        if state["objective"] != objective:
+            print(f"⚠️  Checkpoint is for a different objective: {state['objective']}")
+            return None
+
+        scheduler.restore(state["scheduler"])
+        task_list.clear()
+        for data in state["queue"]:
+            task_list.push(Task.from_dict(data))
+        for data in reversed(state["in_flight"]):
+            task_list.appendleft(Task.from_dict(data))
+        if deduplicator is not None:
+            for task in scheduler.finished_tasks():
+                deduplicator.mark_completed(task)
+        return state
@@ -1,4 +1,5 @@
 import os
+from typing import Optional
 from dotenv import load_dotenv
 from supabase import create_client, Client
 
@@ -12,14 +13,56 @@ SUPABASE_KEY = os.getenv("SUPABASE_ANON_KEY")
 OBJECTIVE = os.getenv("OBJECTIVE", "Solve world hunger.")
 YOUR_TABLE_NAME = os.getenv("YOUR_TABLE_NAME", "documents")
 YOUR_FIRST_TASK = os.getenv("YOUR_FIRST_TASK", "Develop a task list.")
+MAX_WORKERS = int(os.getenv("MAX_WORKERS", "3"))  # Tasks executed concurrently
+TASK_DEDUP_THRESHOLD = float(os.getenv("TASK_DEDUP_THRESHOLD", "0.92"))  # Cosine similarity treated as a duplicate
+TASK_DEDUP_MODE = os.getenv("TASK_DEDUP_MODE", "drop")  # "drop" or "merge"
+PRIORITIZATION_MODE = os.getenv("PRIORITIZATION_MODE", "incremental")  # "full", "incremental" or "local"
+FULL_REPRIORITIZE_EVERY = int(os.getenv("FULL_REPRIORITIZE_EVERY", "5"))  # Full re-rank every K iterations (0 = never)
+PRIORITIZATION_WINDOW = int(os.getenv("PRIORITIZATION_WINDOW", "20"))  # Queued tasks shown when placing new ones
+PIPELINE_SPECULATION = os.getenv("PIPELINE_SPECULATION", "off")  # "off", "commit" or "discard"
+LOCAL_SCORER_WEIGHTS = tuple(float(w) for w in os.getenv("LOCAL_SCORER_WEIGHTS", "0.6,0.3,0.1").split(","))  # relevance, novelty, age
+TASK_QUEUE_CAPACITY = int(os.getenv("TASK_QUEUE_CAPACITY", "50"))  # Queued tasks kept in memory (0 = unbounded)
+TASK_OVERFLOW_PATH = os.getenv("TASK_OVERFLOW_PATH", "task_overflow.db")  # SQLite file for spilled tasks ("" = evict instead)
+CHECKPOINT_PATH = os.getenv("CHECKPOINT_PATH", "agent_checkpoint.json")  # Per-iteration run checkpoint ("" = disabled)
+MISTRAL_REQUESTS_PER_SECOND = float(os.getenv("MISTRAL_REQUESTS_PER_SECOND", "0"))  # Shared cap on Mistral calls (0 = unlimited)
+WORKER_BACKEND = os.getenv("WORKER_BACKEND", "threads")  # "threads" or "postgres" (worker processes via src.pg_queue)
+DATABASE_URL = os.getenv("DATABASE_URL")  # Postgres DSN for the postgres worker backend
+TASK_LEASE_SECONDS = int(os.getenv("TASK_LEASE_SECONDS", "60"))  # Lease a worker must heartbeat to keep its task
+TASK_MAX_ATTEMPTS = int(os.getenv("TASK_MAX_ATTEMPTS", "3"))  # Claims per task before it is marked failed
+CONVERGENCE_ACTION = os.getenv("CONVERGENCE_ACTION", "stop")  # "stop", "throttle" (no new tasks, drain the queue) or "off"
+CONVERGENCE_THRESHOLD = float(os.getenv("CONVERGENCE_THRESHOLD", "0.05"))  # Rolling novelty below which a run has converged
+CONVERGENCE_WINDOW = int(os.getenv("CONVERGENCE_WINDOW", "3"))  # Iterations averaged into the rolling novelty
+RESULT_WRITE_QUEUE_SIZE = int(os.getenv("RESULT_WRITE_QUEUE_SIZE", "32"))  # Results waiting to be stored before the loop blocks
+RESULT_WRITE_BATCH = int(os.getenv("RESULT_WRITE_BATCH", "8"))  # Results embedded and inserted per request
+RESULT_WRITE_RETRIES = int(os.getenv("RESULT_WRITE_RETRIES", "3"))  # Retries for failed embeddings and inserts
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "supabase" if SUPABASE_URL else "sqlite")  # "supabase", "postgres" or "sqlite"
+PG_POOL_SIZE = int(os.getenv("PG_POOL_SIZE", "5"))  # Pooled connections for the postgres storage backend
+SQLITE_PATH = os.getenv("SQLITE_PATH", "agent_results.db")  # Results file for the sqlite storage backend
+VECTOR_PRECISION = os.getenv("VECTOR_PRECISION", "float32")  # Stored embeddings: "float32" (vector) or "float16" (halfvec)
+RESULT_RETENTION_MONTHS = int(os.getenv("RESULT_RETENTION_MONTHS", "0"))  # Months of stored results kept, current included (0 = keep all)
+RETRIEVAL_MONTHS = int(os.getenv("RETRIEVAL_MONTHS", "0"))  # Months of results searched for task context (0 = all)
+
+
+
+def run_path(path: str, run_id: str = None) -> str:
+    """Give each run its own copy of a per-run file, e.g. agent_checkpoint.run-2.json."""
+    if not path or not run_id:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{run_id}{ext}"
 
-# Initialize Supabase client
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 
 # Validate required environment variables
 if not MISTRAL_API_KEY:
     raise ValueError("MISTRAL_API_KEY environment variable is required")
-if not SUPABASE_URL:
-    raise ValueError("SUPABASE_URL environment variable is required")
-if not SUPABASE_KEY:
-    raise ValueError("SUPABASE_ANON_KEY environment variable is required")
\ No newline at end of file
+if STORAGE_BACKEND == "postgres":
+    if not DATABASE_URL:
+        raise ValueError("DATABASE_URL environment variable is required when STORAGE_BACKEND=postgres")
+elif STORAGE_BACKEND == "supabase":
+    if not SUPABASE_URL:
+        raise ValueError("SUPABASE_URL environment variable is required")
+    if not SUPABASE_KEY:
+        raise ValueError("SUPABASE_ANON_KEY environment variable is required")
+
+# Initialize Supabase client; the postgres and sqlite storage backends do without it
+supabase: Optional[Client] = create_client(SUPABASE_URL, SUPABASE_KEY) if STORAGE_BACKEND == "supabase" else None
\ No newline at end of file
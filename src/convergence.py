@@ -0,0 +1,111 @@
+from collections import deque
+from typing import Dict, List, Optional
+import numpy as np
+from src.config import CONVERGENCE_THRESHOLD, CONVERGENCE_WINDOW, CONVERGENCE_ACTION
+from src.dedup import normalize_rows
+
+
+class EmbeddingHistory:
+    """Unit vectors seen so far in a run, kept in one growing matrix."""
+
+    def __init__(self):
+        self._rows = None
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def novelty(self, vectors) -> np.ndarray:
+        """One minus each vector's highest similarity to the history and to earlier vectors in the batch.
+
+        The vectors are added to the history afterwards. Zero vectors from failed
+        embeddings carry no signal and are skipped.
+        """
+        batch = normalize_rows(vectors)
+        batch = batch[np.abs(batch).sum(axis=1) > 0]
+        if not len(batch):
+            return np.zeros(0, dtype=np.float32)
+        best = np.full(len(batch), -1.0, dtype=np.float32)
+        if self._count:
+            best = (batch @ self._rows[:self._count].T).max(axis=1)
+        within = batch @ batch.T
+        within[np.triu_indices(len(batch))] = -1.0
+        best = np.maximum(best, within.max(axis=1))
+        self._append(batch)
+        return np.clip(1.0 - best, 0.0, 1.0)
+
+    def _append(self, batch: np.ndarray):
+        needed = self._count + len(batch)
+        if self._rows is None:
+            self._rows = np.empty((max(16, needed), batch.shape[1]), dtype=np.float32)
+        elif needed > len(self._rows):
+            grown = np.empty((max(needed, 2 * len(self._rows)), self._rows.shape[1]), dtype=np.float32)
+            grown[:self._count] = self._rows[:self._count]
+            self._rows = grown
+        self._rows[self._count:needed] = batch
+        self._count = needed
+
+
+class ConvergenceMonitor:
+    """Detects when a run has stopped producing anything new.
+
+    Each iteration's result and generated tasks are compared with every earlier
+    result and task of the run; their novelty is one minus the highest cosine
+    similarity to that history. The run counts as converged once the mean
+    novelty over the last ``window`` iterations falls below ``threshold``.
+    The caller then stops the run ("stop") or stops creating tasks and lets the
+    queue drain ("throttle").
+    """
+
+    def __init__(self, threshold: float = CONVERGENCE_THRESHOLD, window: int = CONVERGENCE_WINDOW,
+                 action: str = CONVERGENCE_ACTION):
+        self.threshold = threshold
+        self.window = max(1, int(window))
+        self.action = action
+        self.results = EmbeddingHistory()
+        self.tasks = EmbeddingHistory()
+        self.recent = deque(maxlen=self.window)  # Per-iteration novelty, newest last
+        self.converged_at = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.action != "off"
+
+    @property
+    def converged(self) -> bool:
+        return self.converged_at is not None
+
+    @property
+    def rolling_novelty(self) -> Optional[float]:
+        return float(np.mean(self.recent)) if self.recent else None
+
+    def observe(self, iteration: int, result_embeddings: List = (), task_vectors: List = ()) -> Optional[float]:
+        """Record the result and new task embeddings that arrived this iteration and return their novelty.
+
+        Returns None when the iteration had no usable embeddings. Once converged,
+        ``converged_at`` keeps the iteration where it happened.
+        """
+        scores = []
+        if len(result_embeddings):
+            scores.extend(self.results.novelty(result_embeddings))
+        if len(task_vectors):
+            scores.extend(self.tasks.novelty(task_vectors))
+        if not scores:
+            return None
+        novelty = float(np.mean(scores))
+        self.recent.append(novelty)
+        if (self.enabled and not self.converged and len(self.recent) == self.window
+                and self.rolling_novelty < self.threshold):
+            self.converged_at = iteration
+        return novelty
+
+    def report(self, iteration: int, max_iterations: int) -> Dict:
+        """Convergence state and the iterations left unused because of it."""
+        rolling = self.rolling_novelty
+        return {
+            "action": self.action,
+            "rolling_novelty": round(rolling, 3) if rolling is not None else None,
+            "threshold": self.threshold,
+            "converged_at": self.converged_at,
+            "iterations_saved": max(0, max_iterations - iteration) if self.converged else 0,
+        }
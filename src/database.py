@@ -1,102 +1,537 @@
-from src.config import supabase, YOUR_TABLE_NAME
+import argparse
+import datetime
+import hashlib
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple
+import numpy as np
+from src.config import (supabase, YOUR_TABLE_NAME, STORAGE_BACKEND, RESULT_RETENTION_MONTHS, RETRIEVAL_MONTHS,
+                        VECTOR_PRECISION)
+from src.vectors import (EMBEDDING_DIMENSIONS, PGVECTOR_TYPE, check_precision, from_bytes, stored_precision,
+                         to_bytea_hex, to_pgvector_text)
+
+_store = None
+_store_lock = threading.Lock()
+_packed_embeddings = False  # True once setup falls back to a table without pgvector, storing packed bytes
+_partitioned_period = None  # Month whose partitions store_task_results last made sure of
+PARTITIONS_AHEAD = 2  # Monthly partitions created beyond the current one
+SCHEMA_VERSION = 2  # Latest entry of schema_migrations
+VECTOR_COLUMN = f"{PGVECTOR_TYPE}({EMBEDDING_DIMENSIONS})"
+RESULT_COLUMNS = ("id", "content", "run_id", "task_id", "task_name", "created_at")  # What match_documents can return
+FILTER_COLUMNS = ("run_id", "task_id", "task_name")  # What match_documents can filter on
+
+
+def result_store():
+    """Shared store for the postgres and sqlite storage backends, opened on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            if STORAGE_BACKEND == "postgres":
+                from src.pg_store import PostgresStore
+                _store = PostgresStore()
+            else:
+                from src.sqlite_store import SqliteStore
+                _store = SqliteStore()
+        return _store
+
+
+def period_start(months_back: int = 0) -> datetime.date:
+    """First day of the current UTC month, or of the month ``months_back`` months before it."""
+    today = datetime.datetime.now(datetime.timezone.utc).date()
+    index = today.year * 12 + today.month - 1 - months_back
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def period_of(moment: datetime.datetime) -> datetime.date:
+    """First day of the UTC month ``moment`` falls in."""
+    return moment.astimezone(datetime.timezone.utc).date().replace(day=1)
+
+
+def results_schema_sql(table: str = YOUR_TABLE_NAME, embedding_type: str = VECTOR_COLUMN) -> str:
+    """Create the results table, partitioned by month, with its partitions, functions and indexes.
+
+    Every row belongs to the month it was stored in (``period``), and each month
+    is its own partition with its own vector index, so searches limited to
+    recent months only scan those indexes and retention drops whole partitions.
+    A unique index on a partitioned table must include the partition key, so
+    the natural key is (run_id, task_id, content_hash, period).
+
+    Unpartitioned tables from earlier versions get their natural key filled in
+    from the metadata and have their rows copied into the partitioned table,
+    keeping the first copy of any duplicate.
+    """
+    legacy = f"{table}_unpartitioned"
+    utc_today = "timezone('utc'::text, now())::date"
+    sql = f"""
+    DO $$
+    BEGIN
+        IF EXISTS (SELECT 1 FROM pg_class WHERE oid = to_regclass('{table}') AND relkind = 'r') THEN
+            ALTER TABLE {table}
+                ADD COLUMN IF NOT EXISTS run_id TEXT NOT NULL DEFAULT '',
+                ADD COLUMN IF NOT EXISTS task_id TEXT NOT NULL DEFAULT '',
+                ADD COLUMN IF NOT EXISTS content_hash TEXT;
+            UPDATE {table}
+            SET run_id = COALESCE(metadata->>'run_id', ''),
+                task_id = COALESCE(metadata->>'task_id', ''),
+                content_hash = encode(sha256(convert_to(COALESCE(content, ''), 'UTF8')), 'hex')
+            WHERE content_hash IS NULL;
+            DROP INDEX IF EXISTS {table}_natural_key;
+            DROP INDEX IF EXISTS {table}_embedding_idx;
+            ALTER TABLE {table} RENAME TO {legacy};
+        END IF;
+    END $$;
+
+    CREATE TABLE IF NOT EXISTS {table} (
+        id BIGSERIAL,
+        content TEXT,
+        metadata JSONB,
+        embedding {embedding_type},
+        run_id TEXT NOT NULL DEFAULT '',
+        task_id TEXT NOT NULL DEFAULT '',
+        content_hash TEXT,
+        period DATE NOT NULL DEFAULT date_trunc('month', timezone('utc'::text, now()))::date,
+        created_at TIMESTAMP WITH TIME ZONE DEFAULT timezone('utc'::text, now()) NOT NULL,
+        PRIMARY KEY (id, period)
+    ) PARTITION BY RANGE (period);
+
+    CREATE OR REPLACE FUNCTION {table}_ensure_partitions(first_month DATE, last_month DATE)
+    RETURNS VOID
+    LANGUAGE plpgsql
+    SECURITY DEFINER
+    AS $$
+    DECLARE
+        bound DATE := date_trunc('month', first_month)::date;
+    BEGIN
+        WHILE bound <= last_month LOOP
+            EXECUTE format('CREATE TABLE IF NOT EXISTS %I PARTITION OF {table} FOR VALUES FROM (%L) TO (%L)',
+                           '{table}_p' || to_char(bound, 'YYYY_MM'), bound, (bound + INTERVAL '1 month')::date);
+            bound := (bound + INTERVAL '1 month')::date;
+        END LOOP;
+    END;
+    $$;
+
+    CREATE OR REPLACE FUNCTION {table}_drop_partitions_before(cutoff DATE)
+    RETURNS INT
+    LANGUAGE plpgsql
+    SECURITY DEFINER
+    AS $$
+    DECLARE
+        part RECORD;
+        dropped INT := 0;
+    BEGIN
+        FOR part IN
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = '{table}'::regclass
+              AND child.relname ~ '^{table}_p[0-9]{{4}}_[0-9]{{2}}$'
+        LOOP
+            IF to_date(right(part.relname, 7), 'YYYY_MM') < cutoff THEN
+                EXECUTE format('DROP TABLE %I', part.relname);
+                dropped := dropped + 1;
+            END IF;
+        END LOOP;
+        RETURN dropped;
+    END;
+    $$;
+
+    SELECT {table}_ensure_partitions({utc_today}, ({utc_today} + INTERVAL '{PARTITIONS_AHEAD} months')::date);
+    CREATE UNIQUE INDEX IF NOT EXISTS {table}_natural_key ON {table} (run_id, task_id, content_hash, period);
+    """
+    if embedding_type != "BYTEA":
+        sql += f"""
+    CREATE INDEX IF NOT EXISTS {table}_embedding_idx
+    ON {table}
+    USING ivfflat (embedding {PGVECTOR_TYPE}_cosine_ops)
+    WITH (lists = 100);
+    """
+    return sql + f"""
+    DO $$
+    BEGIN
+        IF to_regclass('{legacy}') IS NOT NULL THEN
+            PERFORM {table}_ensure_partitions(
+                (SELECT COALESCE(min(timezone('utc'::text, created_at))::date, {utc_today}) FROM {legacy}),
+                {utc_today});
+            INSERT INTO {table} (content, metadata, embedding, run_id, task_id, content_hash, period, created_at)
+            SELECT content, metadata, embedding, run_id, task_id, content_hash,
+                   date_trunc('month', timezone('utc'::text, created_at))::date, created_at
+            FROM {legacy}
+            ORDER BY id
+            ON CONFLICT DO NOTHING;
+            DROP TABLE {legacy};
+        END IF;
+    END $$;
+    """
+
+
+def normalized_results_sql(table: str = YOUR_TABLE_NAME) -> str:
+    """Store each result's text once, in ``content``, with the task name as a typed column.
+
+    ``metadata`` repeated the result text and held the run id, task id and task
+    name, which now all have their own columns, so it is dropped. Task ids
+    become integers, like everywhere else they are stored.
+    """
+    return f"""
+    ALTER TABLE {table} ADD COLUMN IF NOT EXISTS task_name TEXT NOT NULL DEFAULT '';
+    UPDATE {table} SET task_name = COALESCE(metadata->>'task', '');
+    ALTER TABLE {table} DROP COLUMN metadata;
+    ALTER TABLE {table}
+        ALTER COLUMN task_id DROP DEFAULT,
+        ALTER COLUMN task_id TYPE BIGINT USING CASE WHEN task_id ~ '^-?[0-9]+$' THEN task_id::bigint ELSE 0 END,
+        ALTER COLUMN task_id SET DEFAULT 0;
+    CREATE INDEX IF NOT EXISTS {table}_task_name_idx ON {table} (task_name);
+    """
+
+
+def match_function_sql(table: str = YOUR_TABLE_NAME) -> str:
+    """The ``match_documents`` similarity search function.
+
+    It is plain SQL so Postgres can inline it into the caller's query: columns
+    the caller does not select, such as ``content``, are never read. ``filter``
+    matches run_id, task_id and task_name exactly; ``since`` limits the search
+    to partitions from that month on.
+    """
+    return f"""
+    DROP FUNCTION IF EXISTS match_documents({VECTOR_COLUMN}, INT, JSONB);
+    DROP FUNCTION IF EXISTS match_documents({VECTOR_COLUMN}, INT, JSONB, DATE);
+    CREATE FUNCTION match_documents(
+        query_embedding {VECTOR_COLUMN},
+        match_count INT DEFAULT 5,
+        filter JSONB DEFAULT '{{}}',
+        since DATE DEFAULT NULL
+    )
+    RETURNS TABLE(
+        id BIGINT,
+        content TEXT,
+        run_id TEXT,
+        task_id BIGINT,
+        task_name TEXT,
+        created_at TIMESTAMP WITH TIME ZONE,
+        similarity FLOAT
+    )
+    LANGUAGE sql STABLE
+    AS $$
+        SELECT
+            {table}.id,
+            {table}.content,
+            {table}.run_id,
+            {table}.task_id,
+            {table}.task_name,
+            {table}.created_at,
+            1 - ({table}.embedding <=> query_embedding) AS similarity
+        FROM {table}
+        WHERE (filter->>'run_id' IS NULL OR {table}.run_id = filter->>'run_id')
+          AND (filter->>'task_id' IS NULL OR {table}.task_id = (filter->>'task_id')::bigint)
+          AND (filter->>'task_name' IS NULL OR {table}.task_name = filter->>'task_name')
+          AND {table}.period >= COALESCE(since, '-infinity'::date)
+        ORDER BY {table}.embedding <=> query_embedding
+        LIMIT match_count
+    $$;
+    """
+
+
+def schema_migrations(table: str = YOUR_TABLE_NAME, embedding_type: str = VECTOR_COLUMN) -> List[Tuple[int, str]]:
+    """Postgres and Supabase schema changes as (version, SQL), oldest first.
+
+    Each is applied once, in order, and recorded in ``{table}_schema_version``;
+    add new ones at the end and raise SCHEMA_VERSION to match. Version 1 also
+    adopts tables from before versions were recorded, so it is safe to run
+    over an existing schema.
+    """
+    normalized = normalized_results_sql(table)
+    if embedding_type != "BYTEA":
+        normalized += match_function_sql(table)
+    return [
+        (1, results_schema_sql(table, embedding_type)),
+        (2, normalized),
+    ]
+
+
+def schema_version_sql(table: str = YOUR_TABLE_NAME) -> str:
+    """The only query a warm start makes: latest applied version and the embedding column it created.
+
+    Packed bytes are recorded with their precision, see ``stored_precision``.
+    """
+    return f"SELECT version, embedding_type FROM {table}_schema_version ORDER BY version DESC LIMIT 1"
+
+
+def migrations_sql(current: int, table: str = YOUR_TABLE_NAME, embedding_type: str = VECTOR_COLUMN) -> str:
+    """Apply and record every migration after version ``current``, in one transaction.
+
+    An advisory lock makes processes starting together take turns, and each
+    migration checks the version table under it, so a process that waited
+    skips what the other one applied.
+    """
+    recorded_type = f"{embedding_type} {VECTOR_PRECISION}" if embedding_type == "BYTEA" else embedding_type
+    script = f"""
+    SELECT pg_advisory_xact_lock(hashtext('{table}_schema_version'));
+    CREATE TABLE IF NOT EXISTS {table}_schema_version (
+        version INT PRIMARY KEY,
+        embedding_type TEXT NOT NULL,
+        applied_at TIMESTAMP WITH TIME ZONE DEFAULT timezone('utc'::text, now()) NOT NULL
+    );
+    """
+    for version, sql in schema_migrations(table, embedding_type):
+        if version > current:
+            script += f"""
+    DO $migration$
+    BEGIN
+        IF NOT EXISTS (SELECT 1 FROM {table}_schema_version WHERE version = {version}) THEN
+            EXECUTE $sql${sql}$sql$;
+            INSERT INTO {table}_schema_version (version, embedding_type) VALUES ({version}, '{recorded_type}');
+        END IF;
+    END $migration$;
+    """
+    return script
 
 
 def setup_supabase_table():
-    """Set up the Supabase table for storing task results with embeddings."""
+    """Set up the Supabase table for storing task results with embeddings.
+
+    The postgres and sqlite backends apply only the migrations newer than the
+    recorded schema version, so a warm start costs a single query. Supabase
+    takes its schema from the SQL editor, see ``supabase_schema``; this only
+    checks the recorded version and reports what is missing.
+    """
+    global _packed_embeddings
+    if STORAGE_BACKEND != "supabase":
+        try:
+            if result_store().setup():
+                print(f"✅ {STORAGE_BACKEND} table '{YOUR_TABLE_NAME}' set up successfully")
+            else:
+                print(f"✅ {STORAGE_BACKEND} table '{YOUR_TABLE_NAME}' is up to date")
+            apply_retention()
+        except Exception as e:
+            print(f"❌ Error setting up {STORAGE_BACKEND} table: {e}")
+            if isinstance(e, ValueError):
+                raise
+        return
+    latest = supabase_schema()
+    version = latest["version"] if latest else 0
+    if latest:
+        _packed_embeddings = latest["embedding_type"].startswith("BYTEA")
+        check_precision(stored_precision(latest["embedding_type"]), YOUR_TABLE_NAME)
+    if version < SCHEMA_VERSION:
+        # The Supabase client cannot run DDL, so migrations are applied from the SQL editor
+        print(f"⚠️  Supabase table '{YOUR_TABLE_NAME}' is at schema version {version} of {SCHEMA_VERSION}: "
+              f"run setup_supabase.txt in the Supabase SQL editor for a new project, or the output of "
+              f"'python -m src.database migrations' to upgrade an existing table")
+        return
+    print(f"✅ Supabase table '{YOUR_TABLE_NAME}' is up to date")
     try:
-        # Create table with vector support
-        create_table_sql = f"""
-        CREATE TABLE IF NOT EXISTS {YOUR_TABLE_NAME} (
-            id BIGSERIAL PRIMARY KEY,
-            content TEXT,
-            metadata JSONB,
-            embedding VECTOR(1024),
-            created_at TIMESTAMP WITH TIME ZONE DEFAULT timezone('utc'::text, now()) NOT NULL
-        );
-        """
-        
-        # Create indexes for better performance
-        create_index_sql = f"""
-        CREATE INDEX IF NOT EXISTS {YOUR_TABLE_NAME}_embedding_idx 
-        ON {YOUR_TABLE_NAME} 
-        USING ivfflat (embedding vector_cosine_ops)
-        WITH (lists = 100);
-        """
-        
-        # Create similarity search function
-        create_function_sql = f"""
-        CREATE OR REPLACE FUNCTION match_documents(
-            query_embedding VECTOR(1024),
-            match_count INT DEFAULT 5,
-            filter JSONB DEFAULT '{{}}'
-        )
-        RETURNS TABLE(
-            id BIGINT,
-            content TEXT,
-            metadata JSONB,
-            similarity FLOAT
-        )
-        LANGUAGE plpgsql
-        AS $$
-        BEGIN
-            RETURN QUERY
-            SELECT
-                {YOUR_TABLE_NAME}.id,
-                {YOUR_TABLE_NAME}.content,
-                {YOUR_TABLE_NAME}.metadata,
-                1 - ({YOUR_TABLE_NAME}.embedding <=> query_embedding) AS similarity
-            FROM {YOUR_TABLE_NAME}
-            WHERE {YOUR_TABLE_NAME}.metadata @> filter
-            ORDER BY {YOUR_TABLE_NAME}.embedding <=> query_embedding
-            LIMIT match_count;
-        END;
-        $$;
-        """
-        
-        # Execute SQL commands
-        supabase.sql(create_table_sql).execute()
-        supabase.sql(create_index_sql).execute()
-        supabase.sql(create_function_sql).execute()
-        
-        print(f"✅ Supabase table '{YOUR_TABLE_NAME}' set up successfully")
-        
+        apply_retention()
     except Exception as e:
-        print(f"❌ Error setting up Supabase table: {e}")
-        # Try a simpler table creation without vector extensions
-        try:
-            simple_table_sql = f"""
-            CREATE TABLE IF NOT EXISTS {YOUR_TABLE_NAME} (
-                id BIGSERIAL PRIMARY KEY,
-                content TEXT,
-                metadata JSONB,
-                embedding TEXT,
-                created_at TIMESTAMP WITH TIME ZONE DEFAULT timezone('utc'::text, now()) NOT NULL
-            );
-            """
-            supabase.sql(simple_table_sql).execute()
-            print(f"✅ Supabase table '{YOUR_TABLE_NAME}' created with basic schema")
-        except Exception as e2:
-            print(f"❌ Error creating basic table: {e2}")
+        print(f"⚠️  Could not drop expired results: {e}")
+
+
+def supabase_schema() -> Optional[Dict]:
+    """The latest row of the Supabase schema version table, or None when nothing is recorded."""
+    try:
+        latest = supabase.table(f"{YOUR_TABLE_NAME}_schema_version").select("version, embedding_type") \
+            .order("version", desc=True).limit(1).execute().data
+    except Exception:
+        return None  # No version table yet, so every migration is pending
+    return latest[0] if latest else None
+
+
+def apply_retention(months: int = RESULT_RETENTION_MONTHS) -> int:
+    """Drop stored results older than the last ``months`` months, the current one included.
+
+    Postgres and Supabase drop whole monthly partitions and return how many;
+    SQLite deletes the rows and returns how many. ``months`` of 0 keeps everything.
+    """
+    if months <= 0:
+        return 0
+    cutoff = period_start(months - 1)
+    if STORAGE_BACKEND != "supabase":
+        dropped = result_store().drop_periods_before(cutoff)
+    else:
+        response = supabase.rpc(f"{YOUR_TABLE_NAME}_drop_partitions_before", {"cutoff": cutoff.isoformat()}).execute()
+        dropped = response.data or 0
+    if dropped:
+        print(f"🗑️  Dropped {dropped} expired {'partitions' if STORAGE_BACKEND != 'sqlite' else 'results'} "
+              f"from before {cutoff:%Y-%m}")
+    return dropped
 
 
 def cleanup_supabase_table():
     """Delete the Supabase table."""
-    try:
-        supabase.sql(f"DROP TABLE IF EXISTS {YOUR_TABLE_NAME};").execute()
-        print(f"🗑️  Supabase table '{YOUR_TABLE_NAME}' deleted.")
-    except Exception as e:
-        print(f"❌ Error deleting Supabase table: {e}")
+    if STORAGE_BACKEND != "supabase":
+        try:
+            result_store().drop()
+            print(f"🗑️  {STORAGE_BACKEND} table '{YOUR_TABLE_NAME}' deleted.")
+        except Exception as e:
+            print(f"❌ Error deleting {STORAGE_BACKEND} table: {e}")
+        return
+    # The Supabase client cannot run DDL, so the table is dropped from the SQL editor
+    print(f"ℹ️  To delete the Supabase table, run in the Supabase SQL editor: "
+          f"DROP TABLE IF EXISTS {YOUR_TABLE_NAME}, {YOUR_TABLE_NAME}_schema_version;")
+
 
+def content_hash(content: str) -> str:
+    """SHA-256 of a result's text, the content part of its natural key."""
+    return hashlib.sha256((content or "").encode()).hexdigest()
 
-def store_task_result(task_id: str, task_name: str, result: str, embedding: list):
-    """Store a task result in the database."""
+
+def task_result_row(task_id: int, task_name: str, result: str, embedding: list, run_id: str = None,
+                    created_at: datetime.datetime = None) -> Dict:
+    """Build the row stored for a task result, tagged with its run when ``run_id`` is given.
+
+    ``run_id``, ``task_id`` and ``content_hash`` form the row's natural key:
+    storing the same result for the same task again is a no-op. On Postgres
+    the key also includes the month partition the row lands in.
+
+    ``created_at`` is only given for imported results, which keep their
+    original time and month; naive times are taken as UTC.
+    """
+    row = {
+        "content": result,
+        "embedding": embedding,
+        "run_id": run_id or "",
+        "task_id": int(task_id),
+        "task_name": task_name,
+        "content_hash": content_hash(result),
+    }
+    if created_at is not None:
+        row["created_at"] = created_at if created_at.tzinfo else created_at.replace(tzinfo=datetime.timezone.utc)
+    return row
+
+
+def store_task_results(rows: List[Dict]) -> bool:
+    """Insert several task result rows in a single request, skipping rows already stored."""
     try:
-        supabase.table(YOUR_TABLE_NAME).insert({
-            "content": result,
-            "metadata": {"task": task_name, "result": result, "task_id": task_id},
-            "embedding": embedding
-        }).execute()
+        if STORAGE_BACKEND != "supabase":
+            result_store().insert(rows)
+        else:
+            # Vectors go over the REST API as compact pgvector text, or hex bytes for the fallback table
+            encode = to_bytea_hex if _packed_embeddings else to_pgvector_text
+            ensure_partitions(min((period_of(row["created_at"]) for row in rows if "created_at" in row), default=None))
+            supabase.table(YOUR_TABLE_NAME).upsert(
+                [dict(row, embedding=encode(row["embedding"]),
+                      **({"created_at": row["created_at"].isoformat(), "period": period_of(row["created_at"]).isoformat()}
+                         if "created_at" in row else {}))
+                 for row in rows],
+                on_conflict="run_id,task_id,content_hash,period",
+                ignore_duplicates=True,
+            ).execute()
         return True
     except Exception as e:
-        print(f"❌ Error storing result in Supabase: {e}")
-        return False
\ No newline at end of file
+        print(f"❌ Error storing results in {STORAGE_BACKEND}: {e}")
+        return False
+
+
+def ensure_partitions(first_month: datetime.date = None):
+    """Create this month's Supabase partitions if a run has carried on into a month without them.
+
+    ``first_month`` also creates every partition from that earlier month on,
+    for imported results.
+    """
+    global _partitioned_period
+    current = period_start()
+    if _partitioned_period != current or (first_month is not None and first_month < current):
+        supabase.rpc(f"{YOUR_TABLE_NAME}_ensure_partitions", {
+            "first_month": min(first_month or current, current).isoformat(),
+            "last_month": period_start(-PARTITIONS_AHEAD).isoformat(),
+        }).execute()
+        _partitioned_period = current
+
+
+def iter_results(chunk_size: int = 10000, run_id: str = None) -> Iterator[List[Dict]]:
+    """Every stored result, in id order, in chunks of up to ``chunk_size`` rows.
+
+    Rows hold RESULT_COLUMNS, ``period`` and the ``embedding`` as a float32
+    array. Postgres and SQLite stream from a cursor, so only one chunk is in
+    memory at a time; Supabase has no cursors over REST and pages by id instead.
+    """
+    if STORAGE_BACKEND != "supabase":
+        yield from result_store().iter_results(chunk_size, run_id)
+        return
+    last_id = 0
+    while True:
+        query = supabase.table(YOUR_TABLE_NAME) \
+            .select("id, content, run_id, task_id, task_name, created_at, period, embedding") \
+            .gt("id", last_id).order("id").limit(chunk_size)
+        if run_id is not None:
+            query = query.eq("run_id", run_id)
+        rows = query.execute().data or []
+        if not rows:
+            return
+        yield [
+            dict(row, created_at=datetime.datetime.fromisoformat(row["created_at"]),
+                 period=datetime.date.fromisoformat(row["period"]),
+                 embedding=from_bytes(bytes.fromhex(row["embedding"][2:])) if _packed_embeddings
+                 else np.asarray(row["embedding"][1:-1].split(","), dtype=np.float32))
+            for row in rows
+        ]
+        last_id = rows[-1]["id"]
+
+
+def deduplicate_results(batch_size: int = 1000) -> int:
+    """Collapse results stored more than once under the same run, task and content; returns the rows deleted.
+
+    Every backend deletes in batches of ``batch_size`` rows, one transaction
+    each; Supabase calls the ``{table}_deduplicate`` function from
+    setup_supabase.txt once per batch.
+    """
+    if STORAGE_BACKEND != "supabase":
+        return result_store().deduplicate(batch_size)
+    deleted = 0
+    while True:
+        batch = supabase.rpc(f"{YOUR_TABLE_NAME}_deduplicate", {"batch_size": batch_size}).execute().data or 0
+        deleted += batch
+        if batch < batch_size:
+            return deleted
+
+
+def store_task_result(task_id: int, task_name: str, result: str, embedding: list, run_id: str = None):
+    """Store a task result in the database, tagged with its run when ``run_id`` is given."""
+    return store_task_results([task_result_row(task_id, task_name, result, embedding, run_id)])
+
+
+def match_documents(query_embedding: List[float], match_count: int = 5, filter: Dict = None,
+                    months: int = RETRIEVAL_MONTHS, columns: Tuple[str, ...] = RESULT_COLUMNS) -> List[Dict]:
+    """Stored results closest to ``query_embedding``, most similar first.
+
+    ``filter`` maps any of FILTER_COLUMNS to the value it must equal, e.g.
+    ``{"run_id": ...}``. Each match holds the requested ``columns`` and its
+    ``similarity``; leaving out ``content`` keeps result text off the wire.
+    With ``months`` above 0 only results from that many recent months, the
+    current one included, are searched.
+    """
+    filter = filter or {}
+    unknown = sorted(set(filter) - set(FILTER_COLUMNS) | set(columns) - set(RESULT_COLUMNS))
+    if unknown:
+        raise ValueError(f"Unknown result columns: {', '.join(unknown)}")
+    since = period_start(months - 1) if months > 0 else None
+    if STORAGE_BACKEND != "supabase":
+        return result_store().match(query_embedding, match_count, filter, since, tuple(columns))
+    response = supabase.rpc(
+        "match_documents",
+        {
+            "query_embedding": to_pgvector_text(query_embedding),
+            "match_count": match_count,
+            "filter": filter,
+            "since": since.isoformat() if since else None
+        }
+    ).select(",".join([*columns, "similarity"])).execute()
+    return response.data or []
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the stored task results")
+    parser.add_argument("command", choices=("deduplicate", "migrations"),
+                        help="deduplicate: delete extra copies of stored results; "
+                             "migrations: print the SQL that brings a Supabase table up to date")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Rows deleted per transaction")
+    parser.add_argument("--packed", action="store_true",
+                        help="Store embeddings as packed bytes, for a new Supabase project without pgvector")
+    args = parser.parse_args()
+
+    if args.command == "migrations":
+        if STORAGE_BACKEND != "supabase":
+            parser.error(f"the {STORAGE_BACKEND} backend applies its migrations when the agent starts")
+        schema = supabase_schema()
+        packed = args.packed or bool(schema and schema["embedding_type"].startswith("BYTEA"))
+        print(migrations_sql(schema["version"] if schema else 0, embedding_type="BYTEA" if packed else VECTOR_COLUMN))
+    else:
+        setup_supabase_table()
+        print(f"🧹 Deleted {deduplicate_results(args.batch_size)} duplicate results")
@@ -0,0 +1,97 @@
+from typing import Callable, Dict, List
+import numpy as np
+from src.agents import get_mistral_embeddings
+from src.config import TASK_DEDUP_THRESHOLD, TASK_DEDUP_MODE
+from src.task_queue import Task
+
+
+def normalize_rows(vectors) -> np.ndarray:
+    """Scale each row to unit length so dot products are cosine similarities."""
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0  # Zero vectors from failed embeddings never match anything
+    return matrix / norms
+
+
+class TaskDeduplicator:
+    """Drops generated tasks that restate a queued, running or completed task.
+
+    New tasks are embedded in one batch and compared against every known task
+    with a single matrix product. Task embeddings are cached by name, so each
+    task is embedded once per run.
+    """
+
+    def __init__(self, threshold: float = TASK_DEDUP_THRESHOLD, mode: str = TASK_DEDUP_MODE,
+                 embed: Callable[[List[str]], List[List[float]]] = get_mistral_embeddings, vectors: Dict = None):
+        self.threshold = threshold
+        self.mode = mode
+        self.embed = embed
+        self.vectors = vectors if vectors is not None else {}  # task name -> unit vector, shareable between runs
+        self._completed = []
+        self.stats = {
+            "tasks_checked": 0,
+            "duplicates_dropped": 0,
+            "duplicates_merged": 0,
+            "execution_calls_avoided": 0,
+        }
+
+    def filter(self, new_tasks: List[Task], pending_tasks: List[Task]) -> List[Task]:
+        """Return the new tasks that are not near-duplicates of pending, completed or earlier new tasks.
+
+        In "merge" mode a duplicate is recorded on the task it restates under
+        ``merged``; otherwise it is simply dropped.
+        Sibling "after" references are renumbered to match the returned list.
+        """
+        if not new_tasks:
+            return []
+        self._embed_missing([t.task_name for t in new_tasks + list(pending_tasks)])
+
+        known = list(pending_tasks)
+        known_names = [t.task_name for t in known] + self._completed
+        candidates = np.stack([self.vectors[t.task_name] for t in new_tasks])
+        if known_names:
+            similarity = candidates @ np.stack([self.vectors[name] for name in known_names]).T
+            best_match = similarity.argmax(axis=1)
+            best_score = similarity.max(axis=1)
+        else:
+            best_match = np.zeros(len(new_tasks), dtype=int)
+            best_score = np.full(len(new_tasks), -1.0)
+        batch_similarity = candidates @ candidates.T
+
+        kept, positions = [], {}
+        for i, task in enumerate(new_tasks):
+            self.stats["tasks_checked"] += 1
+            earlier = [positions[j] for j in positions if batch_similarity[i, j] >= self.threshold]
+            if earlier:
+                self._record_duplicate(task, kept[earlier[0]])
+            elif best_score[i] >= self.threshold:
+                match = int(best_match[i])
+                self._record_duplicate(task, known[match] if match < len(known) else None)
+            else:
+                positions[i] = len(kept)
+                kept.append(task)
+
+        for task in kept:
+            task.after = [positions[p - 1] + 1 for p in task.after if p - 1 in positions]
+        return kept
+
+    def mark_completed(self, task: Task):
+        """Remember a finished task so later paraphrases of it are filtered out."""
+        self._embed_missing([task.task_name])
+        self._completed.append(task.task_name)
+
+    def _record_duplicate(self, task: Task, match: Task = None):
+        if self.mode == "merge" and match is not None:
+            match.merged.append(task.task_name)
+            self.stats["duplicates_merged"] += 1
+        else:
+            self.stats["duplicates_dropped"] += 1
+        self.stats["execution_calls_avoided"] += 1
+
+    def _embed_missing(self, names: List[str]):
+        missing = list(dict.fromkeys(name for name in names if name not in self.vectors))
+        if missing:
+            for name, vector in zip(missing, normalize_rows(self.embed(missing))):
+                self.vectors[name] = vector
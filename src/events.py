@@ -0,0 +1,252 @@
+import json
+import queue
+import secrets
+import threading
+from collections import OrderedDict, deque
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+EVENT_HISTORY = 500  # Recent events kept for browsers that reconnect
+SUBSCRIBER_BACKLOG = 1000  # Events a slow browser may fall behind by before it is dropped
+HEARTBEAT_SECONDS = 15  # Comment sent on idle streams, so proxies keep them open and dead ones are noticed
+RECONNECT_MS = 1000  # Delay before a browser reconnects a closed stream
+HANDLED_COMMANDS = 1000  # Acknowledgements kept so a command resent after a reconnect runs only once
+
+Event = Tuple[Optional[int], str, str]  # (id, type, data as JSON); resync notices and unreplayed events have no id
+
+
+def wire_id(event: Event, epoch: str) -> Optional[str]:
+    """The id an event is sent with, ``<epoch>.<id>``, or None for events without one."""
+    return f"{epoch}.{event[0]}" if event[0] is not None else None
+
+
+def sse_frame(event: Event, epoch: str) -> str:
+    """An event in ``text/event-stream`` form."""
+    _, event_type, data = event
+    event_id = wire_id(event, epoch)
+    return (f"id: {event_id}\n" if event_id is not None else "") + f"event: {event_type}\ndata: {data}\n\n"
+
+
+def ws_frame(event: Event, epoch: str) -> str:
+    """An event as a WebSocket text message: ``{"seq": "<epoch>.<id>", "type": ..., "data": ...}``."""
+    _, event_type, data = event
+    return f'{{"seq": {json.dumps(wire_id(event, epoch))}, "type": {json.dumps(event_type)}, "data": {data}}}'
+
+
+def status_body(fields: Dict[str, Callable[[], object]], missed: Optional[List[Event]],
+                changed_by: Dict[str, Tuple[str, ...]], appended_by: Dict[str, Tuple[str, Optional[str]]]) -> Dict:
+    """A dashboard's /api/status fields: all of them, or with ``missed`` only those its events changed.
+
+    ``fields`` computes each field on demand, so a delta builds just what it
+    sends. ``changed_by`` maps an event type to the fields it changes.
+    ``appended_by`` maps it to a list field it adds one entry to, and the key
+    of that entry in the event's data (None for the data itself); a delta
+    carries only those new entries, read from the events, and is marked with
+    ``"delta": True``.
+    """
+    if missed is None:
+        return {name: field() for name, field in fields.items()}
+    body = {}
+    for _, event_type, data in missed:
+        for name in changed_by.get(event_type, ()):
+            if name not in body:
+                body[name] = fields[name]()
+        if event_type in appended_by:
+            name, key = appended_by[event_type]
+            entry = json.loads(data)
+            body.setdefault(name, []).append(entry[key] if key else entry)
+    body["delta"] = True
+    return body
+
+
+class EventBroadcaster:
+    """Fans typed dashboard events out to any number of open streams.
+
+    An event is serialized to JSON once, when it is published, and the same
+    text is queued for every open stream, so the work done per event does not
+    grow with the number of open dashboards and an idle dashboard costs only a
+    heartbeat. Event ids increase by one and are sent as ``<epoch>.<id>``,
+    the epoch being drawn when the broadcaster is created. A browser that
+    reconnects with the last id it saw is replayed what it missed from the
+    recent history; one that fell further behind, or that saw ids from another
+    epoch or without one, gets a ``resync`` event and reloads the full state
+    from /api/status instead.
+
+    Events published with ``replay=False``, such as streamed task output, reach
+    open streams but get no id and are not kept for replay.
+
+    Every change to a dashboard's state is published with an id, so the last
+    one, prefixed with the epoch, doubles as the ``version`` of that state.
+    """
+
+    def __init__(self, history: int = EVENT_HISTORY, backlog: int = SUBSCRIBER_BACKLOG,
+                 heartbeat: float = HEARTBEAT_SECONDS):
+        self.backlog = max(1, int(backlog))
+        self.heartbeat = heartbeat
+        self.last_id = 0
+        self.epoch = secrets.token_hex(4)
+        self._history = deque(maxlen=max(1, int(history)))  # Replayable events, oldest first
+        self._evicted = 0  # Id of the newest event that has dropped out of the history
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    @property
+    def version(self) -> str:
+        """The state's version, ``<epoch>.<last event id>``."""
+        return f"{self.epoch}.{self.last_id}"
+
+    @property
+    def subscribers(self) -> int:
+        """Streams currently open."""
+        return len(self._subscribers)
+
+    def publish(self, event_type: str, data: Dict, replay: bool = True) -> Optional[int]:
+        """Send an event to every open stream; returns its id, None for an event without replay."""
+        with self._lock:
+            if replay:
+                self.last_id += 1
+                event = (self.last_id, event_type, json.dumps(data, default=str))
+                if len(self._history) == self._history.maxlen:
+                    self._evicted = self._history[0][0]
+                self._history.append(event)
+            else:
+                event = (None, event_type, json.dumps(data, default=str))
+            for subscriber in list(self._subscribers):
+                try:
+                    subscriber.put_nowait(event)
+                except queue.Full:  # Too far behind: drop it, the browser reconnects and catches up
+                    self._subscribers.discard(subscriber)
+            return self.last_id
+
+    def subscribe(self, last_event_id: Optional[str] = None) -> Tuple[queue.Queue, List[Event]]:
+        """Open a stream; returns its queue and the events it missed since ``last_event_id``."""
+        subscriber = queue.Queue(maxsize=self.backlog)
+        with self._lock:
+            missed = []
+            if last_event_id:
+                missed = self._after(self._seen(last_event_id))
+                if missed is None:
+                    missed = [(None, "resync", json.dumps({"version": self.version}))]
+            self._subscribers.add(subscriber)
+        return subscriber, missed
+
+    def changes(self, since: Optional[str]) -> Tuple[str, Optional[List[Event]]]:
+        """The current version and the replayable events published after version ``since``.
+
+        The events are None when ``since`` is None or cannot be accounted for:
+        from another epoch, or older than the history.
+        """
+        with self._lock:
+            return self.version, self._after(self._seen(since) if since else None)
+
+    def _seen(self, last_event_id: str) -> int:
+        """The event id in a version or sent event id; -1 when it is from another epoch, has none or is malformed."""
+        epoch, _, event_id = str(last_event_id).rpartition(".")
+        if epoch != self.epoch or not event_id.isdigit():
+            return -1
+        return int(event_id)
+
+    def _after(self, seen: Optional[int]) -> Optional[List[Event]]:
+        if seen is None or seen > self.last_id or seen < self._evicted:
+            return None
+        return [event for event in self._history if event[0] > seen]
+
+    def unsubscribe(self, subscriber: queue.Queue):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def is_subscribed(self, subscriber: queue.Queue) -> bool:
+        """False once the stream was closed or dropped for falling behind."""
+        return subscriber in self._subscribers
+
+    def stream(self, last_event_id: Optional[str] = None) -> Iterator[str]:
+        """``text/event-stream`` body for one browser, ending if it falls too far behind."""
+        subscriber, missed = self.subscribe(last_event_id)
+        try:
+            yield f"retry: {RECONNECT_MS}\n\n"
+            for event in missed:
+                yield sse_frame(event, self.epoch)
+            while True:
+                try:
+                    yield sse_frame(subscriber.get(timeout=self.heartbeat), self.epoch)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                if subscriber.empty() and not self.is_subscribed(subscriber):
+                    return  # Dropped by publish; everything queued before that has been sent
+        finally:
+            self.unsubscribe(subscriber)
+
+
+class ControlChannel:
+    """Runs dashboard commands sent over WebSockets and streams events back on the same socket.
+
+    A client sends ``{"type": "command", "id": ..., "command": ..., ...}``
+    and gets ``{"type": "ack", "id": ..., "ok": ..., "seq": ...}`` back once
+    the command has run; ``seq`` is the state's version at that point. Events
+    arrive as ``ws_frame`` messages, numbered by ``seq``. A client that
+    reconnects with the last ``seq`` it applied is replayed what it missed.
+    It resends the commands that were never acknowledged, and a command id
+    seen before is acknowledged again without running twice.
+
+    ``handle`` applies one command and returns False for unknown commands.
+    """
+
+    def __init__(self, events: EventBroadcaster, handle: Callable[[Dict], bool]):
+        self.events = events
+        self.handle = handle
+        self._handled = OrderedDict()  # Command id -> its acknowledgement, oldest first
+        self._lock = threading.Lock()
+
+    def serve(self, ws, since: Optional[str] = None):
+        """Serve one connection until it closes; ``ws`` needs ``send``, ``receive`` and ``close``."""
+        subscriber, missed = self.events.subscribe(since)
+        send_lock = threading.Lock()
+
+        def send(message: str):
+            with send_lock:
+                ws.send(message)
+
+        def forward():
+            try:
+                for event in missed:
+                    send(ws_frame(event, self.events.epoch))
+                while self.events.is_subscribed(subscriber) or not subscriber.empty():
+                    try:
+                        send(ws_frame(subscriber.get(timeout=self.events.heartbeat), self.events.epoch))
+                    except queue.Empty:
+                        pass
+                ws.close()  # Dropped for falling behind: the client reconnects and resumes
+            except Exception:
+                pass  # The connection closed under us
+
+        threading.Thread(target=forward, name="ws-events", daemon=True).start()
+        try:
+            while True:
+                message = ws.receive()
+                if message is not None:
+                    send(json.dumps(self.acknowledge(message)))
+        finally:
+            self.events.unsubscribe(subscriber)
+
+    def acknowledge(self, message: str) -> Dict:
+        """Run the command in one client message, once per command id, and return its acknowledgement."""
+        try:
+            request = json.loads(message)
+        except ValueError:
+            return {"type": "ack", "id": None, "ok": False, "error": "invalid JSON"}
+        command_id = request.get("id")
+        with self._lock:
+            if command_id is not None and command_id in self._handled:
+                return self._handled[command_id]
+        ack = {"type": "ack", "id": command_id, "ok": True}
+        try:
+            if request.get("type") != "command" or not self.handle(request):
+                ack.update(ok=False, error=f"unknown command: {request.get('command')}")
+        except Exception as e:
+            ack.update(ok=False, error=str(e))
+        ack["seq"] = self.events.version
+        if command_id is not None:
+            with self._lock:
+                self._handled[command_id] = ack
+                while len(self._handled) > HANDLED_COMMANDS:
+                    self._handled.popitem(last=False)
+        return ack
@@ -0,0 +1,256 @@
+import argparse
+import json
+import os
+from typing import Dict, Iterator, List
+import numpy as np
+import psycopg2
+from psycopg2.extras import execute_values
+import pyarrow as pa
+import pyarrow.parquet as pq
+from src.config import DATABASE_URL
+from src.database import iter_results, setup_supabase_table, store_task_results, task_result_row
+from src.pg_queue import TASKS_TABLE, PostgresTaskQueue
+from src.vectors import EMBEDDING_DIMENSIONS
+
+EXPORT_CHUNK_SIZE = 10000  # Rows read, converted and written at a time
+FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+
+RESULT_SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("run_id", pa.string()),
+    ("task_id", pa.int64()),
+    ("task_name", pa.string()),
+    ("content", pa.large_string()),
+    ("embedding", pa.list_(pa.float32(), EMBEDDING_DIMENSIONS)),
+    ("period", pa.date32()),
+    ("created_at", pa.timestamp("us", tz="UTC")),
+])
+TASK_SCHEMA = pa.schema([
+    ("run_id", pa.string()),
+    ("task_id", pa.int64()),
+    ("objective", pa.string()),
+    ("task_name", pa.string()),
+    ("priority", pa.float64()),
+    ("context_filter", pa.string()),  # JSON
+    ("status", pa.string()),
+    ("attempts", pa.int32()),
+    ("result", pa.large_string()),
+    ("error", pa.string()),
+    ("enqueued_at", pa.timestamp("us", tz="UTC")),
+    ("started_at", pa.timestamp("us", tz="UTC")),
+    ("finished_at", pa.timestamp("us", tz="UTC")),
+])
+METRIC_SCHEMA = pa.schema([
+    ("run_id", pa.string()),
+    ("results", pa.int64()),
+    ("first_result_at", pa.timestamp("us", tz="UTC")),
+    ("last_result_at", pa.timestamp("us", tz="UTC")),
+    ("tasks", pa.int64()),
+    ("tasks_done", pa.int64()),
+    ("tasks_failed", pa.int64()),
+    ("attempts", pa.int64()),
+    ("mean_task_seconds", pa.float64()),
+])
+TASK_COLUMNS = [field.name for field in TASK_SCHEMA]
+
+
+def open_writer(path: str, schema: pa.Schema, format: str):
+    """A Parquet or Arrow IPC file writer; both take one record batch at a time."""
+    if format == "parquet":
+        return pq.ParquetWriter(path, schema, compression="zstd")
+    return pa.ipc.new_file(path, schema)
+
+
+def read_batches(path: str, chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[pa.RecordBatch]:
+    """Record batches of a Parquet or Arrow IPC file, read one at a time."""
+    if path.endswith(FORMATS["parquet"]):
+        yield from pq.ParquetFile(path).iter_batches(batch_size=chunk_size)
+        return
+    with pa.memory_map(path) as source:
+        reader = pa.ipc.open_file(source)
+        for i in range(reader.num_record_batches):
+            yield reader.get_batch(i)
+
+
+def result_batch(rows: List[Dict]) -> pa.RecordBatch:
+    """Result rows from ``iter_results`` as a record batch, embeddings as fixed-size float32 lists."""
+    vectors = np.stack([row["embedding"] for row in rows]).astype(np.float32, copy=False)
+    column = lambda name: [row[name] for row in rows]
+    return pa.RecordBatch.from_arrays([
+        pa.array(column("id"), pa.int64()),
+        pa.array(column("run_id"), pa.string()),
+        pa.array(column("task_id"), pa.int64()),
+        pa.array(column("task_name"), pa.string()),
+        pa.array(column("content"), pa.large_string()),
+        pa.FixedSizeListArray.from_arrays(pa.array(vectors.ravel()), EMBEDDING_DIMENSIONS),
+        pa.array(column("period"), pa.date32()),
+        pa.array(column("created_at"), pa.timestamp("us", tz="UTC")),
+    ], schema=RESULT_SCHEMA)
+
+
+def task_table_exists(conn) -> bool:
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regclass(%s) IS NOT NULL", (TASKS_TABLE,))
+        return cur.fetchone()[0]
+
+
+def iter_tasks(conn, chunk_size: int = EXPORT_CHUNK_SIZE, run_id: str = None) -> Iterator[List[tuple]]:
+    """Rows of the Postgres task table in TASK_COLUMNS order, read through a server-side cursor."""
+    where, params = ("WHERE run_id = %s", (run_id,)) if run_id is not None else ("", None)
+    with conn, conn.cursor(name=f"{TASKS_TABLE}_export") as cur:
+        cur.itersize = chunk_size
+        cur.execute(f"SELECT {', '.join(TASK_COLUMNS)} FROM {TASKS_TABLE} {where} ORDER BY run_id, task_id", params)
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                return
+            yield rows
+
+
+def task_metrics(conn, run_id: str = None) -> Dict[str, Dict]:
+    """Per-run task counts, attempts and mean execution time, aggregated in the database."""
+    where, params = ("WHERE run_id = %s", (run_id,)) if run_id is not None else ("", None)
+    with conn, conn.cursor() as cur:
+        cur.execute(f"""
+            SELECT run_id, count(*), count(*) FILTER (WHERE status = 'done'), count(*) FILTER (WHERE status = 'failed'),
+                   sum(attempts), avg(extract(epoch FROM finished_at - started_at))
+            FROM {TASKS_TABLE} {where}
+            GROUP BY run_id
+        """, params)
+        return {
+            run: {"tasks": tasks, "tasks_done": done, "tasks_failed": failed, "attempts": attempts,
+                  "mean_task_seconds": float(seconds) if seconds is not None else None}
+            for run, tasks, done, failed, attempts, seconds in cur.fetchall()
+        }
+
+
+def export_history(directory: str, format: str = "parquet", run_id: str = None,
+                   chunk_size: int = EXPORT_CHUNK_SIZE) -> Dict[str, int]:
+    """Write stored results, tasks and per-run metrics to ``directory``, one file each; returns rows written.
+
+    Every table is streamed a chunk at a time, so memory use does not depend
+    on the size of the history. Tasks and their metrics come from the Postgres
+    task table and are skipped when there is none.
+    """
+    os.makedirs(directory, exist_ok=True)
+    extension = FORMATS[format]
+    counts = {"results": 0, "tasks": 0, "metrics": 0}
+    metrics = {}
+
+    writer = open_writer(os.path.join(directory, "results" + extension), RESULT_SCHEMA, format)
+    try:
+        for rows in iter_results(chunk_size, run_id):
+            writer.write_batch(result_batch(rows))
+            counts["results"] += len(rows)
+            for row in rows:
+                at = row["created_at"]
+                run = metrics.setdefault(row["run_id"], {"results": 0, "first_result_at": at, "last_result_at": at})
+                run["results"] += 1
+                run["first_result_at"] = min(run["first_result_at"], at)
+                run["last_result_at"] = max(run["last_result_at"], at)
+    finally:
+        writer.close()
+
+    if DATABASE_URL:
+        conn = psycopg2.connect(DATABASE_URL)
+        try:
+            if task_table_exists(conn):
+                writer = open_writer(os.path.join(directory, "tasks" + extension), TASK_SCHEMA, format)
+                try:
+                    for rows in iter_tasks(conn, chunk_size, run_id):
+                        columns = [list(values) for values in zip(*rows)]
+                        filters = TASK_COLUMNS.index("context_filter")
+                        columns[filters] = [json.dumps(f) if f is not None else None for f in columns[filters]]
+                        writer.write_batch(pa.RecordBatch.from_arrays(
+                            [pa.array(values, field.type) for values, field in zip(columns, TASK_SCHEMA)],
+                            schema=TASK_SCHEMA,
+                        ))
+                        counts["tasks"] += len(rows)
+                finally:
+                    writer.close()
+                for run, stats in task_metrics(conn, run_id).items():
+                    metrics.setdefault(run, {"results": 0}).update(stats)
+        finally:
+            conn.close()
+
+    runs = sorted(metrics)
+    writer = open_writer(os.path.join(directory, "metrics" + extension), METRIC_SCHEMA, format)
+    try:
+        writer.write_batch(pa.RecordBatch.from_pylist([{"run_id": run, **metrics[run]} for run in runs],
+                                                      schema=METRIC_SCHEMA))
+    finally:
+        writer.close()
+    counts["metrics"] = len(runs)
+    return counts
+
+
+def find_file(directory: str, name: str):
+    for extension in FORMATS.values():
+        path = os.path.join(directory, name + extension)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def import_history(directory: str, chunk_size: int = EXPORT_CHUNK_SIZE) -> Dict[str, int]:
+    """Load results and tasks exported by ``export_history``; returns rows read.
+
+    Results keep their original time and are written through the idempotent
+    insert path, so importing the same export twice stores nothing new. Tasks
+    already in the task table are left as they are. Metrics are derived from
+    the other two and are not imported.
+    """
+    counts = {"results": 0, "tasks": 0}
+    path = find_file(directory, "results")
+    if path:
+        for batch in read_batches(path, chunk_size):
+            vectors = batch.column("embedding").flatten().to_numpy().reshape(-1, EMBEDDING_DIMENSIONS)
+            rows = [
+                task_result_row(task_id, task_name, content, vector, run_id, created_at)
+                for task_id, task_name, content, vector, run_id, created_at in zip(
+                    batch.column("task_id").to_pylist(), batch.column("task_name").to_pylist(),
+                    batch.column("content").to_pylist(), vectors, batch.column("run_id").to_pylist(),
+                    batch.column("created_at").to_pylist(),
+                )
+            ]
+            if not store_task_results(rows):
+                raise RuntimeError(f"Could not store results {counts['results']}-{counts['results'] + len(rows)}")
+            counts["results"] += len(rows)
+
+    path = find_file(directory, "tasks")
+    if path:
+        if not DATABASE_URL:
+            raise RuntimeError("Importing tasks needs DATABASE_URL")
+        queue = PostgresTaskQueue()
+        queue.setup()
+        queue.close()
+        conn = psycopg2.connect(DATABASE_URL)
+        try:
+            for batch in read_batches(path, chunk_size):
+                rows = list(zip(*(batch.column(name).to_pylist() for name in TASK_COLUMNS)))
+                with conn, conn.cursor() as cur:
+                    execute_values(cur, f"""
+                        INSERT INTO {TASKS_TABLE} ({', '.join(TASK_COLUMNS)}) VALUES %s
+                        ON CONFLICT (run_id, task_id) DO NOTHING
+                    """, rows, page_size=1000)
+                counts["tasks"] += len(rows)
+        finally:
+            conn.close()
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move run history to and from Parquet or Arrow IPC files")
+    parser.add_argument("command", choices=("export", "import"))
+    parser.add_argument("directory", help="Directory holding results, tasks and metrics files")
+    parser.add_argument("--format", choices=sorted(FORMATS), default="parquet", help="File format to export to")
+    parser.add_argument("--run-id", help="Only export this run")
+    parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE, help="Rows streamed at a time")
+    args = parser.parse_args()
+
+    setup_supabase_table()
+    if args.command == "export":
+        counts = export_history(args.directory, args.format, args.run_id, args.chunk_size)
+    else:
+        counts = import_history(args.directory, args.chunk_size)
+    print(", ".join(f"{count} {name}" for name, count in counts.items()) + f" {args.command}ed")
@@ -0,0 +1,62 @@
+import threading
+import time
+from collections import deque
+
+
+class FairGate:
+    """Shares a fixed number of execution slots between several owners in round-robin order.
+
+    Each agent run acquires a slot under its own name before a task executes.
+    When a slot frees up it goes to the next owner in turn that is waiting, so a
+    run with a long queue cannot starve the others.
+    """
+
+    def __init__(self, slots: int):
+        self.slots = max(1, int(slots))
+        self._busy = 0
+        self._waiting = {}  # owner -> deque of tickets, oldest first
+        self._turns = deque()  # owners with waiting tickets, next to be served first
+        self._cond = threading.Condition()
+
+    def acquire(self, owner):
+        ticket = object()
+        with self._cond:
+            if owner not in self._waiting:
+                self._waiting[owner] = deque()
+                self._turns.append(owner)
+            self._waiting[owner].append(ticket)
+            while self._busy >= self.slots or self._waiting[self._turns[0]][0] is not ticket:
+                self._cond.wait()
+            self._waiting[owner].popleft()
+            self._turns.popleft()
+            if self._waiting[owner]:
+                self._turns.append(owner)
+            else:
+                del self._waiting[owner]
+            self._busy += 1
+            self._cond.notify_all()
+
+    def release(self):
+        with self._cond:
+            self._busy -= 1
+            self._cond.notify_all()
+
+
+class RateLimiter:
+    """Spaces calls out to at most ``rate`` per second across every thread that shares it."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until the caller may make its next call."""
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            time.sleep(wait)
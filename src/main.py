@@ -1,15 +1,35 @@
+import argparse
 import time
 from collections import deque
-from typing import Dict, List
+from typing import Callable, Dict
 from src.agents import (
-    get_mistral_embedding,
     task_creation_agent,
-    prioritization_agent,
+    reprioritize_tasks,
     execution_agent,
     context_agent,
 )
-from src.database import setup_supabase_table, store_task_result, cleanup_supabase_table
-from src.config import OBJECTIVE, YOUR_TABLE_NAME, YOUR_FIRST_TASK
+from src.database import setup_supabase_table, cleanup_supabase_table
+from src.config import (
+    OBJECTIVE,
+    YOUR_TABLE_NAME,
+    YOUR_FIRST_TASK,
+    MAX_WORKERS,
+    PIPELINE_SPECULATION,
+    TASK_QUEUE_CAPACITY,
+    TASK_OVERFLOW_PATH,
+    CHECKPOINT_PATH,
+    run_path,
+    WORKER_BACKEND,
+)
+from src.limits import FairGate
+from src.workers import WorkerPool
+from src.scheduler import TaskScheduler, link_sibling_dependencies
+from src.task_queue import PriorityTaskQueue, Task
+from src.dedup import TaskDeduplicator
+from src.scoring import LocalPriorityScorer
+from src.checkpoint import RunCheckpoint
+from src.convergence import ConvergenceMonitor
+from src.writer import ResultWriter
 
 
 def print_header(title: str, color: str = "\033[96m\033[1m"):
@@ -17,123 +37,289 @@ def print_header(title: str, color: str = "\033[96m\033[1m"):
     print(f"{color}\n{'*' * 5}{title.upper()}{'*' * 5}\n\033[0m\033[0m")
 
 
-def add_task(task_list: deque, task: Dict):
+def add_task(task_list: PriorityTaskQueue, task: Task):
     """Add a task to the task list."""
     task_list.append(task)
 
 
-def main():
-    """Main execution loop for the autonomous task agent."""
-    # Print objective
-    print_header("OBJECTIVE")
-    print(OBJECTIVE)
+def resolve_speculation(speculation, task_list: PriorityTaskQueue, scheduler: TaskScheduler, pool: WorkerPool,
+                        log: Callable[[str], None] = print):
+    """Commit or discard the task that started executing before planning finished.
 
-    # Set up Supabase table
-    print("\n🔧 Setting up database...")
-    setup_supabase_table()
+    The speculative result is kept when its task is still the next ready task.
+    With PIPELINE_SPECULATION="commit" it is also kept when planning moved the
+    task further back, as long as it is still queued.
+    """
+    task, future = speculation
+    head = scheduler.peek_ready(task_list, pool.pending_tasks())
+    still_head = head is not None and head.task_id == task.task_id
+    if still_head or (PIPELINE_SPECULATION == "commit" and task in task_list):
+        task_list.remove(task)
+        pool.commit(task, future)
+        log(f"🔮 Speculative execution of task {task.task_id} committed")
+    else:
+        pool.discard(future)
+        log(f"🗑️  Speculative execution of task {task.task_id} discarded")
+
+
+def run_agent(objective: str, first_task_name: str = YOUR_FIRST_TASK, resume: bool = False, run_id: str = None,
+              max_iterations: int = 10, gate: FairGate = None, vectors: Dict = None) -> Dict:
+    """Run one agent loop until its queue is empty or it reaches ``max_iterations``.
+
+    A ``run_id`` tags stored results, limits retrieved context to this run and
+    gives the run its own checkpoint and overflow files, so several runs can
+    share a process. ``gate`` and ``vectors`` are the execution slots and task
+    embedding cache shared between those runs. Returns a summary of the run.
+    """
+    prefix = f"[{run_id}] " if run_id else ""
+    context_filter = {"run_id": run_id} if run_id else None
+
+    def log(message: str = ""):
+        text = str(message)
+        stripped = text.lstrip("\n")
+        print("\n" * (len(text) - len(stripped)) + prefix + stripped)
+
+    # Print objective
+    print_header(prefix + "OBJECTIVE")
+    log(objective)
 
     # Initialize task list
-    task_list = deque([])
+    task_list = PriorityTaskQueue(capacity=TASK_QUEUE_CAPACITY, overflow_path=run_path(TASK_OVERFLOW_PATH, run_id),
+                                  run_id=run_id or "main")
+
+    # Track dependencies so independent tasks can run side by side
+    scheduler = TaskScheduler()
+    deduplicator = TaskDeduplicator(vectors=vectors)
+    scorer = LocalPriorityScorer(vectors=deduplicator.vectors)
+    checkpoint = RunCheckpoint(run_path(CHECKPOINT_PATH, run_id)) if CHECKPOINT_PATH else None
+    convergence = ConvergenceMonitor()
+    writer = ResultWriter()
+    embedded = deque()  # Result embeddings delivered by the writer, not yet seen by the convergence monitor
 
-    # Add the first task
-    first_task = {"task_id": 1, "task_name": YOUR_FIRST_TASK}
-    add_task(task_list, first_task)
+    def on_embedded(embedding):
+        scorer.add_result(embedding)
+        embedded.append(embedding)
 
     # Main loop configuration
     task_id_counter = 1
-    max_iterations = 10  # Prevent runaway costs
     iteration = 0
 
-    print(f"\n🚀 Starting autonomous task agent with objective: {OBJECTIVE}")
-    print(f"📊 Maximum iterations: {max_iterations}")
+    state = checkpoint.resume(objective, task_list, scheduler, deduplicator) if resume and checkpoint else None
+    if state:
+        task_id_counter = state["task_id_counter"]
+        iteration = state["iteration"]
+        log(f"\n♻️  Resumed from {checkpoint.path} at iteration {iteration} with {len(state['queue']) + len(state['in_flight'])} queued tasks")
+    else:
+        if resume:
+            log("\nℹ️  No checkpoint to resume, starting a new run")
+        # Add the first task
+        first_task = Task(1, first_task_name)
+        add_task(task_list, first_task)
+        scheduler.add(first_task)
 
-    while task_list and iteration < max_iterations:
-        iteration += 1
-        print(f"\n🔄 Iteration {iteration}/{max_iterations}")
-        
-        # Print current task list
-        print_header("TASK LIST", "\033[95m\033[1m")
-        for t in task_list:
-            print(f"{t['task_id']}: {t['task_name']}")
+    log(f"\n🚀 Starting autonomous task agent with objective: {objective}")
+    log(f"📊 Maximum iterations: {max_iterations}")
+    log(f"👷 Workers: {MAX_WORKERS}")
 
-        # Step 1: Pull the first task
-        task = task_list.popleft()
-        print_header("NEXT TASK", "\033[92m\033[1m")
-        print(f"{task['task_id']}: {task['task_name']}")
+    if WORKER_BACKEND == "postgres":
+        # Tasks are executed by `python -m src.pg_queue` worker processes
+        from src.pg_queue import PostgresTaskQueue, PostgresWorkerPool
 
-        # Step 2: Execute task
-        print("\n⚡ Executing task...")
-        result = execution_agent(OBJECTIVE, task["task_name"])
-        this_task_id = int(task["task_id"])
-        
-        print_header("TASK RESULT", "\033[93m\033[1m")
-        print(result)
+        task_queue = PostgresTaskQueue()
+        task_queue.setup()
+        if not state:
+            task_queue.reset_run(run_id or "main")
+        pool = PostgresWorkerPool(task_queue, run_id or "main", objective, MAX_WORKERS, context_filter)
+    else:
+        pool = WorkerPool(MAX_WORKERS, gate=gate, owner=run_id)
+    speculation = None
 
-        # Step 3: Store result in Supabase
-        print("\n💾 Storing task result...")
-        enriched_result = {"data": result}
-        result_id = f"result_{task['task_id']}"
-        
-        # Generate embedding and store
-        embedding = get_mistral_embedding(result)
-        success = store_task_result(str(task['task_id']), task["task_name"], result, embedding)
-        
-        if success:
-            print("✅ Task result stored successfully")
-        else:
-            print("❌ Failed to store task result")
-
-        # Step 4: Create new tasks
-        print("\n🎯 Generating new tasks...")
-        new_tasks = task_creation_agent(
-            OBJECTIVE,
-            enriched_result,
-            task["task_name"],
-            [t["task_name"] for t in task_list]
-        )
+    try:
+        while (task_list or pool.has_pending()) and iteration < max_iterations:
+            # Step 1: Settle the speculative execution started during the last planning step
+            if speculation:
+                resolve_speculation(speculation, task_list, scheduler, pool, log)
+                speculation = None
+
+            # Hand tasks whose dependencies have finished to idle workers
+            while task_list and pool.free_slots and iteration + pool.pending_count < max_iterations:
+                task = scheduler.pop_ready(task_list, pool.pending_tasks())
+                if task is None:
+                    break
+                print_header(prefix + "NEXT TASK", "\033[92m\033[1m")
+                log(f"{task.task_id}: {task.task_name}")
+                pool.submit(task, execution_agent, objective, task.task_name, context_filter)
+
+            if not pool.has_pending():
+                # Nothing to collect: wait for a worker still finishing a discarded speculation, then hand out again
+                if pool.wait_for_speculation():
+                    continue
+                log("\n⛔ No task is ready to run")
+                break
+
+            iteration += 1
+            log(f"\n🔄 Iteration {iteration}/{max_iterations}")
+
+            # Print current task list
+            print_header(prefix + "TASK LIST", "\033[95m\033[1m")
+            for t in task_list:
+                log(f"{t.task_id}: {t.task_name}")
+
+            # Step 2: Collect the oldest running task so results are committed in order
+            log(f"\n⚡ Executing tasks ({pool.pending_count} in flight)...")
+            task, result, elapsed = pool.next_result()
+            this_task_id = task.task_id
+            scheduler.mark_finished(this_task_id, elapsed)
+            deduplicator.mark_completed(task)
+
+            print_header(prefix + "TASK RESULT", "\033[93m\033[1m")
+            log(f"{task.task_id}: {task.task_name}")
+            log(result)
+
+            # Pipelining: start the current queue head on the freed worker while this result is planned
+            if PIPELINE_SPECULATION != "off" and pool.free_slots and iteration + pool.pending_count < max_iterations:
+                head = scheduler.peek_ready(task_list, pool.pending_tasks())
+                if head is not None:
+                    log(f"\n🔮 Speculatively executing task {head.task_id}: {head.task_name}")
+                    speculation = (head, pool.speculate(head, execution_agent, objective, head.task_name, context_filter))
+
+            # Step 3: Hand the result to the write-behind stage, which embeds and stores it in Supabase
+            enriched_result = {"data": result}
+            writer.submit(task.task_id, task.task_name, result, run_id, on_embedded)
+            log(f"\n💾 Task result queued for storage ({writer.backlog} waiting)")
+
+            # Step 4: Create new tasks, unless the run has converged and is draining its queue
+            if convergence.converged and convergence.action == "throttle":
+                new_tasks, generated = [], []
+                log("\n🧊 Converged, draining the queue without new tasks")
+            else:
+                log("\n🎯 Generating new tasks...")
+                new_tasks = task_creation_agent(
+                    objective,
+                    enriched_result,
+                    task.task_name,
+                    [t.task_name for t in task_list] + [t.task_name for t in pool.pending_tasks()]
+                )
+                generated = [t.task_name for t in new_tasks]
+
+                # Drop paraphrases of queued, running and completed tasks before they cost an execution call
+                new_tasks = deduplicator.filter(new_tasks, list(task_list) + pool.pending_tasks())
+
+            # Measure how much this iteration added to what the run already knew
+            results = [embedded.popleft() for _ in range(len(embedded))]
+            novelty = convergence.observe(iteration, results, [deduplicator.vectors[name] for name in generated])
+            if novelty is not None:
+                log(f"🧭 Novelty {novelty:.3f} (rolling {convergence.rolling_novelty:.3f})")
         
-        # Add new tasks to the list
-        for new_task in new_tasks:
-            task_id_counter += 1
-            new_task.update({"task_id": task_id_counter})
-            add_task(task_list, new_task)
+            # Add new tasks to the list
+            for new_task in new_tasks:
+                task_id_counter += 1
+                new_task.task_id = task_id_counter
+            link_sibling_dependencies(new_tasks)
+            for new_task in new_tasks:
+                scheduler.add(new_task, parent_id=this_task_id)
+                add_task(task_list, new_task)
             
-        if new_tasks:
-            print(f"✅ Generated {len(new_tasks)} new tasks")
-        else:
-            print("ℹ️  No new tasks generated")
+            if new_tasks:
+                log(f"✅ Generated {len(new_tasks)} new tasks")
+            else:
+                log("ℹ️  No new tasks generated")
+
+            # Step 5: Prioritize tasks
+            log("\n📋 Reprioritizing tasks...")
+            mode = reprioritize_tasks(this_task_id, task_list, objective, new_tasks, iteration, scorer=scorer)
+            if mode == "skipped":
+                log("ℹ️  Queue order unchanged")
+            else:
+                log(f"✅ Tasks reprioritized ({mode})")
+
+            # Checkpoint the committed state; tasks still running are re-queued on resume
+            if checkpoint:
+                checkpoint.save(objective, iteration, task_id_counter, task_list, scheduler, pool.pending_tasks(),
+                                writer.unstored())
+
+            if convergence.converged_at == iteration:
+                log(f"\n🧊 Converged: rolling novelty {convergence.rolling_novelty:.3f} is below {convergence.threshold}")
+                if convergence.action == "stop":
+                    break
 
-        # Step 5: Prioritize tasks
-        if task_list:
-            print("\n📋 Reprioritizing tasks...")
-            prioritization_agent(this_task_id, task_list, OBJECTIVE)
-            print("✅ Tasks reprioritized")
+            # Brief pause between iterations
+            log(f"\n⏱️  Waiting 2 seconds before next iteration...")
+            time.sleep(2)
 
-        # Brief pause between iterations
-        print(f"\n⏱️  Waiting 2 seconds before next iteration...")
-        time.sleep(2)
+    finally:
+        if speculation:
+            pool.discard(speculation[1])
+        pool.shutdown()
+        log("\n💾 Flushing stored results...")
+        writer.close()
 
     # Final summary
-    print_header("EXECUTION COMPLETE", "\033[96m\033[1m")
-    if iteration >= max_iterations:
-        print(f"🛑 Reached maximum iterations ({max_iterations})")
+    print_header(prefix + "EXECUTION COMPLETE", "\033[96m\033[1m")
+    convergence_report = convergence.report(iteration, max_iterations)
+    if convergence.converged and convergence.action == "stop":
+        log(f"🧊 Stopped at convergence after iteration {convergence.converged_at}")
+    elif iteration >= max_iterations:
+        log(f"🛑 Reached maximum iterations ({max_iterations})")
     else:
-        print("✅ All tasks completed")
+        log("✅ All tasks completed")
         
     if task_list:
-        print(f"\n📋 Remaining tasks: {len(task_list)}")
+        log(f"\n📋 Remaining tasks: {len(task_list)}")
         for t in task_list:
-            print(f"  - {t['task_name']}")
+            log(f"  - {t.task_name}")
     else:
-        print("\n🎉 No remaining tasks")
+        log("\n🎉 No remaining tasks")
+
+    log(f"\n📊 Total iterations completed: {iteration}")
+    if convergence.converged:
+        log(f"🧊 Iterations saved by convergence: {convergence_report['iterations_saved']}")
+
+    log(f"💾 Results stored: {writer.stats['stored']} in {writer.stats['batches']} batches, "
+        f"{writer.stats['failed']} failed, {writer.stats['retries']} retries")
+    log(f"🧹 Duplicate tasks skipped: {deduplicator.stats['execution_calls_avoided']}")
+    if TASK_QUEUE_CAPACITY:
+        queue = task_list.pressure()
+        log(f"📦 Queue capacity {queue['capacity']}: {queue['spilled']} spilled, {queue['restored']} restored, "
+            f"{queue['evicted']} evicted, {queue['spilled_now']} still on disk")
+    if PIPELINE_SPECULATION != "off":
+        stats = pool.speculation_stats
+        log(f"🔮 Speculative executions: {stats['started']} started, {stats['committed']} committed, "
+            f"{stats['discarded']} discarded ({stats['wasted_seconds']:.1f}s wasted)")
+
+    critical_path = scheduler.critical_path()
+    log(f"🧭 Critical path ({critical_path['seconds']}s):")
+    for t in critical_path["tasks"]:
+        log(f"  {t['task_id']}: {t['task_name']}")
+    log(f"🎯 Objective: {objective}")
+
+    return {
+        "run_id": run_id,
+        "objective": objective,
+        "iterations": iteration,
+        "remaining_tasks": len(task_list.snapshot()),
+        "duplicates_skipped": deduplicator.stats["execution_calls_avoided"],
+        "converged_at": convergence_report["converged_at"],
+        "iterations_saved": convergence_report["iterations_saved"],
+    }
+
 
-    print(f"\n📊 Total iterations completed: {iteration}")
-    print(f"🎯 Objective: {OBJECTIVE}")
+def main(resume: bool = False):
+    """Main execution loop for the autonomous task agent."""
+    # Set up Supabase table
+    print("\n🔧 Setting up database...")
+    setup_supabase_table()
+
+    run_agent(OBJECTIVE, resume=resume)
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Autonomous task agent")
+    parser.add_argument("--resume", action="store_true", help="Continue from the last checkpoint")
+    args = parser.parse_args()
+
     try:
-        main()
+        main(resume=args.resume)
     except KeyboardInterrupt:
         print("\n\n⏹️  Task agent stopped by user")
     except Exception as e:
@@ -0,0 +1,325 @@
+import argparse
+import json
+import os
+import socket
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+import psycopg2
+from psycopg2.extras import Json, execute_values
+from src.config import DATABASE_URL, TASK_LEASE_SECONDS, TASK_MAX_ATTEMPTS
+from src.task_queue import Task
+
+TASKS_TABLE = "agent_tasks"
+
+
+class PostgresTaskQueue:
+    """Durable task table that any number of worker processes claim work from.
+
+    A worker claims the best queued task with ``FOR UPDATE SKIP LOCKED``, so
+    concurrent workers never block on or double-claim the same row. A claim is a
+    lease: the worker extends it with ``heartbeat`` while it runs, and a task
+    whose lease expires (the worker died or hung) is claimed again by another
+    worker, up to ``max_attempts`` times before it is marked failed.
+    """
+
+    def __init__(self, dsn: str = DATABASE_URL, lease_seconds: int = TASK_LEASE_SECONDS,
+                 max_attempts: int = TASK_MAX_ATTEMPTS):
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._conn = psycopg2.connect(dsn)
+        self._lock = threading.Lock()  # One connection, shared with the heartbeat thread
+
+    def setup(self):
+        """Create the task table and its claim index if they do not exist."""
+        self._execute(f"""
+            CREATE TABLE IF NOT EXISTS {TASKS_TABLE} (
+                run_id TEXT NOT NULL,
+                task_id INTEGER NOT NULL,
+                objective TEXT NOT NULL,
+                task_name TEXT NOT NULL,
+                priority DOUBLE PRECISION NOT NULL DEFAULT 0,
+                context_filter JSONB,
+                status TEXT NOT NULL DEFAULT 'queued',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                lease_owner TEXT,
+                lease_expires_at TIMESTAMPTZ,
+                result TEXT,
+                error TEXT,
+                enqueued_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                started_at TIMESTAMPTZ,
+                finished_at TIMESTAMPTZ,
+                PRIMARY KEY (run_id, task_id)
+            );
+            CREATE INDEX IF NOT EXISTS {TASKS_TABLE}_claim_idx
+                ON {TASKS_TABLE} (priority DESC, enqueued_at)
+                WHERE status IN ('queued', 'leased');
+        """)
+
+    def enqueue(self, run_id: str, objective: str, tasks: List[Task], context_filter: Dict = None):
+        """Queue tasks for a run. Tasks that already finished for this run keep their result."""
+        rows = [(run_id, t.task_id, objective, t.task_name, t.priority or 0.0, Json(context_filter)) for t in tasks]
+        with self._lock, self._conn, self._conn.cursor() as cur:
+            execute_values(cur, f"""
+                INSERT INTO {TASKS_TABLE} (run_id, task_id, objective, task_name, priority, context_filter)
+                VALUES %s
+                ON CONFLICT (run_id, task_id) DO UPDATE
+                SET task_name = EXCLUDED.task_name, priority = EXCLUDED.priority, status = 'queued',
+                    attempts = 0, lease_owner = NULL, lease_expires_at = NULL, error = NULL
+                WHERE {TASKS_TABLE}.status NOT IN ('done', 'leased')
+            """, rows)
+
+    def claim(self, worker_id: str, run_id: str = None) -> Optional[Dict]:
+        """Lease the highest-priority runnable task, optionally only from one run, or return None."""
+        with self._lock, self._conn, self._conn.cursor() as cur:
+            # Leases that expired on their last allowed attempt are not retried again
+            cur.execute(f"""
+                UPDATE {TASKS_TABLE}
+                SET status = 'failed', error = 'lease expired', lease_owner = NULL, finished_at = now()
+                WHERE status = 'leased' AND lease_expires_at < now() AND attempts >= %s
+            """, (self.max_attempts,))
+            cur.execute(f"""
+                UPDATE {TASKS_TABLE} t
+                SET status = 'leased', attempts = t.attempts + 1, lease_owner = %(worker)s,
+                    lease_expires_at = now() + make_interval(secs => %(lease)s), started_at = now()
+                FROM (
+                    SELECT run_id, task_id FROM {TASKS_TABLE}
+                    WHERE (status = 'queued' OR (status = 'leased' AND lease_expires_at < now()))
+                      AND (%(run_id)s::text IS NULL OR run_id = %(run_id)s)
+                    ORDER BY priority DESC, enqueued_at
+                    LIMIT 1
+                    FOR UPDATE SKIP LOCKED
+                ) next
+                WHERE t.run_id = next.run_id AND t.task_id = next.task_id
+                RETURNING t.run_id, t.task_id, t.objective, t.task_name, t.context_filter, t.attempts
+            """, {"worker": worker_id, "lease": self.lease_seconds, "run_id": run_id})
+            row = cur.fetchone()
+        if row is None:
+            return None
+        keys = ("run_id", "task_id", "objective", "task_name", "context_filter", "attempts")
+        return dict(zip(keys, row))
+
+    def heartbeat(self, run_id: str, task_id: int, worker_id: str) -> bool:
+        """Extend a lease. Returns False once the lease was lost to another worker."""
+        return self._execute(f"""
+            UPDATE {TASKS_TABLE} SET lease_expires_at = now() + make_interval(secs => %s)
+            WHERE run_id = %s AND task_id = %s AND lease_owner = %s AND status = 'leased'
+        """, (self.lease_seconds, run_id, task_id, worker_id)) > 0
+
+    def complete(self, run_id: str, task_id: int, worker_id: str, result: str) -> bool:
+        """Record a result. Returns False if the lease had expired and been taken over."""
+        return self._execute(f"""
+            UPDATE {TASKS_TABLE}
+            SET status = 'done', result = %s, lease_owner = NULL, finished_at = now()
+            WHERE run_id = %s AND task_id = %s AND lease_owner = %s AND status = 'leased'
+        """, (result, run_id, task_id, worker_id)) > 0
+
+    def fail(self, run_id: str, task_id: int, worker_id: str, error: str):
+        """Give a task back for another attempt, or mark it failed after ``max_attempts``."""
+        self._execute(f"""
+            UPDATE {TASKS_TABLE}
+            SET status = CASE WHEN attempts >= %s THEN 'failed' ELSE 'queued' END,
+                error = %s, lease_owner = NULL, lease_expires_at = NULL,
+                finished_at = CASE WHEN attempts >= %s THEN now() END
+            WHERE run_id = %s AND task_id = %s AND lease_owner = %s AND status = 'leased'
+        """, (self.max_attempts, error, self.max_attempts, run_id, task_id, worker_id))
+
+    def cancel(self, run_id: str, task_id: int) -> bool:
+        """Withdraw a task that no worker has claimed yet; returns False when one already has."""
+        return self._execute(f"UPDATE {TASKS_TABLE} SET status = 'cancelled' WHERE run_id = %s AND task_id = %s "
+                             f"AND status = 'queued'", (run_id, task_id)) > 0
+
+    def finished(self, run_id: str, task_ids: List[int]) -> Dict[int, Tuple[str, Optional[str], Optional[str], float]]:
+        """Status, result, error and execution seconds of the given tasks that are done or failed."""
+        with self._lock, self._conn, self._conn.cursor() as cur:
+            cur.execute(f"""
+                SELECT task_id, status, result, error,
+                       COALESCE(EXTRACT(EPOCH FROM finished_at - started_at), 0)
+                FROM {TASKS_TABLE}
+                WHERE run_id = %s AND task_id = ANY(%s) AND status IN ('done', 'failed')
+            """, (run_id, list(task_ids)))
+            return {row[0]: (row[1], row[2], row[3], float(row[4])) for row in cur.fetchall()}
+
+    def leases(self, run_id: str) -> List[Dict]:
+        """Tasks of a run currently held by a worker."""
+        with self._lock, self._conn, self._conn.cursor() as cur:
+            cur.execute(f"""
+                SELECT lease_owner, task_id, task_name, EXTRACT(EPOCH FROM started_at)
+                FROM {TASKS_TABLE} WHERE run_id = %s AND status = 'leased' ORDER BY lease_owner
+            """, (run_id,))
+            return [{"worker": owner, "state": "busy", "task_id": task_id, "task_name": name, "started_at": float(started)}
+                    for owner, task_id, name, started in cur.fetchall()]
+
+    def reset_run(self, run_id: str):
+        """Forget every task of a run, so a new run can reuse its ID."""
+        self._execute(f"DELETE FROM {TASKS_TABLE} WHERE run_id = %s", (run_id,))
+
+    def close(self):
+        self._conn.close()
+
+    def _execute(self, sql: str, params=None) -> int:
+        with self._lock, self._conn, self._conn.cursor() as cur:
+            cur.execute(sql, params)
+            return cur.rowcount
+
+
+class PostgresWorkerPool:
+    """Drop-in for WorkerPool that hands tasks to worker processes through a PostgresTaskQueue.
+
+    Submitted tasks are written to the task table, executed by whichever
+    worker claims them, and their results are collected in submission order
+    like the thread pool's. Workers always run ``execution_agent`` for the
+    run's objective and context filter, so the callable passed to ``submit``
+    is not shipped to them.
+    """
+
+    def __init__(self, queue: PostgresTaskQueue, run_id: str, objective: str, max_in_flight: int,
+                 context_filter: Dict = None, poll_interval: float = 1.0):
+        self.queue = queue
+        self.run_id = run_id
+        self.objective = objective
+        self.max_workers = max(1, int(max_in_flight))
+        self.context_filter = context_filter
+        self.poll_interval = poll_interval
+        self._in_flight = deque()  # tasks in submission order
+        self._speculative = set()  # task_ids started speculatively and not yet committed or discarded
+        self._discarded = set()  # task_ids discarded after a worker claimed them, whose time is not yet counted
+        self.speculation_stats = {"started": 0, "committed": 0, "discarded": 0, "wasted_seconds": 0.0}
+
+    @property
+    def free_slots(self) -> int:
+        return self.max_workers - len(self._in_flight) - len(self._speculative)
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._in_flight)
+
+    def has_pending(self) -> bool:
+        return bool(self._in_flight)
+
+    def pending_tasks(self) -> List[Task]:
+        return list(self._in_flight)
+
+    def submit(self, task: Task, fn=None, *args):
+        """Queue ``task`` for the workers; ``fn`` and ``args`` are ignored."""
+        self.queue.enqueue(self.run_id, self.objective, [task], self.context_filter)
+        self._in_flight.append(task)
+        return task
+
+    def speculate(self, task: Task, fn=None, *args):
+        self.queue.enqueue(self.run_id, self.objective, [task], self.context_filter)
+        self._speculative.add(task.task_id)
+        self.speculation_stats["started"] += 1
+        return task
+
+    def commit(self, task: Task, future=None):
+        self._speculative.discard(task.task_id)
+        self.speculation_stats["committed"] += 1
+        self._in_flight.append(task)
+
+    def discard(self, future: Task):
+        """Withdraw a speculative task; one a worker already claimed runs to completion unused.
+
+        The execution time of such a task is counted as wasted once it finishes.
+        """
+        self._speculative.discard(future.task_id)
+        self.speculation_stats["discarded"] += 1
+        if not self.queue.cancel(self.run_id, future.task_id):
+            self._discarded.add(future.task_id)
+
+    def wait_for_speculation(self, timeout: float = None) -> bool:
+        """Discarded speculations are withdrawn from the queue and never hold a slot here."""
+        return False
+
+    def next_result(self, timeout: float = None) -> Optional[Tuple[Task, str, float]]:
+        """Wait until the oldest submitted task is done or has failed for good; None when nothing was submitted."""
+        if not self._in_flight:
+            return None
+        task = self._in_flight[0]
+        deadline = time.time() + timeout if timeout is not None else None
+        while True:
+            finished = self.queue.finished(self.run_id, [task.task_id]).get(task.task_id)
+            if finished is not None:
+                break
+            if deadline is not None and time.time() >= deadline:
+                raise TimeoutError(f"task {task.task_id} is still running")
+            time.sleep(self.poll_interval)
+        self._in_flight.popleft()
+        self._record_waste()
+        status, result, error, elapsed = finished
+        if status == "failed":
+            result = f"Task execution failed due to error: {error}"
+        return task, result, elapsed
+
+    def worker_status(self) -> List[Dict]:
+        return self.queue.leases(self.run_id)
+
+    def shutdown(self, wait: bool = True):
+        """Release the database connection; queued tasks stay in the table for a resumed run.
+
+        Discarded speculations still running at this point are not counted as wasted.
+        """
+        self._record_waste()
+        self.queue.close()
+
+    def _record_waste(self):
+        if self._discarded:
+            for task_id, (_, _, _, elapsed) in self.queue.finished(self.run_id, list(self._discarded)).items():
+                self.speculation_stats["wasted_seconds"] += elapsed
+                self._discarded.discard(task_id)
+
+
+def run_worker(queue: PostgresTaskQueue, worker_id: str, run_id: str = None, poll_interval: float = 2.0):
+    """Claim and execute tasks until interrupted, heartbeating each lease while its task runs."""
+    from src.agents import execution_agent
+
+    print(f"👷 Worker {worker_id} waiting for tasks{f' from {run_id}' if run_id else ''}...")
+    while True:
+        claimed = queue.claim(worker_id, run_id)
+        if claimed is None:
+            time.sleep(poll_interval)
+            continue
+
+        key = (claimed["run_id"], claimed["task_id"])
+        print(f"⚡ {key[0]}/{key[1]} (attempt {claimed['attempts']}): {claimed['task_name']}")
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(queue.lease_seconds / 3):
+                if not queue.heartbeat(*key, worker_id):
+                    print(f"⚠️  Lost the lease on {key[0]}/{key[1]}")
+                    return
+
+        heartbeat = threading.Thread(target=beat, name="heartbeat", daemon=True)
+        heartbeat.start()
+        try:
+            context_filter = claimed["context_filter"]
+            if isinstance(context_filter, str):
+                context_filter = json.loads(context_filter)
+            result = execution_agent(claimed["objective"], claimed["task_name"], context_filter)
+            if queue.complete(*key, worker_id, result):
+                print(f"✅ {key[0]}/{key[1]} done")
+        except Exception as e:
+            print(f"❌ {key[0]}/{key[1]} failed: {e}")
+            queue.fail(*key, worker_id, str(e))
+        finally:
+            stop.set()
+            heartbeat.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Execute agent tasks claimed from the Postgres task table")
+    parser.add_argument("--run-id", help="Only claim tasks of this run")
+    parser.add_argument("--worker-id", default=f"{socket.gethostname()}-{os.getpid()}")
+    parser.add_argument("--poll-interval", type=float, default=2.0)
+    args = parser.parse_args()
+
+    task_queue = PostgresTaskQueue()
+    task_queue.setup()
+    try:
+        run_worker(task_queue, args.worker_id, args.run_id, args.poll_interval)
+    except KeyboardInterrupt:
+        print("\n⏹️  Worker stopped")
+    finally:
+        task_queue.close()
@@ -0,0 +1,252 @@
+import datetime
+import struct
+import threading
+from contextlib import contextmanager
+from io import BytesIO
+from typing import Dict, Iterator, List, Tuple
+import psycopg2.errors
+from psycopg2.pool import ThreadedConnectionPool
+from src.config import DATABASE_URL, PG_POOL_SIZE, YOUR_TABLE_NAME
+from src.database import (PARTITIONS_AHEAD, RESULT_COLUMNS, SCHEMA_VERSION, VECTOR_COLUMN, migrations_sql,
+                          period_of, period_start, schema_version_sql)
+from src.vectors import (PGVECTOR_TYPE, check_precision, from_pgvector_binary, stored_precision, to_pgvector_binary,
+                         to_pgvector_text)
+
+# Header of PostgreSQL's binary COPY format: signature, flags and header extension length
+COPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack("!ii", 0, 0)
+COPY_TRAILER = struct.pack("!h", -1)
+PG_EPOCH = datetime.datetime(2000, 1, 1, tzinfo=datetime.timezone.utc)  # Zero of Postgres' binary dates and times
+FILTER_TYPES = {"run_id": "text", "task_id": "bigint", "task_name": "text"}  # Postgres types of the filter columns
+
+
+class PostgresStore:
+    """Task result storage over pooled direct Postgres connections instead of Supabase's REST API.
+
+    Result rows are written with binary ``COPY``, so embeddings travel as packed
+    float32 (or float16 into a ``halfvec`` column) rather than JSON number
+    lists, and a whole batch goes in one statement. Similarity queries run as a statement prepared once per pooled
+    connection. The table is partitioned by month, see ``results_schema_sql``.
+    """
+
+    def __init__(self, dsn: str = DATABASE_URL, pool_size: int = PG_POOL_SIZE, table: str = YOUR_TABLE_NAME):
+        self.table = table
+        pool_size = max(1, int(pool_size))
+        self._pool = ThreadedConnectionPool(pool_size, pool_size, dsn)  # Idle connections stay open with their statements
+        self._slots = threading.BoundedSemaphore(pool_size)  # psycopg2 raises instead of waiting when the pool is empty
+        self._prepared = {}  # Pooled connection -> names of the statements it already holds
+        self._statements = {}  # (filter columns, result columns) -> name of its similarity statement
+        self._statements_lock = threading.Lock()
+        self._period = None  # Month whose partitions were last made sure of
+
+    @contextmanager
+    def connection(self):
+        """Borrow a pooled connection for one transaction, waiting while all of them are in use."""
+        with self._slots:
+            conn = self._pool.getconn()
+            try:
+                with conn:
+                    yield conn
+            finally:
+                if conn.closed:
+                    self._prepared.pop(id(conn), None)
+                self._pool.putconn(conn, close=bool(conn.closed))
+
+    def setup(self) -> bool:
+        """Bring the results schema up to SCHEMA_VERSION; returns False when it already was.
+
+        The recorded version is read with one query, and only missing
+        migrations run. Tables from before partitioning are converted by the
+        first one, see ``results_schema_sql``. Raises ValueError when the
+        recorded embedding column has another precision than VECTOR_PRECISION.
+        """
+        try:
+            with self.connection() as conn, conn.cursor() as cur:
+                cur.execute(schema_version_sql(self.table))
+                latest = cur.fetchone()
+            version = latest[0] if latest else 0
+        except psycopg2.errors.UndefinedTable:
+            latest, version = None, 0
+        if latest:
+            check_precision(stored_precision(latest[1]), self.table)
+        if version >= SCHEMA_VERSION:
+            return False
+        with self.connection() as conn, conn.cursor() as cur:
+            cur.execute("CREATE EXTENSION IF NOT EXISTS vector")
+            cur.execute(migrations_sql(version, self.table))
+        self._period = period_start()
+        return True
+
+    def drop(self):
+        """Delete the results table and its schema version."""
+        with self.connection() as conn, conn.cursor() as cur:
+            cur.execute(f"DROP TABLE IF EXISTS {self.table}, {self.table}_schema_version")
+
+    def drop_periods_before(self, cutoff: datetime.date) -> int:
+        """Drop the monthly partitions wholly before ``cutoff``; returns how many were dropped."""
+        with self.connection() as conn, conn.cursor() as cur:
+            cur.execute(f"SELECT {self.table}_drop_partitions_before(%s)", (cutoff,))
+            return cur.fetchone()[0]
+
+    def deduplicate(self, batch_size: int = 1000) -> int:
+        """Delete all but the first copy of each (run_id, task_id, content_hash), a batch per transaction.
+
+        The unique index only covers copies within one month, so this also
+        collapses results stored again in a later month.
+        """
+        return self._in_batches(f"""
+            DELETE FROM {self.table} WHERE id IN (
+                SELECT id FROM (
+                    SELECT id, row_number() OVER (PARTITION BY run_id, task_id, content_hash ORDER BY id) AS copy
+                    FROM {self.table}
+                ) copies
+                WHERE copy > 1
+                LIMIT %s
+            )
+        """, batch_size)
+
+    def insert(self, rows: List[Dict]) -> int:
+        """Write result rows with a single binary COPY, skipping any already stored; returns the rows added.
+
+        COPY cannot skip conflicts, so rows are copied into a temporary table
+        and moved across with ``ON CONFLICT DO NOTHING`` on the natural key.
+        Rows carrying ``created_at`` (imports) keep it and go to that month's
+        partition; the rest are stamped now.
+        """
+        if not rows:
+            return 0
+        buffer = BytesIO()
+        buffer.write(COPY_HEADER)
+        months = set()
+        for row in rows:
+            content = row["content"].encode() if row["content"] is not None else None
+            created_at = row.get("created_at")
+            period = None
+            if created_at is not None:
+                months.add(period_of(created_at))
+                period = struct.pack("!i", (period_of(created_at) - PG_EPOCH.date()).days)
+                created_at = struct.pack("!q", (created_at - PG_EPOCH) // datetime.timedelta(microseconds=1))
+            fields = (
+                content,
+                to_pgvector_binary(row["embedding"]),
+                row["run_id"].encode(),
+                struct.pack("!q", row["task_id"]),
+                row["task_name"].encode(),
+                row["content_hash"].encode(),
+                period,
+                created_at,
+            )
+            buffer.write(struct.pack("!h", len(fields)))
+            for field in fields:
+                if field is None:
+                    buffer.write(struct.pack("!i", -1))
+                else:
+                    buffer.write(struct.pack("!i", len(field)))
+                    buffer.write(field)
+        buffer.write(COPY_TRAILER)
+        buffer.seek(0)
+        columns = "content, embedding, run_id, task_id, task_name, content_hash"
+        with self.connection() as conn, conn.cursor() as cur:
+            current = period_start()
+            if self._period != current:  # A long run crossed into a month setup made no partition for
+                cur.execute(f"SELECT {self.table}_ensure_partitions(%s, %s)",
+                            (current, period_start(-PARTITIONS_AHEAD)))
+                self._period = current
+            if months and min(months) < current:
+                cur.execute(f"SELECT {self.table}_ensure_partitions(%s, %s)", (min(months), current))
+            cur.execute(f"""
+                CREATE TEMP TABLE IF NOT EXISTS {self.table}_incoming (
+                    content TEXT,
+                    embedding {VECTOR_COLUMN},
+                    run_id TEXT,
+                    task_id BIGINT,
+                    task_name TEXT,
+                    content_hash TEXT,
+                    period DATE,
+                    created_at TIMESTAMP WITH TIME ZONE
+                ) ON COMMIT DELETE ROWS
+            """)
+            cur.copy_expert(f"COPY {self.table}_incoming ({columns}, period, created_at) FROM STDIN WITH (FORMAT binary)",
+                            buffer)
+            cur.execute(f"""
+                INSERT INTO {self.table} ({columns}, period, created_at)
+                SELECT {columns},
+                       COALESCE(period, date_trunc('month', timezone('utc'::text, now()))::date),
+                       COALESCE(created_at, timezone('utc'::text, now()))
+                FROM {self.table}_incoming
+                ON CONFLICT (run_id, task_id, content_hash, period) DO NOTHING
+            """)
+            return cur.rowcount
+
+    def iter_results(self, chunk_size: int = 10000, run_id: str = None) -> Iterator[List[Dict]]:
+        """Stored results, in id order, in chunks of ``chunk_size`` rows with their embeddings.
+
+        Rows are read through a server-side cursor, so only one chunk is held in
+        memory however long the history is. Embeddings come back in pgvector's
+        binary form rather than as text.
+        """
+        where, params = ("WHERE run_id = %s", (run_id,)) if run_id is not None else ("", None)
+        with self.connection() as conn, conn.cursor(name=f"{self.table}_export") as cur:
+            cur.itersize = chunk_size
+            cur.execute(f"""
+                SELECT id, content, run_id, task_id, task_name, created_at, period, {PGVECTOR_TYPE}_send(embedding)
+                FROM {self.table} {where}
+                ORDER BY id
+            """, params)
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if not rows:
+                    return
+                yield [
+                    {"id": row_id, "content": content, "run_id": run, "task_id": task_id, "task_name": task_name,
+                     "created_at": created_at, "period": period, "embedding": from_pgvector_binary(embedding)}
+                    for row_id, content, run, task_id, task_name, created_at, period, embedding in rows
+                ]
+
+    def match(self, query_embedding: List[float], match_count: int = 5, filter: Dict = None,
+              since: datetime.date = None, columns: Tuple[str, ...] = RESULT_COLUMNS) -> List[Dict]:
+        """Closest results by cosine similarity equal to ``filter`` on its columns, most similar first.
+
+        Only ``columns`` are read, so ``content`` is not fetched unless asked
+        for. Each combination of filter and columns is prepared once per pooled
+        connection; with ``since``, partitions for earlier months are pruned
+        when the statement executes and their indexes are never scanned.
+
+        The query vector is bound as compact pgvector text, not binary:
+        psycopg2 has no binary bind parameters, and passing it through a
+        binary COPY like ``insert`` would cost an extra round trip per search.
+        """
+        filter = filter or {}
+        keys = tuple(sorted(filter))
+        with self._statements_lock:
+            name = self._statements.setdefault((keys, columns), f"match_results_{len(self._statements)}")
+        with self.connection() as conn, conn.cursor() as cur:
+            prepared = self._prepared.setdefault(id(conn), set())
+            if name not in prepared:
+                types = ", ".join(FILTER_TYPES[key] for key in keys)
+                conditions = "".join(f" AND {key} = ${i}" for i, key in enumerate(keys, start=4))
+                cur.execute(f"""
+                    PREPARE {name} ({PGVECTOR_TYPE}, int, date{", " + types if types else ""}) AS
+                    SELECT {", ".join(columns) + "," if columns else ""} 1 - (embedding <=> $1) AS similarity
+                    FROM {self.table}
+                    WHERE period >= $3{conditions}
+                    ORDER BY embedding <=> $1
+                    LIMIT $2
+                """)
+                prepared.add(name)
+            params = (to_pgvector_text(query_embedding), match_count, since or "-infinity", *(filter[k] for k in keys))
+            cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+            return [dict(zip((*columns, "similarity"), row)) for row in cur.fetchall()]
+
+    def close(self):
+        """Close every pooled connection."""
+        self._pool.closeall()
+
+    def _in_batches(self, sql: str, batch_size: int) -> int:
+        """Repeat a statement limited to ``batch_size`` rows, one transaction each, until it runs short."""
+        total = 0
+        while True:
+            with self.connection() as conn, conn.cursor() as cur:
+                cur.execute(sql, (batch_size,))
+                total += cur.rowcount
+            if cur.rowcount < batch_size:
+                return total
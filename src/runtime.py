@@ -0,0 +1,69 @@
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+from src.config import MAX_WORKERS, YOUR_FIRST_TASK
+from src.database import setup_supabase_table
+from src.limits import FairGate
+from src.main import run_agent
+
+
+class AgentRuntime:
+    """Hosts several independent agent runs in one process.
+
+    Every run gets its own queue, scheduler, deduplicator, checkpoint and a
+    context filter on its ``run_id``, so runs never see each other's results.
+    They share the Mistral client and its rate limiter, the cache of task
+    embeddings, and ``max_workers`` execution slots handed out in turn between
+    runs by a FairGate.
+    """
+
+    def __init__(self, objectives: List[str], first_task: str = YOUR_FIRST_TASK,
+                 max_workers: int = MAX_WORKERS, max_iterations: int = 10):
+        self.runs = [{"run_id": f"run-{i}", "objective": objective} for i, objective in enumerate(objectives, 1)]
+        self.first_task = first_task
+        self.max_iterations = max_iterations
+        self.gate = FairGate(max_workers)
+        self.vectors = {}  # task name -> unit vector, shared by every run
+
+    def run(self, resume: bool = False) -> List[Dict]:
+        """Run every objective to completion and return their summaries in order."""
+        with ThreadPoolExecutor(max_workers=len(self.runs), thread_name_prefix="run") as executor:
+            futures = [
+                executor.submit(
+                    run_agent,
+                    run["objective"],
+                    self.first_task,
+                    resume,
+                    run["run_id"],
+                    self.max_iterations,
+                    self.gate,
+                    self.vectors,
+                )
+                for run in self.runs
+            ]
+            return [future.result() for future in futures]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run several objectives concurrently in one process")
+    parser.add_argument("objectives", nargs="*", help="Objectives to pursue, one run each")
+    parser.add_argument("--file", help="File with one objective per line")
+    parser.add_argument("--max-iterations", type=int, default=10, help="Iteration limit per run")
+    parser.add_argument("--resume", action="store_true", help="Continue each run from its last checkpoint")
+    args = parser.parse_args()
+
+    objectives = list(args.objectives)
+    if args.file:
+        with open(args.file) as f:
+            objectives += [line.strip() for line in f if line.strip()]
+    if not objectives:
+        parser.error("give at least one objective")
+
+    print("\n🔧 Setting up database...")
+    setup_supabase_table()
+
+    summaries = AgentRuntime(objectives, max_iterations=args.max_iterations).run(resume=args.resume)
+    print(f"\n{'RUN':<8} | {'ITERATIONS':>10} | {'SAVED':>5} | {'LEFT':>4} | OBJECTIVE")
+    for summary in summaries:
+        print(f"{summary['run_id']:<8} | {summary['iterations']:>10} | {summary['iterations_saved']:>5} | "
+              f"{summary['remaining_tasks']:>4} | {summary['objective'][:60]}")
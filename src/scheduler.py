@@ -0,0 +1,140 @@
+import re
+from typing import Dict, Iterable, List, Optional
+from src.task_queue import PriorityTaskQueue, Task
+
+# Matches the "(after 1, 2)" suffix the task creation agent uses to mark dependencies
+AFTER_PATTERN = re.compile(r"\s*\(after\s+#?([\d,\s#and]+)\)\s*\.?\s*$", re.IGNORECASE)
+
+
+def parse_task_dependencies(task_name: str):
+    """Split a generated task line into its description and the sibling line numbers it waits on."""
+    match = AFTER_PATTERN.search(task_name)
+    if not match:
+        return task_name, []
+    positions = [int(n) for n in re.findall(r"\d+", match.group(1))]
+    return task_name[:match.start()].strip(), positions
+
+
+def link_sibling_dependencies(new_tasks: List[Task]):
+    """Turn the sibling line numbers on freshly numbered tasks into task_id dependencies."""
+    for position, task in enumerate(new_tasks, 1):
+        siblings, task.after = task.after, []
+        for sibling in siblings:
+            if 1 <= sibling <= len(new_tasks) and sibling != position:
+                task.dependencies.append(new_tasks[sibling - 1].task_id)
+
+
+class TaskScheduler:
+    """Dependency graph over tasks that releases a task once everything it waits on has finished.
+
+    Dependencies are kept here, keyed by task_id, rather than on the task records,
+    so they survive tasks being edited, rescored or removed from the queue.
+    """
+
+    def __init__(self):
+        self._dependencies = {}  # task_id -> set of task_ids it waits on
+        self._names = {}
+        self._finished = set()
+        self._durations = {}
+
+    def add(self, task: Task, parent_id: int = None):
+        """Register a task with its explicit dependencies and the task whose result produced it."""
+        task_id = task.task_id
+        dependencies = set(task.dependencies)
+        if parent_id is not None:
+            dependencies.add(int(parent_id))
+        dependencies.discard(task_id)
+        self._dependencies[task_id] = dependencies
+        self._names[task_id] = task.task_name
+
+    def mark_finished(self, task_id, seconds: float = None):
+        """Record that a task has finished, releasing anything that waits on it."""
+        task_id = int(task_id)
+        self._finished.add(task_id)
+        if seconds is not None:
+            self._durations[task_id] = seconds
+
+    def is_ready(self, task: Task, pending_ids: Iterable = ()) -> bool:
+        """True when every dependency has finished or is no longer queued or running."""
+        waiting = {int(t) for t in pending_ids}
+        for dependency in self._dependencies.get(task.task_id, ()):
+            if dependency not in self._finished and dependency in waiting:
+                return False
+        return True
+
+    def peek_ready(self, task_list: PriorityTaskQueue, in_flight: Iterable[Task] = ()) -> Optional[Task]:
+        """Return the first queued task that is ready to run without removing it, or None.
+
+        A dependency that was dropped from the queue without finishing no longer
+        blocks its dependents; one spilled to the overflow store still does. If nothing is running and nothing is ready, the
+        queue head is released so a dependency cycle cannot stall the run.
+        """
+        in_flight = list(in_flight)
+        pending_ids = [t.task_id for t in task_list] + [t.task_id for t in in_flight] + task_list.spilled_ids()
+        for task in task_list:
+            if self.is_ready(task, pending_ids):
+                return task
+        if task_list and not in_flight:
+            return task_list.peek()
+        return None
+
+    def pop_ready(self, task_list: PriorityTaskQueue, in_flight: Iterable[Task] = ()) -> Optional[Task]:
+        """Remove and return the first queued task that is ready to run, or None."""
+        task = self.peek_ready(task_list, in_flight)
+        if task is not None:
+            task_list.remove(task)
+        return task
+
+    def finished_tasks(self) -> List[Task]:
+        """Tasks recorded as finished, in ID order."""
+        return [Task(task_id, self._names.get(task_id, "")) for task_id in sorted(self._finished)]
+
+    def state(self) -> Dict:
+        """JSON-friendly copy of the graph, finished tasks and durations, for checkpoints."""
+        return {
+            "dependencies": {str(t): sorted(deps) for t, deps in self._dependencies.items()},
+            "names": {str(t): name for t, name in self._names.items()},
+            "finished": sorted(self._finished),
+            "durations": {str(t): seconds for t, seconds in self._durations.items()},
+        }
+
+    def restore(self, state: Dict):
+        """Replace the scheduler's contents with a copy produced by ``state``."""
+        self._dependencies = {int(t): set(deps) for t, deps in state["dependencies"].items()}
+        self._names = {int(t): name for t, name in state["names"].items()}
+        self._finished = set(state["finished"])
+        self._durations = {int(t): seconds for t, seconds in state["durations"].items()}
+
+    def critical_path(self) -> Dict:
+        """Longest dependency chain in the run, weighted by measured execution time.
+
+        Tasks that have not run yet are weighted with the average duration so far.
+        """
+        average = sum(self._durations.values()) / len(self._durations) if self._durations else 1.0
+        best = {}
+
+        def visit(task_id, stack):
+            if task_id in best:
+                return best[task_id]
+            stack.add(task_id)
+            longest = (0.0, [])
+            for dependency in self._dependencies.get(task_id, ()):
+                if dependency in stack or dependency not in self._dependencies:
+                    continue
+                candidate = visit(dependency, stack)
+                if candidate[0] > longest[0]:
+                    longest = candidate
+            stack.discard(task_id)
+            best[task_id] = (longest[0] + self._durations.get(task_id, average), longest[1] + [task_id])
+            return best[task_id]
+
+        path = (0.0, [])
+        for task_id in self._dependencies:
+            candidate = visit(task_id, set())
+            if candidate[0] > path[0]:
+                path = candidate
+
+        return {
+            "seconds": round(path[0], 2),
+            "tasks": [{"task_id": t, "task_name": self._names.get(t, "")} for t in path[1]],
+        }
@@ -0,0 +1,118 @@
+import argparse
+from typing import Callable, Dict, List, Sequence
+import numpy as np
+from src.agents import get_mistral_embeddings, prioritization_agent
+from src.config import LOCAL_SCORER_WEIGHTS
+from src.dedup import normalize_rows
+from src.task_queue import PriorityTaskQueue, Task
+
+
+class LocalPriorityScorer:
+    """Ranks the task queue with vector math over task embeddings instead of an LLM call.
+
+    Each task is scored as a weighted sum of three signals:
+    - relevance: cosine similarity between the task and the objective
+    - novelty: one minus its highest similarity to any completed result
+    - age: how early it was created relative to the rest of the queue
+    """
+
+    def __init__(self, weights: Sequence[float] = LOCAL_SCORER_WEIGHTS, vectors: Dict = None,
+                 embed: Callable[[List[str]], List[List[float]]] = get_mistral_embeddings):
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.vectors = vectors if vectors is not None else {}  # text -> unit vector, shareable with TaskDeduplicator
+        self.embed = embed
+        self._results = []
+
+    def add_result(self, embedding: List[float]):
+        """Remember a completed result embedding for the novelty signal."""
+        self._results.append(normalize_rows(embedding)[0])
+
+    def score(self, tasks: List[Task], objective: str) -> np.ndarray:
+        """Score tasks in one vectorized pass; higher scores run first."""
+        if not tasks:
+            return np.zeros(0, dtype=np.float32)
+        self._embed_missing([objective] + [t.task_name for t in tasks])
+        task_vectors = np.stack([self.vectors[t.task_name] for t in tasks])
+
+        relevance = task_vectors @ self.vectors[objective]
+        if self._results:
+            novelty = 1.0 - (task_vectors @ np.stack(self._results).T).max(axis=1)
+        else:
+            novelty = np.ones(len(tasks), dtype=np.float32)
+        ids = np.array([t.task_id for t in tasks], dtype=np.float32)
+        span = ids.max() - ids.min()
+        age = (ids.max() - ids) / span if span else np.zeros(len(tasks), dtype=np.float32)
+
+        return np.stack([relevance, novelty, age], axis=1) @ self.weights
+
+    def rank(self, task_list: PriorityTaskQueue, objective: str):
+        """Rescore every queued task in place."""
+        tasks = list(task_list)
+        for task, score in zip(tasks, self.score(tasks, objective)):
+            task_list.update_priority(task.task_id, float(score))
+
+    def _embed_missing(self, texts: List[str]):
+        missing = list(dict.fromkeys(text for text in texts if text not in self.vectors))
+        if missing:
+            for text, vector in zip(missing, normalize_rows(self.embed(missing))):
+                self.vectors[text] = vector
+
+
+def rank_agreement(first: List, second: List) -> Dict:
+    """Compare two orderings of the same items with Kendall's tau, Spearman's rho and top-1 agreement."""
+    second_set = set(second)
+    common = [item for item in first if item in second_set]
+    common_set = set(common)
+    second_common = [item for item in second if item in common_set]
+    n = len(common)
+    if n < 2:
+        return {"tasks": n, "kendall_tau": 1.0, "spearman_rho": 1.0, "top1_match": bool(common)}
+    position = {item: i for i, item in enumerate(second_common)}
+    a = np.arange(n)
+    b = np.array([position[item] for item in common])
+
+    concordance = np.sign(a[:, None] - a[None, :]) * np.sign(b[:, None] - b[None, :])
+    kendall_tau = concordance[np.triu_indices(n, 1)].mean()
+    spearman_rho = 1 - 6 * ((a - b) ** 2).sum() / (n * (n ** 2 - 1))
+
+    return {
+        "tasks": n,
+        "kendall_tau": round(float(kendall_tau), 3),
+        "spearman_rho": round(float(spearman_rho), 3),
+        "top1_match": common[0] == second_common[0],
+    }
+
+
+def compare_prioritizers(objective: str, task_names: List[str], scorer: LocalPriorityScorer = None) -> Dict:
+    """Rank the same tasks with prioritization_agent and the local scorer and report their agreement."""
+    scorer = scorer or LocalPriorityScorer()
+    llm_queue = PriorityTaskQueue(Task(i, name) for i, name in enumerate(task_names, 1))
+    local_queue = PriorityTaskQueue(Task(i, name) for i, name in enumerate(task_names, 1))
+
+    prioritization_agent(0, llm_queue, objective)
+    scorer.rank(local_queue, objective)
+
+    llm_order = [t.task_name for t in llm_queue]
+    local_order = [t.task_name for t in local_queue]
+    return {"llm_order": llm_order, "local_order": local_order, **rank_agreement(llm_order, local_order)}
+
+
+if __name__ == "__main__":
+    from src.config import OBJECTIVE
+
+    parser = argparse.ArgumentParser(description="Compare LLM and local task prioritization")
+    parser.add_argument("tasks_file", help="File with one task description per line")
+    parser.add_argument("--objective", default=OBJECTIVE)
+    args = parser.parse_args()
+
+    with open(args.tasks_file) as f:
+        names = [line.strip() for line in f if line.strip()]
+
+    report = compare_prioritizers(args.objective, names)
+    print(f"🎯 Objective: {args.objective}")
+    print(f"\n{'LLM':<50} | LOCAL")
+    for llm_task, local_task in zip(report["llm_order"], report["local_order"]):
+        print(f"{llm_task[:50]:<50} | {local_task[:50]}")
+    print(f"\n📊 Kendall tau: {report['kendall_tau']}")
+    print(f"📊 Spearman rho: {report['spearman_rho']}")
+    print(f"🥇 Same first task: {'yes' if report['top1_match'] else 'no'}")
@@ -0,0 +1,336 @@
+import bisect
+import datetime
+import json
+import sqlite3
+import threading
+from typing import Dict, Iterator, List, Tuple
+import numpy as np
+from src.config import SQLITE_PATH, YOUR_TABLE_NAME
+from src.database import RESULT_COLUMNS, SCHEMA_VERSION, content_hash, period_of, period_start
+from src.dedup import normalize_rows
+from src.vectors import EMBEDDING_DIMENSIONS, check_precision, from_bytes, to_bytes
+
+
+KEY_COLUMNS = ("run_id", "task_id", "task_name")  # Columns kept in memory for filtering
+
+
+def matches_filter(keys: Dict, filter: Dict) -> bool:
+    """Whether a row's key columns equal every value in ``filter``."""
+    return all(key in keys and keys[key] == value for key, value in filter.items())
+
+
+class SqliteStore:
+    """Task result storage in a local SQLite file, for single-node runs without Supabase.
+
+    The database runs in WAL mode so the result writer can insert while workers
+    search. Embeddings are stored as float32 or float16 BLOBs, following
+    VECTOR_PRECISION, and searched with an in-memory NumPy index of unit
+    vectors, loaded from the file on first use and extended on every insert. Rows matching a filter are looked up once
+    per filter and kept up to date as rows are added.
+
+    SQLite has no partitions; each row records the month it was stored in
+    (``period``) instead. The index is kept in month order, so the rows from
+    a given month on are a suffix of it, found by binary search.
+    """
+
+    def __init__(self, path: str = SQLITE_PATH, table: str = YOUR_TABLE_NAME):
+        self.path = path
+        self.table = table
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._loaded = False  # The index below is read from the file on first search
+        self._ids = []
+        self._keys = []  # Each row's KEY_COLUMNS, in index order
+        self._periods = []  # Each row's month, as YYYY-MM-01, in index order
+        self._vectors = None  # Unit vectors, with spare rows so inserts do not copy the whole index
+        self._filters = {}  # Filter as JSON -> positions in the index of the rows it matches
+
+    def setup(self, batch_size: int = 1000) -> bool:
+        """Bring the results table up to SCHEMA_VERSION; returns False when it already was.
+
+        The version is kept in SQLite's ``user_version`` and read with one
+        PRAGMA, and only the missing versions are applied. BLOBs record their
+        own precision in their size; raises ValueError when stored ones do not
+        match VECTOR_PRECISION.
+        """
+        with self._lock:
+            version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+            stored = self._stored_precision()
+        if stored:
+            check_precision(stored, self.table)
+        if version >= SCHEMA_VERSION:
+            return False
+        if version < 1:
+            self._create_schema(batch_size)
+        if version < 2:
+            self._normalize_schema()
+        with self._lock, self._conn:
+            self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            self._loaded = False
+        return True
+
+    def _stored_precision(self) -> str:
+        """Precision of the stored embeddings, from the size of one, or None while there are none."""
+        try:
+            row = self._conn.execute(f"SELECT length(embedding) FROM {self.table} LIMIT 1").fetchone()
+        except sqlite3.OperationalError:
+            return None  # No table yet
+        if row is None:
+            return None
+        return "float16" if row[0] == 2 * EMBEDDING_DIMENSIONS else "float32"
+
+    def _create_schema(self, batch_size: int):
+        """Version 1: the table and its natural-key index.
+
+        Tables from before results had a natural key get its columns, filled in
+        from the metadata, and lose their duplicate rows before the index is
+        built; rows from before ``period`` existed take the month they were created in.
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, content TEXT, metadata TEXT NOT NULL, "
+                "embedding BLOB NOT NULL, run_id TEXT NOT NULL DEFAULT '', task_id TEXT NOT NULL DEFAULT '', "
+                "content_hash TEXT, period TEXT NOT NULL DEFAULT '', "
+                "created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+            )
+            columns = {row[1] for row in self._conn.execute(f"PRAGMA table_info({self.table})")}
+            for column, definition in (("run_id", "TEXT NOT NULL DEFAULT ''"), ("task_id", "TEXT NOT NULL DEFAULT ''"),
+                                       ("content_hash", "TEXT"), ("period", "TEXT NOT NULL DEFAULT ''")):
+                if column not in columns:
+                    self._conn.execute(f"ALTER TABLE {self.table} ADD COLUMN {column} {definition}")
+            self._conn.execute(f"UPDATE {self.table} SET period = substr(created_at, 1, 7) || '-01' WHERE period = ''")
+        while True:
+            with self._lock, self._conn:
+                rows = self._conn.execute(
+                    f"SELECT id, content, metadata FROM {self.table} WHERE content_hash IS NULL LIMIT ?", (batch_size,)
+                ).fetchall()
+                self._conn.executemany(
+                    f"UPDATE {self.table} SET run_id = ?, task_id = ?, content_hash = ? WHERE id = ?",
+                    [(str(m.get("run_id") or ""), str(m.get("task_id") or ""), content_hash(content), row_id)
+                     for row_id, content, m in ((r[0], r[1], json.loads(r[2])) for r in rows)],
+                )
+            if len(rows) < batch_size:
+                break
+        self.deduplicate(batch_size)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"CREATE UNIQUE INDEX IF NOT EXISTS {self.table}_natural_key ON {self.table} (run_id, task_id, content_hash)"
+            )
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_period ON {self.table} (period)")
+
+    def _normalize_schema(self):
+        """Version 2: result text only in ``content``, the task name and an integer task id as columns.
+
+        SQLite cannot change a column's type, so the table is rebuilt without
+        ``metadata``, which repeated the result text.
+        """
+        normalized = f"{self.table}_normalized"
+        with self._lock, self._conn:
+            self._conn.execute(f"DROP TABLE IF EXISTS {normalized}")
+            self._conn.execute(
+                f"CREATE TABLE {normalized} ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, content TEXT, embedding BLOB NOT NULL, "
+                "run_id TEXT NOT NULL DEFAULT '', task_id INTEGER NOT NULL DEFAULT 0, task_name TEXT NOT NULL DEFAULT '', "
+                "content_hash TEXT, period TEXT NOT NULL DEFAULT '', created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+            )
+            self._conn.execute(
+                f"INSERT INTO {normalized} "
+                "(id, content, embedding, run_id, task_id, task_name, content_hash, period, created_at) "
+                "SELECT id, content, embedding, run_id, CAST(task_id AS INTEGER), "
+                "COALESCE(json_extract(metadata, '$.task'), ''), content_hash, period, created_at "
+                f"FROM {self.table} ORDER BY id"
+            )
+            self._conn.execute(f"DROP TABLE {self.table}")
+            self._conn.execute(f"ALTER TABLE {normalized} RENAME TO {self.table}")
+            self._conn.execute(
+                f"CREATE UNIQUE INDEX {self.table}_natural_key ON {self.table} (run_id, task_id, content_hash)"
+            )
+            self._conn.execute(f"CREATE INDEX {self.table}_period ON {self.table} (period)")
+            self._conn.execute(f"CREATE INDEX {self.table}_task_name ON {self.table} (task_name)")
+
+    def drop(self):
+        """Delete the results table, reset its schema version and forget the index."""
+        with self._lock, self._conn:
+            self._conn.execute(f"DROP TABLE IF EXISTS {self.table}")
+            self._conn.execute("PRAGMA user_version = 0")
+            self._loaded = False
+
+    def insert(self, rows: List[Dict]) -> int:
+        """Write result rows in one transaction, skipping any already stored; returns the rows added.
+
+        Rows carrying ``created_at`` (imports) keep it and its month; as they
+        are older than the index's newest rows, the index is reloaded in month
+        order on the next search rather than extended.
+        """
+        if not rows:
+            return 0
+        vectors = np.stack([np.asarray(row["embedding"], dtype=np.float32) for row in rows])
+        current = period_start().isoformat()
+        historical = any("created_at" in row for row in rows)
+        with self._lock:
+            with self._conn:
+                ids, added = [], []
+                for i, (row, vector) in enumerate(zip(rows, vectors)):
+                    created_at = row.get("created_at")
+                    cursor = self._conn.execute(
+                        f"INSERT OR IGNORE INTO {self.table} "
+                        "(content, embedding, run_id, task_id, task_name, content_hash, period, created_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))",
+                        (row["content"], to_bytes(vector), row["run_id"], row["task_id"], row["task_name"],
+                         row["content_hash"], period_of(created_at).isoformat() if created_at else current,
+                         created_at.astimezone(datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+                         if created_at else None),
+                    )
+                    if cursor.rowcount:
+                        ids.append(cursor.lastrowid)
+                        added.append(i)
+            if historical and added:
+                self._loaded = False
+            elif self._loaded and added:
+                keys = [{column: rows[i][column] for column in KEY_COLUMNS} for i in added]
+                self._extend(ids, keys, [current] * len(added), vectors[added])
+        return len(ids)
+
+    def iter_results(self, chunk_size: int = 10000, run_id: str = None) -> Iterator[List[Dict]]:
+        """Stored results, in id order, in chunks of ``chunk_size`` rows with their embeddings.
+
+        The rows are streamed from a cursor on a connection of their own, which
+        reads one WAL snapshot and never holds up the result writer.
+        """
+        where, params = ("WHERE run_id = ?", (run_id,)) if run_id is not None else ("", ())
+        conn = sqlite3.connect(self.path)
+        try:
+            cursor = conn.execute(
+                f"SELECT id, content, run_id, task_id, task_name, created_at, period, embedding "
+                f"FROM {self.table} {where} ORDER BY id", params
+            )
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    return
+                yield [
+                    {"id": row_id, "content": content, "run_id": run, "task_id": task_id, "task_name": task_name,
+                     "created_at": datetime.datetime.fromisoformat(created_at).replace(tzinfo=datetime.timezone.utc),
+                     "period": datetime.date.fromisoformat(period), "embedding": from_bytes(embedding)}
+                    for row_id, content, run, task_id, task_name, created_at, period, embedding in rows
+                ]
+        finally:
+            conn.close()
+
+    def drop_periods_before(self, cutoff: datetime.date, batch_size: int = 1000) -> int:
+        """Delete results stored before ``cutoff``'s month, a batch per transaction; returns the rows deleted."""
+        removed = 0
+        while True:
+            with self._lock, self._conn:
+                count = self._conn.execute(
+                    f"DELETE FROM {self.table} WHERE id IN (SELECT id FROM {self.table} WHERE period < ? LIMIT ?)",
+                    (cutoff.isoformat(), batch_size),
+                ).rowcount
+                if count:
+                    self._loaded = False
+            removed += count
+            if count < batch_size:
+                return removed
+
+    def deduplicate(self, batch_size: int = 1000) -> int:
+        """Delete all but the first copy of each (run_id, task_id, content_hash), a batch per transaction."""
+        removed = 0
+        while True:
+            with self._lock, self._conn:
+                count = self._conn.execute(
+                    f"DELETE FROM {self.table} WHERE id IN ("
+                    f"SELECT id FROM {self.table} WHERE id NOT IN ("
+                    f"SELECT MIN(id) FROM {self.table} GROUP BY run_id, task_id, content_hash) LIMIT ?)",
+                    (batch_size,),
+                ).rowcount
+                if count:
+                    self._loaded = False
+            removed += count
+            if count < batch_size:
+                return removed
+
+    def match(self, query_embedding: List[float], match_count: int = 5, filter: Dict = None,
+              since: datetime.date = None, columns: Tuple[str, ...] = RESULT_COLUMNS) -> List[Dict]:
+        """Closest results by cosine similarity equal to ``filter`` on its columns, most similar first.
+
+        Key columns come from the in-memory index; the file is only read when
+        ``columns`` asks for ``content`` or ``created_at``. With ``since``, only
+        results stored from that month on are compared.
+        """
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            ids, keys = self._ids, self._keys
+            positions = self._matching(filter or {})
+            if since is not None:
+                first = bisect.bisect_left(self._periods, since.isoformat())
+                positions = positions[np.searchsorted(positions, first):]
+            if not len(positions):
+                return []
+            similarity = self._vectors[positions] @ normalize_rows(query_embedding)[0]
+            count = min(match_count, len(positions))
+            best = np.argpartition(-similarity, count - 1)[:count]
+            best = best[np.argsort(-similarity[best])]
+            chosen = [(int(positions[i]), float(similarity[i])) for i in best]
+            stored = [column for column in columns if column not in KEY_COLUMNS and column != "id"]
+            fetched = {}
+            if stored:
+                fetched = {row[0]: dict(zip(stored, row[1:])) for row in self._conn.execute(
+                    f"SELECT id, {', '.join(stored)} FROM {self.table} WHERE id IN ({','.join('?' * len(chosen))})",
+                    [ids[p] for p, _ in chosen],
+                )}
+        matches = []
+        for p, score in chosen:
+            values = {"id": ids[p], **keys[p], **fetched.get(ids[p], {})}
+            matches.append({**{column: values.get(column) for column in columns}, "similarity": score})
+        return matches
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _load(self):
+        rows = self._conn.execute(
+            f"SELECT id, {', '.join(KEY_COLUMNS)}, period, embedding FROM {self.table} ORDER BY period, id"
+        ).fetchall()
+        self._ids, self._keys, self._periods, self._vectors = [], [], [], None
+        self._filters.clear()
+        self._loaded = True
+        if rows:
+            self._extend(
+                [row[0] for row in rows],
+                [dict(zip(KEY_COLUMNS, row[1:4])) for row in rows],
+                [row[4] for row in rows],
+                np.stack([from_bytes(row[5]) for row in rows]),
+            )
+
+    def _extend(self, ids: List[int], keys: List[Dict], periods: List[str], vectors: np.ndarray):
+        start, needed = len(self._ids), len(self._ids) + len(ids)
+        if self._vectors is None:
+            self._vectors = np.empty((max(64, needed), vectors.shape[1]), dtype=np.float32)
+        elif needed > len(self._vectors):
+            grown = np.empty((max(needed, 2 * len(self._vectors)), self._vectors.shape[1]), dtype=np.float32)
+            grown[:start] = self._vectors[:start]
+            self._vectors = grown
+        self._vectors[start:needed] = normalize_rows(vectors)
+        self._ids.extend(ids)
+        self._keys.extend(keys)
+        self._periods.extend(periods)
+        for key, positions in self._filters.items():
+            filter = json.loads(key)
+            added = [start + i for i, row in enumerate(keys) if matches_filter(row, filter)]
+            if added:
+                self._filters[key] = np.concatenate([positions, np.asarray(added, dtype=np.int64)])
+
+    def _matching(self, filter: Dict) -> np.ndarray:
+        if not filter:
+            return np.arange(len(self._ids))
+        key = json.dumps(filter, sort_keys=True)
+        if key not in self._filters:
+            self._filters[key] = np.asarray(
+                [i for i, row in enumerate(self._keys) if matches_filter(row, filter)], dtype=np.int64
+            )
+        return self._filters[key]
@@ -0,0 +1,347 @@
+import heapq
+import itertools
+import json
+import sqlite3
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional
+
+REMOVED = object()  # Placeholder for heap entries that were superseded or removed
+
+
+class Task:
+    """A single unit of work, stored with fixed slots instead of a per-task dict.
+
+    ``after`` holds the sibling line numbers the task creation agent asked for and
+    is only used until the task is numbered; ``merged`` lists duplicate task names
+    folded into this one.
+    """
+
+    __slots__ = ("task_id", "task_name", "priority", "dependencies", "after", "merged")
+
+    def __init__(self, task_id: Optional[int], task_name: str, priority: float = None,
+                 dependencies: List[int] = None, after: List[int] = None):
+        self.task_id = int(task_id) if task_id is not None else None
+        self.task_name = task_name
+        self.priority = priority
+        self.dependencies = list(dependencies or [])
+        self.after = list(after or [])
+        self.merged = []
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Task":
+        task = cls(data.get("task_id"), data["task_name"], data.get("priority"), data.get("dependencies"))
+        task.merged = list(data.get("merged", []))
+        return task
+
+    def to_dict(self) -> Dict:
+        """JSON-friendly view used by the dashboards."""
+        data = {"task_id": self.task_id, "task_name": self.task_name, "priority": self.priority}
+        if self.dependencies:
+            data["dependencies"] = list(self.dependencies)
+        if self.merged:
+            data["merged"] = list(self.merged)
+        return data
+
+    def __repr__(self) -> str:
+        return f"Task({self.task_id!r}, {self.task_name!r}, priority={self.priority!r})"
+
+
+class TaskOverflowStore:
+    """SQLite table holding tasks spilled out of a full queue, ordered by priority.
+
+    Rows are tagged with ``run_id``, and a store only sees and clears its own
+    run's rows, so runs that share a file leave each other's spills alone.
+    """
+
+    def __init__(self, path: str, run_id: str = ""):
+        self.path = path
+        self.run_id = run_id or ""
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(spilled_tasks)")]
+        if columns and "run_id" not in columns:  # Written before spills were tagged with their run
+            self._conn.execute("DROP TABLE spilled_tasks")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS spilled_tasks ("
+            "run_id TEXT NOT NULL, task_id INTEGER NOT NULL, task_name TEXT NOT NULL, priority REAL NOT NULL, "
+            "dependencies TEXT NOT NULL, merged TEXT NOT NULL, PRIMARY KEY (run_id, task_id))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS spilled_tasks_priority ON spilled_tasks (run_id, priority DESC)")
+        self._conn.commit()
+
+    def spill(self, task: Task):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO spilled_tasks VALUES (?, ?, ?, ?, ?, ?)",
+                (self.run_id, task.task_id, task.task_name, task.priority,
+                 json.dumps(task.dependencies), json.dumps(task.merged)),
+            )
+
+    def pop(self, task_id: int) -> Optional[Task]:
+        """Remove and return the spilled task with this task_id, or None if it is not spilled."""
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT task_id, task_name, priority, dependencies, merged FROM spilled_tasks "
+                "WHERE run_id = ? AND task_id = ?", (self.run_id, int(task_id))
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("DELETE FROM spilled_tasks WHERE run_id = ? AND task_id = ?", (self.run_id, row[0]))
+        return self._to_task(row)
+
+    def take(self, n: int) -> List[Task]:
+        """Remove and return the ``n`` highest-priority spilled tasks."""
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                "SELECT task_id, task_name, priority, dependencies, merged FROM spilled_tasks WHERE run_id = ? "
+                "ORDER BY priority DESC, task_id LIMIT ?", (self.run_id, n)
+            ).fetchall()
+            self._conn.executemany("DELETE FROM spilled_tasks WHERE run_id = ? AND task_id = ?",
+                                   [(self.run_id, row[0]) for row in rows])
+        return [self._to_task(row) for row in rows]
+
+    def tasks(self) -> List[Task]:
+        """Every spilled task, best first, without removing them."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT task_id, task_name, priority, dependencies, merged FROM spilled_tasks WHERE run_id = ? "
+                "ORDER BY priority DESC, task_id", (self.run_id,)
+            ).fetchall()
+        return [self._to_task(row) for row in rows]
+
+    def discard(self, task_id: int) -> bool:
+        with self._lock, self._conn:
+            return self._conn.execute("DELETE FROM spilled_tasks WHERE run_id = ? AND task_id = ?",
+                                      (self.run_id, int(task_id))).rowcount > 0
+
+    def task_ids(self) -> List[int]:
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT task_id FROM spilled_tasks WHERE run_id = ?",
+                                                         (self.run_id,))]
+
+    def clear(self):
+        """Delete this run's spilled tasks."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM spilled_tasks WHERE run_id = ?", (self.run_id,))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM spilled_tasks WHERE run_id = ?",
+                                      (self.run_id,)).fetchone()[0]
+
+    @staticmethod
+    def _to_task(row) -> Task:
+        task_id, task_name, priority, dependencies, merged = row
+        return Task.from_dict({"task_id": task_id, "task_name": task_name, "priority": priority,
+                               "dependencies": json.loads(dependencies), "merged": json.loads(merged)})
+
+
+class PriorityTaskQueue:
+    """Indexed store of queued tasks ordered by a numeric priority score.
+
+    Higher scores run first and equal scores run in insertion order. Tasks are
+    indexed by integer task_id, so lookup, editing (``rename``) and removal
+    (``discard``) are O(1); push, pop and ``update_priority`` (decrease/increase-key)
+    are O(log n) on the backing binary heap. Superseded heap entries are marked
+    as removed and skipped when they reach the top.
+
+    With a ``capacity``, at most that many tasks are held in memory. Pushing past
+    it spills the lowest-priority task other than the one pushed to a
+    ``TaskOverflowStore`` at ``overflow_path``, or evicts it when no path is
+    given; a second heap, ordered worst first, finds it in O(log n). Spilled
+    tasks are brought back, best first, once removals drain the queue below
+    half capacity, or as soon as ``update_priority`` rescores one.
+    They are kept under ``run_id``; spills an earlier run with the same id
+    left behind are cleared, other runs' are not.
+    Iteration, ``len`` and ID lookups only see the tasks held in memory.
+
+    The deque methods used throughout the agent (``append``, ``appendleft``,
+    ``popleft``, ``remove``, ``clear``, iteration and ``len``) behave as before,
+    so the queue is a drop-in replacement for ``collections.deque``.
+    """
+
+    def __init__(self, tasks: Iterable[Task] = (), capacity: int = None, overflow_path: str = None,
+                 run_id: str = None):
+        self._heap = []
+        self._tail = []  # (score, -order, entry) for every entry pushed, lowest priority first
+        self._entries = {}  # task_id -> heap entry
+        self._counter = itertools.count()
+        self._high = 0.0
+        self._low = 0.0
+        self.capacity = capacity or None
+        self._overflow = TaskOverflowStore(overflow_path, run_id) if capacity and overflow_path else None
+        if self._overflow is not None:
+            self._overflow.clear()  # Spills from an earlier run with this id; a resume restores them from its checkpoint
+        self.stats = {"spilled": 0, "restored": 0, "evicted": 0}
+        for task in tasks:
+            self.append(task)
+
+    def push(self, task: Task, score: float = None):
+        """Add a task with the given score, or with the score stored on the task."""
+        if score is None:
+            score = task.priority
+        if score is None:
+            score = self._low - 1
+        key = task.task_id
+        if key in self._entries:
+            self._entries.pop(key)[-1] = REMOVED
+        task.priority = score
+        self._high = max(self._high, score)
+        self._low = min(self._low, score)
+        entry = [-score, next(self._counter), key, task]
+        self._entries[key] = entry
+        heapq.heappush(self._heap, entry)
+        if self.capacity:
+            heapq.heappush(self._tail, (score, -entry[1], entry))
+        if len(self._heap) > 2 * len(self._entries) + 32 or len(self._tail) > 2 * len(self._entries) + 32:
+            # Drop superseded entries once they outnumber live ones
+            self._heap = list(self._entries.values())
+            heapq.heapify(self._heap)
+            if self.capacity:
+                self._tail = [(-entry[0], -entry[1], entry) for entry in self._heap]
+                heapq.heapify(self._tail)
+        if self.capacity and len(self._entries) > self.capacity:
+            self._shed(self._worst(key))
+
+    def append(self, task: Task):
+        """Add a task behind everything currently queued."""
+        self.push(task, self._low - 1)
+
+    def appendleft(self, task: Task):
+        """Add a task ahead of everything currently queued."""
+        self.push(task, self._high + 1)
+
+    def update_priority(self, task_id: int, score: float) -> bool:
+        """Change the score of a queued task, bringing it back first if it was spilled.
+
+        Returns False if the task is neither queued nor spilled.
+        """
+        entry = self._entries.get(int(task_id))
+        if entry is not None:
+            task = entry[-1]
+        else:
+            task = self._overflow.pop(task_id) if self._overflow is not None else None
+            if task is None:
+                return False
+            self.stats["restored"] += 1
+        self.push(task, score)
+        return True
+
+    def popleft(self) -> Task:
+        """Remove and return the highest-priority task."""
+        while self._heap:
+            *_, key, task = heapq.heappop(self._heap)
+            if task is not REMOVED:
+                del self._entries[key]
+                self._refill()
+                return task
+        raise IndexError("pop from an empty task queue")
+
+    def peek(self) -> Optional[Task]:
+        """Return the highest-priority task without removing it."""
+        while self._heap and self._heap[0][-1] is REMOVED:
+            heapq.heappop(self._heap)
+        return self._heap[0][-1] if self._heap else None
+
+    def remove(self, task: Task):
+        """Remove a queued task by its task_id."""
+        if self.discard(task.task_id) is None:
+            raise ValueError("task is not in the queue")
+
+    def discard(self, task_id: int) -> Optional[Task]:
+        """Remove the queued task with this task_id and return it, or None if it is not queued."""
+        entry = self._entries.pop(int(task_id), None)
+        if entry is None:
+            if self._overflow is not None:
+                self._overflow.discard(task_id)
+            return None
+        task, entry[-1] = entry[-1], REMOVED
+        self._refill()
+        return task
+
+    def get(self, task_id: int) -> Optional[Task]:
+        """Return the queued task with this task_id, if any."""
+        entry = self._entries.get(int(task_id))
+        return entry[-1] if entry else None
+
+    def rename(self, task_id: int, task_name: str) -> Optional[Task]:
+        """Change the description of a queued task in place and return it, or None if it is not queued."""
+        task = self.get(task_id)
+        if task is not None:
+            task.task_name = task_name
+        return task
+
+    def snapshot(self) -> List[Task]:
+        """Every task the queue holds, in memory first and then spilled, best first within each."""
+        return self.ordered() + (self._overflow.tasks() if self._overflow is not None else [])
+
+    def spilled_ids(self) -> List[int]:
+        """IDs of tasks currently held in the overflow store."""
+        return self._overflow.task_ids() if self._overflow is not None else []
+
+    def pressure(self) -> Dict:
+        """Queue fill level and spill counters, for display."""
+        active = len(self._entries)
+        return {
+            "capacity": self.capacity,
+            "active": active,
+            "spilled_now": len(self._overflow) if self._overflow is not None else 0,
+            "fill": round(active / self.capacity, 2) if self.capacity else None,
+            **self.stats,
+        }
+
+    def clear(self):
+        self._heap.clear()
+        self._tail.clear()
+        self._entries.clear()
+        if self._overflow is not None:
+            self._overflow.clear()
+
+    def ordered(self) -> List[Task]:
+        """Queued tasks from highest to lowest priority."""
+        return [entry[-1] for entry in sorted(self._entries.values())]
+
+    def __iter__(self) -> Iterator[Task]:
+        return iter(self.ordered())
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __bool__(self) -> bool:
+        return bool(self._entries)
+
+    def __contains__(self, task: Task) -> bool:
+        return task.task_id in self._entries
+
+    def _worst(self, keep: int) -> Task:
+        """The lowest-priority queued task other than ``keep``, dropping stale entries off the tail heap."""
+        kept = None
+        while self._tail:
+            entry = self._tail[0][-1]
+            if self._entries.get(entry[2]) is not entry:
+                heapq.heappop(self._tail)
+            elif entry[2] == keep:
+                kept = heapq.heappop(self._tail)
+            else:
+                break
+        worst = self._tail[0][-1][-1]
+        if kept is not None:
+            heapq.heappush(self._tail, kept)
+        return worst
+
+    def _shed(self, task: Task):
+        """Move a task out of memory: spill it to disk, or drop it without an overflow store."""
+        self._entries.pop(task.task_id)[-1] = REMOVED
+        if self._overflow is not None:
+            self._overflow.spill(task)
+            self.stats["spilled"] += 1
+        else:
+            self.stats["evicted"] += 1
+
+    def _refill(self):
+        """Bring spilled tasks back once the queue has drained below half capacity."""
+        if self._overflow is None or len(self._entries) >= max(1, self.capacity // 2):
+            return
+        for task in self._overflow.take(self.capacity // 2 - len(self._entries) + 1):
+            self.push(task)
+            self.stats["restored"] += 1
@@ -0,0 +1,102 @@
+import json
+import struct
+import time
+from typing import Dict
+import numpy as np
+from src.config import VECTOR_PRECISION
+
+EMBEDDING_DIMENSIONS = 1024
+STORAGE_DTYPE = np.float16 if VECTOR_PRECISION == "float16" else np.float32
+PGVECTOR_TYPE = "halfvec" if VECTOR_PRECISION == "float16" else "vector"
+
+
+def as_vector(embedding) -> np.ndarray:
+    """An embedding as a float32 array, whatever it arrived as."""
+    if isinstance(embedding, (bytes, bytearray, memoryview)):
+        return from_bytes(embedding)
+    return np.asarray(embedding, dtype=np.float32)
+
+
+def to_bytes(embedding, dtype=STORAGE_DTYPE) -> bytes:
+    """Packed little-endian bytes of an embedding, 4 bytes per value as float32 or 2 as float16."""
+    return np.asarray(embedding, dtype=np.dtype(dtype).newbyteorder("<")).tobytes()
+
+
+def from_bytes(data: bytes, dtype=STORAGE_DTYPE) -> np.ndarray:
+    """Inverse of ``to_bytes``, widened back to float32."""
+    return np.frombuffer(data, dtype=np.dtype(dtype).newbyteorder("<")).astype(np.float32)
+
+
+def to_pgvector_binary(embedding, dtype=STORAGE_DTYPE) -> bytes:
+    """pgvector's binary wire format: dimensions, an unused word, then big-endian values.
+
+    float32 values are read by the ``vector`` type and float16 by ``halfvec``.
+    """
+    values = np.asarray(embedding, dtype=np.dtype(dtype).newbyteorder(">"))
+    return struct.pack("!hh", len(values), 0) + values.tobytes()
+
+
+def from_pgvector_binary(data: bytes, dtype=STORAGE_DTYPE) -> np.ndarray:
+    """Inverse of ``to_pgvector_binary``, e.g. for the output of ``vector_send``, widened back to float32."""
+    return np.frombuffer(data, dtype=np.dtype(dtype).newbyteorder(">"), offset=4).astype(np.float32)
+
+
+def to_pgvector_text(embedding) -> str:
+    """Shortest text form of a vector that round-trips through float32."""
+    return "[" + ",".join(map(str, np.asarray(embedding, dtype=np.float32))) + "]"
+
+
+def to_bytea_hex(embedding, dtype=STORAGE_DTYPE) -> str:
+    """Packed bytes in Postgres' hex ``bytea`` input form, for JSON APIs such as PostgREST."""
+    return "\\x" + to_bytes(embedding, dtype).hex()
+
+
+def stored_precision(embedding_type: str) -> str:
+    """VECTOR_PRECISION of embeddings stored as ``embedding_type``, as a schema version table records it.
+
+    pgvector types name it, ``halfvec`` being float16, and packed bytes are
+    recorded with it, as ``BYTEA float16``; plain ``BYTEA`` predates float16.
+    """
+    return "float16" if embedding_type.startswith("halfvec") or embedding_type.endswith("float16") else "float32"
+
+
+def check_precision(stored: str, table: str):
+    """Refuse a table whose embeddings were stored at another precision than VECTOR_PRECISION.
+
+    Decoding them with the wrong codec would silently return garbage vectors.
+    """
+    if stored != VECTOR_PRECISION:
+        raise ValueError(f"Table '{table}' stores {stored} embeddings but VECTOR_PRECISION is {VECTOR_PRECISION}; "
+                         f"set VECTOR_PRECISION={stored}, or export the results with it, delete the table "
+                         f"and import them with the new setting")
+
+
+def payload_report(embedding, repeat: int = 200) -> Dict:
+    """Size in bytes and decode time in microseconds of one embedding in each encoding."""
+    vector = as_vector(embedding)
+    as_list = vector.tolist()  # How embeddings arrive from the API and are sent to Supabase
+    encodings = {
+        "json_list": (json.dumps(as_list), lambda data: np.asarray(json.loads(data), dtype=np.float32)),
+        "pgvector_text": (to_pgvector_text(vector), lambda data: np.asarray(data[1:-1].split(","), dtype=np.float32)),
+        "float32_bytes": (to_bytes(vector, np.float32), lambda data: from_bytes(data, np.float32)),
+        "float16_bytes": (to_bytes(vector, np.float16), lambda data: from_bytes(data, np.float16)),
+    }
+    report = {}
+    for name, (payload, decode) in encodings.items():
+        start = time.perf_counter()
+        for _ in range(repeat):
+            decode(payload)
+        elapsed = (time.perf_counter() - start) / repeat
+        report[name] = {"bytes": len(payload), "decode_us": round(elapsed * 1e6, 1)}
+    report["float16_max_error"] = float(np.abs(from_bytes(to_bytes(vector, np.float16), np.float16) - vector).max())
+    return report
+
+
+if __name__ == "__main__":
+    sample = np.random.default_rng(0).normal(scale=0.03, size=EMBEDDING_DIMENSIONS).astype(np.float32)
+    report = payload_report(sample)
+    print(f"{'ENCODING':<14} | {'BYTES':>6} | {'DECODE µs':>9}")
+    for name, stats in report.items():
+        if isinstance(stats, dict):
+            print(f"{name:<14} | {stats['bytes']:>6} | {stats['decode_us']:>9}")
+    print(f"\nLargest float16 rounding error: {report['float16_max_error']:.2e}")
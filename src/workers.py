@@ -0,0 +1,160 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Tuple
+from src.limits import FairGate
+from src.task_queue import Task
+
+
+class WorkerPool:
+    """Bounded pool that executes up to ``max_workers`` tasks at once.
+
+    Tasks are handed out in queue order and their results are handed back in
+    the same order, so the caller can keep storing results, creating tasks and
+    reprioritizing on a single thread.
+
+    A task can also be started speculatively with ``speculate`` while the caller
+    is still planning, then either committed into the result order or discarded.
+
+    Pools belonging to different runs can share a ``FairGate``; each task then
+    waits for one of the gate's slots, taken in turn with the other runs.
+
+    ``on_status`` is called on the worker thread with a worker's new entry of
+    ``worker_status`` whenever it picks up or finishes a task.
+    """
+
+    def __init__(self, max_workers: int, gate: FairGate = None, owner: str = None,
+                 on_status: Callable[[Dict], None] = None):
+        self.max_workers = max(1, int(max_workers))
+        self.gate = gate
+        self.owner = owner
+        self.on_status = on_status
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="worker")
+        self._in_flight = deque()  # (task, future) pairs in submission order
+        self._speculative = set()  # Speculative futures that still occupy a worker
+        self._lock = threading.Lock()
+        self.speculation_stats = {"started": 0, "committed": 0, "discarded": 0, "wasted_seconds": 0.0}
+        self._status = {
+            f"worker_{i}": {"worker": f"worker_{i}", "state": "idle", "task_id": None, "task_name": None, "started_at": None}
+            for i in range(self.max_workers)
+        }
+
+    @property
+    def free_slots(self) -> int:
+        """Number of tasks that can be submitted without queueing inside the executor."""
+        with self._lock:
+            running = sum(1 for future in self._speculative if not future.done())
+            return self.max_workers - len(self._in_flight) - running
+
+    @property
+    def pending_count(self) -> int:
+        """Number of submitted tasks whose results have not been collected yet."""
+        return len(self._in_flight)
+
+    def has_pending(self) -> bool:
+        """Return True while any submitted task is waiting to be collected."""
+        return bool(self._in_flight)
+
+    def pending_tasks(self) -> List[Task]:
+        """Tasks that have been submitted but not collected, in submission order."""
+        return [task for task, _ in self._in_flight]
+
+    def submit(self, task: Task, fn: Callable[..., str], *args):
+        """Run ``fn(*args)`` for ``task`` on the next free worker."""
+        future = self._executor.submit(self._run, task, fn, *args)
+        self._in_flight.append((task, future))
+        return future
+
+    def speculate(self, task: Task, fn: Callable[..., str], *args):
+        """Start ``task`` on a free worker without committing it to the result order."""
+        future = self._executor.submit(self._run, task, fn, *args)
+        with self._lock:
+            self._speculative.add(future)
+            self.speculation_stats["started"] += 1
+        future.add_done_callback(self._speculation_done)
+        return future
+
+    def commit(self, task: Task, future):
+        """Keep a speculative execution: its result is collected like a submitted task."""
+        with self._lock:
+            self._speculative.discard(future)
+            self.speculation_stats["committed"] += 1
+        self._in_flight.append((task, future))
+
+    def discard(self, future):
+        """Drop a speculative execution, cancelling it if it has not started.
+
+        One already running keeps its worker until it finishes, and that time
+        is counted as wasted.
+        """
+        with self._lock:
+            self.speculation_stats["discarded"] += 1
+        if not future.cancel():
+            future.add_done_callback(self._record_waste)
+
+    def wait_for_speculation(self, timeout: float = None) -> bool:
+        """Block until a worker held by a speculative execution frees up; False when none is held."""
+        with self._lock:
+            running = [future for future in self._speculative if not future.done()]
+        if not running:
+            return False
+        wait(running, timeout, return_when=FIRST_COMPLETED)
+        return True
+
+    def next_result(self, timeout: float = None) -> Optional[Tuple[Task, str, float]]:
+        """Block until the oldest submitted task finishes and return (task, result, seconds).
+
+        Returns None when nothing has been submitted; the caller should hand
+        out tasks (or ``wait_for_speculation``) instead of collecting.
+        """
+        if not self._in_flight:
+            return None
+        task, future = self._in_flight.popleft()
+        result, elapsed = future.result(timeout)
+        return task, result, elapsed
+
+    def worker_status(self) -> List[Dict]:
+        """Snapshot of what each worker is doing, for display."""
+        with self._lock:
+            return [dict(status) for _, status in sorted(self._status.items())]
+
+    def shutdown(self, wait: bool = True):
+        """Stop accepting work and release the worker threads."""
+        self._executor.shutdown(wait=wait)
+
+    def _speculation_done(self, future):
+        with self._lock:
+            self._speculative.discard(future)
+
+    def _record_waste(self, future):
+        if future.exception() is None:
+            with self._lock:
+                self.speculation_stats["wasted_seconds"] += future.result()[1]
+
+    def _run(self, task: Task, fn: Callable[..., str], *args) -> Tuple[str, float]:
+        name = threading.current_thread().name
+        if self.gate is not None:
+            self._set_status(name, "waiting", task)
+            self.gate.acquire(self.owner)
+        start = time.time()
+        self._set_status(name, "busy", task, start)
+        try:
+            return fn(*args), time.time() - start
+        finally:
+            self._set_status(name, "idle")
+            if self.gate is not None:
+                self.gate.release()
+
+    def _set_status(self, name: str, state: str, task: Task = None, started_at: float = None):
+        status = {
+            "worker": name,
+            "state": state,
+            "task_id": task.task_id if task else None,
+            "task_name": task.task_name if task else None,
+            "started_at": started_at,
+        }
+        with self._lock:
+            self._status[name] = status
+        if self.on_status is not None:
+            self.on_status(dict(status))
@@ -0,0 +1,140 @@
+import queue
+import threading
+import time
+from typing import Callable, Dict, List
+import numpy as np
+from src.agents import get_mistral_embeddings
+from src.config import RESULT_WRITE_QUEUE_SIZE, RESULT_WRITE_BATCH, RESULT_WRITE_RETRIES
+from src.database import store_task_results, task_result_row
+from src.task_queue import Task
+
+
+class ResultWriter:
+    """Write-behind stage that embeds and stores task results off the agent loop.
+
+    ``submit`` only blocks when ``queue_size`` results are already waiting. A
+    background thread takes whatever has queued up, at most ``batch_size``
+    results, embeds them in one request and inserts them in one statement.
+    Results whose embedding came back empty and inserts that fail are retried
+    up to ``retries`` times with exponential backoff.
+
+    ``on_embedded`` callbacks receive each result's embedding on the writer
+    thread, once it is known. ``on_written`` is called on the writer thread
+    with ``stats`` and ``backlog`` after each batch. ``unstored`` lists the
+    tasks whose results are not stored yet, or failed to be, so a checkpoint
+    can leave them unfinished without waiting for the writer.
+    """
+
+    def __init__(self, queue_size: int = RESULT_WRITE_QUEUE_SIZE, batch_size: int = RESULT_WRITE_BATCH,
+                 retries: int = RESULT_WRITE_RETRIES, backoff: float = 1.0,
+                 embed: Callable[[List[str]], np.ndarray] = get_mistral_embeddings,
+                 store: Callable[[List[Dict]], bool] = store_task_results,
+                 on_written: Callable[[Dict], None] = None):
+        self.batch_size = max(1, int(batch_size))
+        self.retries = max(0, int(retries))
+        self.backoff = backoff
+        self.embed = embed
+        self.store = store
+        self.on_written = on_written
+        self._queue = queue.Queue(maxsize=max(1, int(queue_size)))
+        self._closed = False
+        self._unstored = {}  # task_id -> Task, for results submitted and not stored, oldest first
+        self._lock = threading.Lock()
+        self.stats = {"queued": 0, "stored": 0, "failed": 0, "batches": 0, "retries": 0, "blocked": 0}
+        self._thread = threading.Thread(target=self._drain, name="result-writer", daemon=True)
+        self._thread.start()
+
+    @property
+    def backlog(self) -> int:
+        """Results submitted but not yet written."""
+        return self._queue.unfinished_tasks
+
+    def submit(self, task_id: int, task_name: str, result: str, run_id: str = None,
+               on_embedded: Callable[[np.ndarray], None] = None):
+        """Queue a result for embedding and storage; blocks only while the queue is full."""
+        if self._closed:
+            raise RuntimeError("ResultWriter is closed")
+        if self._queue.full():
+            self.stats["blocked"] += 1
+        with self._lock:
+            self._unstored[task_id] = Task(task_id, task_name)
+        self._queue.put((task_id, task_name, result, run_id, on_embedded))
+        self.stats["queued"] += 1
+
+    def unstored(self) -> List[Task]:
+        """Tasks whose submitted results have not been stored, oldest first."""
+        with self._lock:
+            return list(self._unstored.values())
+
+    def flush(self):
+        """Wait until every submitted result has been written or given up on."""
+        self._queue.join()
+
+    def close(self):
+        """Flush the queue and stop the writer thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+
+    def _drain(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            batch = [item]
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.task_done()
+                    stopping = True
+                    break
+                batch.append(item)
+            try:
+                self._write(batch)
+            except Exception as e:
+                self.stats["failed"] += len(batch)
+                print(f"❌ Error writing task results: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if self.on_written is not None:
+                self.on_written(dict(self.stats, backlog=self.backlog))
+
+    def _write(self, batch: List[tuple]):
+        vectors = list(self.embed([result for _, _, result, _, _ in batch]))
+        for attempt in range(self.retries):
+            missing = [i for i, vector in enumerate(vectors) if not np.any(vector)]
+            if not missing:
+                break
+            self._wait(attempt)
+            for i, vector in zip(missing, self.embed([batch[i][2] for i in missing])):
+                vectors[i] = vector
+
+        for (_, _, _, _, on_embedded), vector in zip(batch, vectors):
+            if on_embedded is not None:
+                on_embedded(vector)
+
+        rows = [task_result_row(task_id, task_name, result, vector, run_id)
+                for (task_id, task_name, result, run_id, _), vector in zip(batch, vectors)]
+        for attempt in range(self.retries + 1):
+            if self.store(rows):
+                with self._lock:
+                    for task_id, *_ in batch:
+                        self._unstored.pop(task_id, None)
+                self.stats["stored"] += len(rows)
+                self.stats["batches"] += 1
+                return
+            if attempt < self.retries:
+                self._wait(attempt)
+        self.stats["failed"] += len(rows)
+
+    def _wait(self, attempt: int):
+        self.stats["retries"] += 1
+        time.sleep(self.backoff * 2 ** attempt)
@@ -35,7 +35,7 @@ def test_mistral_embedding():
     print("\n🧪 Testing Mistral Embedding...")
     try:
         embedding = get_mistral_embedding("Test text for embedding")
-        if embedding and len(embedding) == 1024:
+        if len(embedding) == 1024 and embedding.any():
             print("  ✅ Embedding generation successful")
             print(f"  📊 Embedding length: {len(embedding)}")
             return True
@@ -107,15 +107,15 @@ def run_mini_agent():
     """Run a mini version of the agent with just 2 iterations."""
     print("\n🤖 Running Mini Agent (2 iterations)...")
     
-    from collections import deque
     from src.main import add_task
+    from src.task_queue import PriorityTaskQueue, Task
     from src.agents import prioritization_agent
     from src.database import store_task_result
     import time
     
     # Initialize
-    task_list = deque([])
-    first_task = {"task_id": 1, "task_name": "Create a simple plan"}
+    task_list = PriorityTaskQueue()
+    first_task = Task(1, "Create a simple plan")
     add_task(task_list, first_task)
     
     for iteration in range(2):
@@ -127,33 +127,33 @@ def run_mini_agent():
             
         # Execute task
         task = task_list.popleft()
-        print(f"  📝 Executing: {task['task_name']}")
+        print(f"  📝 Executing: {task.task_name}")
         
-        result = execution_agent(OBJECTIVE, task["task_name"])
+        result = execution_agent(OBJECTIVE, task.task_name)
         print(f"  ✅ Result: {result[:100]}...")
         
         # Store result
         embedding = get_mistral_embedding(result)
-        store_task_result(str(task['task_id']), task["task_name"], result, embedding)
+        store_task_result(task.task_id, task.task_name, result, embedding)
         
         # Create new tasks (limit to 2)
         new_tasks = task_creation_agent(
             OBJECTIVE,
             {"data": result},
-            task["task_name"],
-            [t["task_name"] for t in task_list]
+            task.task_name,
+            [t.task_name for t in task_list]
         )
         
         # Add only first 2 new tasks
-        task_id_counter = int(task["task_id"])
+        task_id_counter = task.task_id
         for new_task in new_tasks[:2]:
             task_id_counter += 1
-            new_task.update({"task_id": task_id_counter})
+            new_task.task_id = task_id_counter
             add_task(task_list, new_task)
         
         # Prioritize
         if task_list:
-            prioritization_agent(int(task["task_id"]), task_list, OBJECTIVE)
+            prioritization_agent(task.task_id, task_list, OBJECTIVE)
         
         time.sleep(1)
     
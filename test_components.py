@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Offline checks for the agent's building blocks.
+These need no API keys or network: the task queue, the result writer, the
+dashboard event broadcaster and the SQLite result store.
+"""
+
+import datetime
+import json
+import os
+import sys
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("MISTRAL_API_KEY", "offline-checks")  # Nothing here calls the API
+
+import numpy as np
+from src.checkpoint import RunCheckpoint
+from src.database import task_result_row
+from src.events import ControlChannel, EventBroadcaster, sse_frame, status_body
+from src.scheduler import TaskScheduler
+from src.sqlite_store import SqliteStore
+from src.task_queue import PriorityTaskQueue, Task
+from src.vectors import EMBEDDING_DIMENSIONS
+from src.writer import ResultWriter
+
+
+def check(name, condition):
+    """Print one check's outcome and return it."""
+    print(f"  {'✅' if condition else '❌'} {name}")
+    return bool(condition)
+
+
+def unit_vector(index):
+    vector = np.zeros(EMBEDDING_DIMENSIONS, dtype=np.float32)
+    vector[index] = 1.0
+    return vector
+
+
+def test_task_queue():
+    """Test ordering, capacity shedding, spilled task restore and per-run overflow."""
+    print("🧪 Testing Task Queue...")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "overflow.db")
+        queue = PriorityTaskQueue(capacity=3, overflow_path=path, run_id="a")
+        for task_id, score in [(1, 3.0), (2, 2.0), (3, 1.0)]:
+            queue.push(Task(task_id, f"task {task_id}"), score)
+        new_task = Task(4, "new task")
+        queue.append(new_task)
+        results = [
+            check("A task appended to a full queue stays in memory", new_task in queue),
+            check("The lowest-ranked other task is spilled instead", queue.spilled_ids() == [3]),
+            check("Placement can rescore the new task", queue.update_priority(4, 5.0)),
+            check("The rescored task runs first", queue.peek().task_id == 4),
+        ]
+
+        results.append(check("Rescoring a spilled task brings it back", queue.update_priority(3, 10.0)))
+        results.append(check("It is then first and another task is spilled",
+                             queue.peek().task_id == 3 and len(queue) == 3 and len(queue.spilled_ids()) == 1))
+
+        other_run = PriorityTaskQueue(capacity=1, overflow_path=path, run_id="b")
+        other_run.push(Task(1, "b1"), 1.0)
+        other_run.push(Task(2, "b2"), 2.0)
+        results.append(check("Another run sharing the file keeps its own spills",
+                             other_run.spilled_ids() == [1] and len(queue.spilled_ids()) == 1))
+
+        while queue:
+            queue.popleft()
+        results.append(check("Spilled tasks come back as the queue drains",
+                             queue.stats["restored"] >= 2 and not queue.spilled_ids()))
+
+    evicting = PriorityTaskQueue(capacity=2)
+    for task_id in range(1, 6):
+        evicting.push(Task(task_id, f"task {task_id}"), float(task_id))
+    results.append(check("Without an overflow file the lowest tasks are evicted",
+                         [t.task_id for t in evicting] == [5, 4] and evicting.stats["evicted"] == 3))
+    return all(results)
+
+
+def test_result_writer():
+    """Test batching, failure handling and checkpointing of results not stored yet."""
+    print("\n🧪 Testing Result Writer...")
+    stored, written = [], []
+    fail = {"on": False}
+
+    def store(rows):
+        if fail["on"]:
+            return False
+        stored.extend(rows)
+        return True
+
+    writer = ResultWriter(embed=lambda texts: np.ones((len(texts), EMBEDDING_DIMENSIONS), dtype=np.float32),
+                          store=store, retries=1, backoff=0, on_written=written.append)
+    writer.submit(1, "task 1", "result 1", "run")
+    writer.submit(2, "task 2", "result 2", "run")
+    writer.flush()
+    results = [
+        check("Submitted results are stored", sorted(row["task_id"] for row in stored) == [1, 2]),
+        check("Stored results are no longer pending", writer.unstored() == []),
+        check("on_written reports each batch", written and written[-1]["stored"] == 2),
+    ]
+
+    fail["on"] = True
+    writer.submit(3, "task 3", "result 3", "run")
+    writer.flush()
+    results.append(check("A result that fails to store is counted and retried",
+                         writer.stats["failed"] == 1 and writer.stats["retries"] >= 1))
+    results.append(check("It stays pending", [t.task_id for t in writer.unstored()] == [3]))
+
+    scheduler = TaskScheduler()
+    for task_id in (1, 2, 3):
+        scheduler.add(Task(task_id, f"task {task_id}"))
+        scheduler.mark_finished(task_id, 1.0)
+    with tempfile.TemporaryDirectory() as directory:
+        checkpoint = RunCheckpoint(os.path.join(directory, "checkpoint.json"))
+        checkpoint.save("objective", 3, 3, PriorityTaskQueue(), scheduler, [], writer.unstored())
+        state = checkpoint.load()
+    results.append(check("A checkpoint leaves the unstored task unfinished and queues it again",
+                         state["scheduler"]["finished"] == [1, 2]
+                         and [t["task_id"] for t in state["in_flight"]] == [3]))
+    writer.close()
+    return all(results)
+
+
+def test_event_broadcaster():
+    """Test versions, replay after reconnects, resyncs after restarts and status deltas."""
+    print("\n🧪 Testing Event Broadcaster...")
+    events = EventBroadcaster(history=10)
+    events.publish("log", {"message": "one"})
+    version = events.version
+    events.publish("output", {"text": "token"}, replay=False)
+    results = [
+        check("Streamed output leaves the version alone", events.version == version),
+        check("Nothing has changed since that version", events.changes(version) == (version, [])),
+    ]
+
+    subscriber, missed = events.subscribe(version)
+    events.publish("log", {"message": "two"})
+    frame = sse_frame(subscriber.get_nowait(), events.epoch)
+    results.append(check("Event ids are sent with the epoch", f"id: {events.epoch}.2\n" in frame))
+    events.unsubscribe(subscriber)
+
+    _, missed = events.subscribe(f"{events.epoch}.1")
+    results.append(check("A reconnect is replayed what it missed", [e[0] for e in missed] == [2]))
+
+    restarted = EventBroadcaster()
+    restarted.publish("log", {"message": "after restart"})
+    for stale in ("1", f"{events.epoch}.1"):
+        _, missed = restarted.subscribe(stale)
+        results.append(check(f"Id {stale!r} from before a restart resyncs",
+                             [e[1] for e in missed] == ["resync"] and restarted.changes(stale)[1] is None))
+
+    fields = {"logs": lambda: ["everything"], "queue": lambda: ["queued"]}
+    _, missed = events.changes(version)
+    body = status_body(fields, missed, {"queue": ("queue",)}, {"log": ("logs", None)})
+    results.append(check("A delta carries only the new log entries",
+                         body == {"logs": [{"message": "two"}], "delta": True}))
+
+    handled = []
+    control = ControlChannel(events, lambda request: handled.append(request["command"]) or True)
+    message = json.dumps({"type": "command", "id": "c1", "command": "pause"})
+    first, again = control.acknowledge(message), control.acknowledge(message)
+    results.append(check("A resent command is acknowledged without running twice",
+                         first == again and handled == ["pause"] and first["seq"] == events.version))
+    return all(results)
+
+
+def test_sqlite_store():
+    """Test schema setup, idempotent inserts, similarity search, retention and precision checks."""
+    print("\n🧪 Testing SQLite Store...")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "results.db")
+        store = SqliteStore(path, "results")
+        results = [
+            check("Setup creates the schema", store.setup()),
+            check("A second setup has nothing to do", not store.setup()),
+        ]
+        rows = [task_result_row(i, f"task {i}", f"result {i}", unit_vector(i), "run-a" if i < 3 else "run-b")
+                for i in range(4)]
+        results.append(check("Rows are inserted", store.insert(rows) == 4))
+        results.append(check("Storing the same results again is a no-op", store.insert(rows[:2]) == 0))
+
+        matches = store.match(unit_vector(2), match_count=2)
+        results.append(check("The closest result comes first", matches[0]["task_id"] == 2
+                             and abs(matches[0]["similarity"] - 1.0) < 1e-6))
+        matches = store.match(unit_vector(3), match_count=5, filter={"run_id": "run-a"}, columns=("content",))
+        results.append(check("A filter limits the search to its run",
+                             len(matches) == 3 and "result 3" not in [m["content"] for m in matches]))
+
+        old = task_result_row(9, "old task", "old result", unit_vector(9), "run-a",
+                              created_at=datetime.datetime(2000, 1, 15))
+        store.insert([old])
+        results.append(check("Retention deletes results from expired months",
+                             store.drop_periods_before(datetime.date(2001, 1, 1)) == 1))
+        results.append(check("Deduplication finds nothing to delete", store.deduplicate() == 0))
+        store.close()
+
+        half = SqliteStore(os.path.join(directory, "half.db"), "results")
+        half.setup()
+        with half._conn:
+            half._conn.execute("INSERT INTO results (content, embedding, run_id, task_id, task_name, content_hash, "
+                               "period) VALUES ('x', ?, 'r', 1, 't', 'h', '2026-01-01')",
+                               (np.zeros(EMBEDDING_DIMENSIONS, dtype=np.float16).tobytes(),))
+        half.close()
+        try:
+            SqliteStore(os.path.join(directory, "half.db"), "results").setup()
+            refused = False
+        except ValueError:
+            refused = True
+        results.append(check("Embeddings stored at another precision are refused", refused))
+    return all(results)
+
+
+def main():
+    """Main test function."""
+    print("🧪 Autonomous Task Agent - Component Checks")
+    print("=" * 50)
+
+    tests = [
+        test_task_queue,
+        test_result_writer,
+        test_event_broadcaster,
+        test_sqlite_store,
+    ]
+
+    results = []
+    for test in tests:
+        try:
+            results.append(test())
+        except Exception as e:
+            print(f"  ❌ Test failed with exception: {e}")
+            results.append(False)
+
+    passed = sum(results)
+    total = len(results)
+    print(f"\n📊 Check Summary: {passed}/{total} components passed")
+    sys.exit(0 if passed == total else 1)
+
+
+if __name__ == "__main__":
+    main()
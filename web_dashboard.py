@@ -4,7 +4,7 @@ Simple web dashboard for the Autonomous Task Agent.
 Provides a web interface for monitoring and controlling the agent.
 """
 
-from flask import Flask, render_template, request, jsonify, redirect, url_for
+from flask import Flask, Response, render_template, request, jsonify, redirect, url_for
 from collections import deque
 import json
 import os
@@ -15,20 +15,29 @@ import time
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from src.agents import (
-    get_mistral_embedding,
     task_creation_agent,
-    prioritization_agent,
+    reprioritize_tasks,
     execution_agent,
 )
-from src.database import setup_supabase_table, store_task_result
-from src.config import OBJECTIVE, YOUR_FIRST_TASK
+from src.database import setup_supabase_table
+from src.config import OBJECTIVE, YOUR_FIRST_TASK, MAX_WORKERS, TASK_QUEUE_CAPACITY, TASK_OVERFLOW_PATH, CHECKPOINT_PATH, run_path
+from src.workers import WorkerPool
+from src.task_queue import PriorityTaskQueue, Task
+from src.scheduler import TaskScheduler, link_sibling_dependencies
+from src.dedup import TaskDeduplicator
+from src.scoring import LocalPriorityScorer
+from src.checkpoint import RunCheckpoint
+from src.convergence import ConvergenceMonitor
+from src.writer import ResultWriter
+from src.events import EventBroadcaster, status_body
 
 app = Flask(__name__)
 
 # Global agent state
 class AgentState:
     def __init__(self):
-        self.task_list = deque([])
+        self.task_list = PriorityTaskQueue(capacity=TASK_QUEUE_CAPACITY, overflow_path=run_path(TASK_OVERFLOW_PATH, "web"),
+                                           run_id="web")
         self.task_id_counter = 1
         self.objective = OBJECTIVE
         self.is_running = False
@@ -43,6 +52,31 @@ class AgentState:
         self.approval_required = True
         self.session_history = []
         self.start_time = None
+        self.worker_pool = None
+        self.force_full_reprioritize = False
+        self.scheduler = TaskScheduler()
+        self.deduplicator = TaskDeduplicator()
+        self.scorer = LocalPriorityScorer(vectors=self.deduplicator.vectors)
+        self.checkpoint = RunCheckpoint(CHECKPOINT_PATH) if CHECKPOINT_PATH else None
+        self.convergence = ConvergenceMonitor()
+        self.writer = ResultWriter(on_written=lambda stats: self.events.publish("writer", stats))
+        self.embedded = deque()  # Result embeddings from the writer, not yet seen by the convergence monitor
+        self.events = EventBroadcaster()  # Pushes changes to open dashboards
+        
+    def resume_from_checkpoint(self):
+        """Continue from the last checkpoint for the current objective; returns False if there is none."""
+        state = self.checkpoint.resume(self.objective, self.task_list, self.scheduler, self.deduplicator) if self.checkpoint else None
+        if not state:
+            return False
+        self.iteration = state['iteration']
+        self.task_id_counter = state['task_id_counter']
+        self.add_log(f"♻️ Resumed at iteration {self.iteration} with {len(state['queue']) + len(state['in_flight'])} queued tasks", "success")
+        return True
+        
+    def on_result_embedded(self, embedding):
+        """Called by the result writer once a stored result's embedding is known."""
+        self.scorer.add_result(embedding)
+        self.embedded.append(embedding)
         
     def add_log(self, message, level="info"):
         timestamp = time.strftime("%H:%M:%S")
@@ -54,6 +88,24 @@ class AgentState:
         # Keep only last 50 logs
         if len(self.logs) > 50:
             self.logs.pop(0)
+        self.events.publish("log", self.logs[-1])
+    
+    def publish_status(self):
+        """Push the run state and workers to open dashboards."""
+        self.events.publish("status", {
+            "status": "Running" if self.is_running else ("Paused" if self.is_paused else "Stopped"),
+            "objective": self.objective,
+            "iteration": self.iteration,
+            "workers": self.worker_pool.worker_status() if self.worker_pool else [],
+        })
+    
+    def publish_queue(self):
+        """Push the queued tasks, in priority order, to open dashboards."""
+        self.events.publish("queue", {
+            "tasks": [t.to_dict() for t in self.task_list],
+            "tasks_count": len(self.task_list),
+            "queue": self.task_list.pressure(),
+        })
 
 agent_state = AgentState()
 
@@ -165,45 +217,113 @@ DASHBOARD_HTML = """
         .stat-label { font-size: 0.9em; opacity: 0.9; }
     </style>
     <script>
+        const MAX_LOGS = 20;
+        let events = null;
+        
         function updateDashboard() {
-            fetch('/api/status')
+            return fetch('/api/status')
                 .then(response => response.json())
                 .then(data => {
-                    document.getElementById('status').textContent = data.status;
-                    document.getElementById('status').className = 'status ' + data.status.toLowerCase();
-                    document.getElementById('objective').textContent = data.objective;
-                    document.getElementById('iteration').textContent = data.iteration;
-                    document.getElementById('tasks-count').textContent = data.tasks_count;
-                    
-                    // Update task list
-                    const taskList = document.getElementById('task-list');
-                    taskList.innerHTML = '';
-                    data.tasks.forEach(task => {
-                        const div = document.createElement('div');
-                        div.className = 'task-item';
-                        div.innerHTML = `<strong>#${task.task_id}</strong>: ${task.task_name}`;
-                        taskList.appendChild(div);
-                    });
-                    
-                    // Update logs
-                    const logs = document.getElementById('logs');
-                    logs.innerHTML = '';
-                    data.logs.forEach(log => {
-                        const div = document.createElement('div');
-                        div.className = 'log-entry';
-                        div.innerHTML = `[${log.timestamp}] ${log.message}`;
-                        logs.appendChild(div);
-                    });
-                    logs.scrollTop = logs.scrollHeight;
+                    applyStatus(data);
+                    applyQueue(data);
+                    renderWorkers(data.workers || []);
+                    document.getElementById('logs').innerHTML = '';
+                    data.logs.forEach(appendLog);
+                    return data;
                 });
         }
         
+        function applyStatus(data) {
+            document.getElementById('status').textContent = data.status;
+            document.getElementById('status').className = 'status ' + data.status.toLowerCase();
+            document.getElementById('objective').textContent = data.objective;
+            document.getElementById('iteration').textContent = data.iteration;
+        }
+        
+        function applyQueue(data) {
+            document.getElementById('tasks-count').textContent = data.tasks_count;
+            const queue = data.queue || {};
+            document.getElementById('queue-pressure').textContent = queue.capacity
+                ? `${Math.round(queue.fill * 100)}% full · ${queue.spilled_now} spilled` : '';
+            
+            const taskList = document.getElementById('task-list');
+            taskList.innerHTML = '';
+            data.tasks.forEach(task => {
+                const div = document.createElement('div');
+                div.id = 'task-' + task.task_id;
+                div.className = 'task-item';
+                div.innerHTML = `<strong>#${task.task_id}</strong>: ${task.task_name}`;
+                taskList.appendChild(div);
+            });
+        }
+        
+        function removeQueuedTask(task) {
+            const div = document.getElementById('task-' + task.task_id);
+            if (div) {
+                div.remove();
+                const count = document.getElementById('tasks-count');
+                count.textContent = Math.max(0, parseInt(count.textContent) - 1);
+            }
+        }
+        
+        function renderWorkers(workers) {
+            document.getElementById('worker-list').innerHTML = '';
+            workers.forEach(updateWorker);
+        }
+        
+        function updateWorker(worker) {
+            const workerList = document.getElementById('worker-list');
+            let div = document.getElementById('worker-' + worker.worker);
+            if (!div) {
+                div = document.createElement('div');
+                div.id = 'worker-' + worker.worker;
+                div.className = 'task-item';
+                workerList.appendChild(div);
+            }
+            div.innerHTML = worker.state === 'busy'
+                ? `<strong>${worker.worker}</strong>: ⚡ #${worker.task_id} ${worker.task_name}`
+                : `<strong>${worker.worker}</strong>: 💤 idle`;
+        }
+        
+        function appendLog(log) {
+            const logs = document.getElementById('logs');
+            const div = document.createElement('div');
+            div.className = 'log-entry';
+            div.innerHTML = `[${log.timestamp}] ${log.message}`;
+            logs.appendChild(div);
+            while (logs.children.length > MAX_LOGS) {
+                logs.firstChild.remove();
+            }
+            logs.scrollTop = logs.scrollHeight;
+        }
+        
+        // Apply pushed changes as they happen instead of polling /api/status
+        function connectEvents(since) {
+            events = new EventSource('/api/events?since=' + since);
+            events.addEventListener('log', e => appendLog(JSON.parse(e.data)));
+            events.addEventListener('status', e => {
+                const data = JSON.parse(e.data);
+                applyStatus(data);
+                renderWorkers(data.workers);
+            });
+            events.addEventListener('queue', e => applyQueue(JSON.parse(e.data)));
+            events.addEventListener('task_started', e => removeQueuedTask(JSON.parse(e.data)));
+            events.addEventListener('worker', e => updateWorker(JSON.parse(e.data)));
+            events.addEventListener('resync', resync);
+        }
+        
+        // Load the full state, then follow the changes made after it
+        function resync() {
+            if (events) events.close();
+            updateDashboard().then(data => connectEvents(data.version)).catch(() => setTimeout(resync, 5000));
+        }
+        
         function sendCommand(command) {
             fetch('/api/command', {
                 method: 'POST',
                 headers: {'Content-Type': 'application/json'},
                 body: JSON.stringify({command: command})
-            }).then(() => updateDashboard());
+            });
         }
         
         function updateObjective() {
@@ -214,17 +334,13 @@ DASHBOARD_HTML = """
                     headers: {'Content-Type': 'application/json'},
                     body: JSON.stringify({objective: objective})
                 }).then(() => {
-                    updateDashboard();
                     document.getElementById('new-objective').value = '';
                 });
             }
         }
         
-        // Auto-refresh every 2 seconds
-        setInterval(updateDashboard, 2000);
-        
         // Initial load
-        window.onload = updateDashboard;
+        window.onload = resync;
     </script>
 </head>
 <body>
@@ -243,6 +359,7 @@ DASHBOARD_HTML = """
                 <div class="stat">
                     <div class="stat-value" id="tasks-count">0</div>
                     <div class="stat-label">Tasks in Queue</div>
+                    <div class="stat-label" id="queue-pressure"></div>
                 </div>
                 <div class="stat">
                     <div class="stat-value">AI</div>
@@ -272,6 +389,13 @@ DASHBOARD_HTML = """
                     </div>
                 </div>
                 
+                <div class="card">
+                    <h3>👷 Workers</h3>
+                    <div id="worker-list" class="task-list">
+                        No workers running
+                    </div>
+                </div>
+                
                 <div class="card">
                     <h3>⚙️ Controls</h3>
                     <div class="objective-form">
@@ -282,6 +406,7 @@ DASHBOARD_HTML = """
                     
                     <button class="btn btn-primary" onclick="sendCommand('add_task')">➕ Add Task</button>
                     <button class="btn btn-warning" onclick="sendCommand('clear_tasks')">🗑️ Clear Tasks</button>
+                    <button class="btn btn-primary" onclick="sendCommand('reprioritize')">📋 Full Re-rank</button>
                 </div>
                 
                 <div class="card">
@@ -301,17 +426,51 @@ DASHBOARD_HTML = """
 def dashboard():
     return DASHBOARD_HTML
 
+STATUS_FIELDS = {
+    'status': lambda: "Running" if agent_state.is_running else ("Paused" if agent_state.is_paused else "Stopped"),
+    'objective': lambda: agent_state.objective,
+    'iteration': lambda: agent_state.iteration,
+    'tasks_count': lambda: len(agent_state.task_list),
+    'tasks': lambda: [t.to_dict() for t in agent_state.task_list],
+    'workers': lambda: agent_state.worker_pool.worker_status() if agent_state.worker_pool else [],
+    'critical_path': lambda: agent_state.scheduler.critical_path(),
+    'dedup': lambda: agent_state.deduplicator.stats,
+    'queue': lambda: agent_state.task_list.pressure(),
+    'convergence': lambda: agent_state.convergence.report(agent_state.iteration, agent_state.max_iterations),
+    'writer': lambda: dict(agent_state.writer.stats, backlog=agent_state.writer.backlog),
+    'logs': lambda: agent_state.logs[-20:]  # Last 20 logs
+}
+# Event type -> status fields it changes; the loop publishes a status event after changing the run-wide diagnostics
+STATUS_CHANGED_BY = {
+    'status': ('status', 'objective', 'iteration', 'workers', 'critical_path', 'dedup', 'convergence', 'writer'),
+    'queue': ('tasks_count', 'tasks', 'queue'),
+    'task_started': ('tasks_count', 'tasks', 'queue'),
+    'worker': ('workers',),
+    'writer': ('writer',),
+}
+STATUS_APPENDED_BY = {'log': ('logs', None)}  # Event type -> (list field it appends to, key of the new entry)
+
 @app.route('/api/status')
 def api_status():
-    status = "Running" if agent_state.is_running else ("Paused" if agent_state.is_paused else "Stopped")
-    return jsonify({
-        'status': status,
-        'objective': agent_state.objective,
-        'iteration': agent_state.iteration,
-        'tasks_count': len(agent_state.task_list),
-        'tasks': [{'task_id': t['task_id'], 'task_name': t['task_name']} for t in list(agent_state.task_list)],
-        'logs': agent_state.logs[-20:]  # Last 20 logs
-    })
+    """The dashboard state, or with ?since=<version> only what changed after that version; 304 when nothing has."""
+    since = request.args.get('since')
+    version = agent_state.events.version
+    if since == version or request.if_none_match.contains(version):
+        response = Response(status=304)
+    else:
+        version, missed = agent_state.events.changes(since)  # Read first: later changes reach the page as events
+        response = jsonify(dict(status_body(STATUS_FIELDS, missed, STATUS_CHANGED_BY, STATUS_APPENDED_BY),
+                                version=version))
+    response.set_etag(version)
+    response.cache_control.no_cache = True
+    return response
+
+@app.route('/api/events')
+def api_events():
+    """Server-Sent Events stream of dashboard changes, resumed after Last-Event-ID or ?since=."""
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('since')
+    return Response(agent_state.events.stream(last_event_id), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route('/api/command', methods=['POST'])
 def api_command():
@@ -322,6 +481,7 @@ def api_command():
             agent_state.is_running = True
             agent_state.is_paused = False
             agent_state.add_log("🚀 Agent started", "success")
+            agent_state.publish_status()
             # Start agent in background thread
             threading.Thread(target=run_agent_background, daemon=True).start()
     
@@ -329,15 +489,22 @@ def api_command():
         agent_state.is_paused = not agent_state.is_paused
         status = "paused" if agent_state.is_paused else "resumed"
         agent_state.add_log(f"⏸️ Agent {status}", "warning")
+        agent_state.publish_status()
     
     elif command == 'stop':
         agent_state.is_running = False
         agent_state.is_paused = False
         agent_state.add_log("⏹️ Agent stopped", "error")
+        agent_state.publish_status()
     
     elif command == 'clear_tasks':
         agent_state.task_list.clear()
         agent_state.add_log("🗑️ Tasks cleared", "warning")
+        agent_state.publish_queue()
+    
+    elif command == 'reprioritize':
+        agent_state.force_full_reprioritize = True
+        agent_state.add_log("📋 Full re-rank requested", "info")
     
     return jsonify({'success': True})
 
@@ -347,6 +514,7 @@ def api_objective():
     if new_objective:
         agent_state.objective = new_objective
         agent_state.add_log(f"🎯 Objective updated: {new_objective[:50]}...", "info")
+        agent_state.publish_status()
     return jsonify({'success': True})
 
 def run_agent_background():
@@ -356,70 +524,128 @@ def run_agent_background():
     
     # Add first task if none exist
     if not agent_state.task_list:
-        first_task = {"task_id": 1, "task_name": YOUR_FIRST_TASK}
+        first_task = Task(1, YOUR_FIRST_TASK)
         agent_state.task_list.append(first_task)
         agent_state.add_log(f"📝 Added first task: {YOUR_FIRST_TASK}", "info")
+        agent_state.publish_queue()
+    
+    pool = WorkerPool(MAX_WORKERS, on_status=lambda worker: agent_state.events.publish("worker", worker))
+    agent_state.worker_pool = pool
+    agent_state.publish_status()
     
-    while agent_state.is_running and agent_state.task_list and agent_state.iteration < agent_state.max_iterations:
-        if agent_state.is_paused:
-            time.sleep(1)
-            continue
+    try:
+        while agent_state.is_running and (agent_state.task_list or pool.has_pending()) and agent_state.iteration < agent_state.max_iterations:
+            if agent_state.is_paused:
+                time.sleep(1)
+                continue
+        
+            # Hand queued tasks to idle workers
+            while (agent_state.task_list and pool.free_slots
+                   and agent_state.iteration + pool.pending_count < agent_state.max_iterations):
+                task = agent_state.scheduler.pop_ready(agent_state.task_list, pool.pending_tasks())
+                if task is None:
+                    break
+                agent_state.current_task = task
+                agent_state.add_log(f"⚡ Executing: {task.task_name[:50]}...", "info")
+                agent_state.events.publish("task_started", task.to_dict())
+                pool.submit(task, execution_agent, agent_state.objective, task.task_name)
         
-        # Execute next task
-        task = agent_state.task_list.popleft()
-        agent_state.current_task = task
-        agent_state.add_log(f"⚡ Executing: {task['task_name'][:50]}...", "info")
+            if not pool.has_pending():
+                continue
         
-        try:
-            # Execute task
-            result = execution_agent(agent_state.objective, task["task_name"])
-            agent_state.last_result = result
-            agent_state.add_log(f"✅ Task completed: {task['task_name'][:30]}...", "success")
+            try:
+                # Collect the oldest task first so results are committed in order
+                task, result, execution_time = pool.next_result()
+                agent_state.scheduler.mark_finished(task.task_id, execution_time)
+                agent_state.deduplicator.mark_completed(task)
+                agent_state.last_result = result
+                agent_state.add_log(f"✅ Task completed: {task.task_name[:30]}...", "success")
+                agent_state.events.publish("task_completed", dict(task.to_dict(), execution_time=execution_time))
             
-            # Store result
-            embedding = get_mistral_embedding(result)
-            store_task_result(str(task['task_id']), task["task_name"], result, embedding)
+                # Queue the result for embedding and storage in the background
+                agent_state.writer.submit(task.task_id, task.task_name, result, on_embedded=agent_state.on_result_embedded)
             
-            # Generate new tasks
-            new_tasks = task_creation_agent(
-                agent_state.objective,
-                {"data": result},
-                task["task_name"],
-                [t["task_name"] for t in agent_state.task_list]
-            )
+                # Generate new tasks
+                if agent_state.convergence.converged and agent_state.convergence.action == "throttle":
+                    new_tasks, generated = [], []  # Converged: drain the queue without new tasks
+                else:
+                    new_tasks = task_creation_agent(
+                        agent_state.objective,
+                        {"data": result},
+                        task.task_name,
+                        [t.task_name for t in agent_state.task_list] + [t.task_name for t in pool.pending_tasks()]
+                    )
+                    generated = [t.task_name for t in new_tasks]
+                    new_tasks = agent_state.deduplicator.filter(new_tasks, list(agent_state.task_list) + pool.pending_tasks())
+                results = [agent_state.embedded.popleft() for _ in range(len(agent_state.embedded))]
+                agent_state.convergence.observe(agent_state.iteration + 1, results,
+                                                [agent_state.deduplicator.vectors[name] for name in generated])
             
-            # Add new tasks
-            for new_task in new_tasks[:3]:  # Limit to 3 new tasks
-                agent_state.task_id_counter += 1
-                new_task.update({"task_id": agent_state.task_id_counter})
-                agent_state.task_list.append(new_task)
+                # Add new tasks
+                accepted_tasks = new_tasks[:3]  # Limit to 3 new tasks
+                for new_task in accepted_tasks:
+                    agent_state.task_id_counter += 1
+                    new_task.task_id = agent_state.task_id_counter
+                link_sibling_dependencies(accepted_tasks)
+                for new_task in accepted_tasks:
+                    agent_state.scheduler.add(new_task, parent_id=task.task_id)
+                    agent_state.task_list.append(new_task)
             
-            if new_tasks:
-                agent_state.add_log(f"💡 Generated {len(new_tasks[:3])} new tasks", "info")
+                if new_tasks:
+                    agent_state.add_log(f"💡 Generated {len(new_tasks[:3])} new tasks", "info")
             
-            # Prioritize tasks
-            if len(agent_state.task_list) > 1:
-                prioritization_agent(int(task["task_id"]), agent_state.task_list, agent_state.objective)
-                agent_state.add_log("📋 Tasks reprioritized", "info")
+                # Prioritize tasks
+                mode = reprioritize_tasks(
+                    task.task_id,
+                    agent_state.task_list,
+                    agent_state.objective,
+                    accepted_tasks,
+                    agent_state.iteration + 1,
+                    force_full=agent_state.force_full_reprioritize,
+                    scorer=agent_state.scorer
+                )
+                if mode == "full":
+                    agent_state.force_full_reprioritize = False
+                if mode != "skipped":
+                    agent_state.add_log(f"📋 Tasks reprioritized ({mode})", "info")
             
-            agent_state.iteration += 1
-            time.sleep(3)  # Brief pause between tasks
+                agent_state.iteration += 1
+                agent_state.publish_queue()
+                agent_state.publish_status()
+                if agent_state.checkpoint:
+                    agent_state.checkpoint.save(agent_state.objective, agent_state.iteration, agent_state.task_id_counter,
+                                                agent_state.task_list, agent_state.scheduler, pool.pending_tasks(),
+                                                agent_state.writer.unstored())
+                if agent_state.convergence.converged_at == agent_state.iteration:
+                    agent_state.add_log(f"🧊 Converged: rolling novelty {agent_state.convergence.rolling_novelty:.3f}", "warning")
+                    if agent_state.convergence.action == "stop":
+                        break
+                time.sleep(3)  # Brief pause between tasks
             
-        except Exception as e:
-            agent_state.add_log(f"❌ Error executing task: {str(e)[:50]}...", "error")
-            time.sleep(5)
+            except Exception as e:
+                agent_state.add_log(f"❌ Error executing task: {str(e)[:50]}...", "error")
+                time.sleep(5)
     
-    agent_state.is_running = False
-    agent_state.add_log("🏁 Agent execution completed", "success")
+    finally:
+        pool.shutdown(wait=False)
+        agent_state.writer.flush()
+        agent_state.worker_pool = None
+        agent_state.is_running = False
+        agent_state.add_log("🏁 Agent execution completed", "success")
+        agent_state.publish_status()
 
 if __name__ == '__main__':
     print("🌐 Starting Autonomous Task Agent Web Dashboard...")
     print("📱 Open your browser to: http://localhost:5000")
     print("🔧 Use Ctrl+C to stop the server")
     
-    # Initialize with first task
-    first_task = {"task_id": 1, "task_name": YOUR_FIRST_TASK}
-    agent_state.task_list.append(first_task)
+    # Initialize with first task, or pick up an interrupted run with --resume
+    if '--resume' not in sys.argv or not agent_state.resume_from_checkpoint():
+        first_task = Task(1, YOUR_FIRST_TASK)
+        agent_state.task_list.append(first_task)
     agent_state.add_log("🤖 Dashboard initialized", "info")
     
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    try:
+        app.run(debug=True, host='0.0.0.0', port=5000)
+    finally:
+        agent_state.writer.close()  # Store results still queued when the server stops
\ No newline at end of file